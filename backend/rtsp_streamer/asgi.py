@@ -8,6 +8,7 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
 
 import os
+import threading
 import django
 from django.core.asgi import get_asgi_application
 
@@ -20,6 +21,11 @@ from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
 import streaming.routing
 
+from django.conf import settings
+from streaming.model_pool import get_model_pool
+from streaming.prober import get_prober
+from streaming.stream_processor import start_recording_streams
+
 application = ProtocolTypeRouter({
     "http": get_asgi_application(),
     "websocket": AuthMiddlewareStack(
@@ -27,4 +33,14 @@ application = ProtocolTypeRouter({
             streaming.routing.websocket_urlpatterns
         )
     ),
-})
\ No newline at end of file
+})
+
+# Load and warm up detection models without delaying startup; /api/health/
+# reports readiness until they are done
+get_model_pool().start_warm_up(settings.DETECTOR_WARMUP_MODELS)
+
+# Streams that record run without viewers, from server start on
+threading.Thread(target=start_recording_streams, name='recording-start', daemon=True).start()
+
+# Probe the cameras in the background so the API reports their health
+get_prober().start()
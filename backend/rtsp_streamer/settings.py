@@ -147,6 +147,79 @@ if DEBUG and not os.environ.get('REDIS_URL'):
         },
     }
 
+# Cache: shared Redis cache when available, per-process memory otherwise
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    }
+
+# Seconds a rendered stream listing page stays cached
+STREAM_LIST_CACHE_TIMEOUT = int(os.environ.get('STREAM_LIST_CACHE_TIMEOUT', 30))
+
+# Stream processing: size of the shared inference/encode worker pool.
+# Defaults to one worker per CPU core.
+STREAM_WORKER_THREADS = int(os.environ.get('STREAM_WORKER_THREADS', os.cpu_count() or 1))
+
+# Admission control: CPU cores stream processing may use on this node
+# (default 85% of them) and the frame rate every running stream is promised.
+# A start that does not fit is rejected, queued until capacity frees up, or
+# started with a lower profile (degrade). The default "off" starts everything
+# (and only reports load), so nodes sized by hand keep starting what they did.
+STREAM_CAPACITY_CORES = float(os.environ.get('STREAM_CAPACITY_CORES', 0)) or None
+STREAM_ADMISSION_MIN_FPS = float(os.environ.get('STREAM_ADMISSION_MIN_FPS', 5.0))
+STREAM_ADMISSION_POLICY = os.environ.get('STREAM_ADMISSION_POLICY', 'off')
+
+# Camera prober: every CAMERA_PROBE_INTERVAL seconds (0 disables) the camera
+# URLs are probed on up to CAMERA_PROBE_WORKERS threads; results are reported
+# by the stream API and trusted for CAMERA_PROBE_TTL seconds
+CAMERA_PROBE_INTERVAL = float(os.environ.get('CAMERA_PROBE_INTERVAL', 60.0))
+CAMERA_PROBE_TTL = float(os.environ.get('CAMERA_PROBE_TTL', 180.0))
+CAMERA_PROBE_WORKERS = int(os.environ.get('CAMERA_PROBE_WORKERS', 8))
+CAMERA_PROBE_TIMEOUT = float(os.environ.get('CAMERA_PROBE_TIMEOUT', 5.0))
+
+# Viewer counts and last-frame timestamps are kept in memory and written to
+# the database every STREAM_STATUS_FLUSH_INTERVAL seconds
+STREAM_STATUS_FLUSH_INTERVAL = float(os.environ.get('STREAM_STATUS_FLUSH_INTERVAL', 2.0))
+
+# Detection events (streams with record_detections) are written in batches
+# every DETECTION_EVENT_FLUSH_INTERVAL seconds and kept for the retention period
+DETECTION_EVENT_FLUSH_INTERVAL = float(os.environ.get('DETECTION_EVENT_FLUSH_INTERVAL', 2.0))
+DETECTION_EVENT_RETENTION_DAYS = int(os.environ.get('DETECTION_EVENT_RETENTION_DAYS', 30))
+
+# Runtime used for streams whose detection_backend is "auto": ultralytics,
+# onnxruntime or openvino. "auto" picks by model file (.onnx -> ONNX Runtime,
+# .xml or *_openvino_model/ -> OpenVINO, anything else -> ultralytics)
+DETECTOR_BACKEND = os.environ.get('DETECTOR_BACKEND', 'auto')
+
+# Detection models loaded and warmed up in the background when the ASGI
+# server starts (comma-separated, e.g. "yolo11n.pt,onnxruntime:yolo11n.onnx");
+# empty disables warm-up
+DETECTOR_WARMUP_MODELS = [
+    name.strip() for name in os.environ.get('DETECTOR_WARMUP_MODELS', '').split(',') if name.strip()
+]
+
+# Detection models streams may use (comma-separated, same format as
+# DETECTOR_WARMUP_MODELS, which are allowed as well; a backend prefix limits
+# an entry to that runtime). Model names reach ultralytics, ONNX Runtime and
+# OpenVINO, which download URLs, unpickle checkpoints and open any path, so
+# detection_model only accepts names listed here
+DETECTION_MODELS = [
+    name.strip() for name in os.environ.get('DETECTION_MODELS', 'yolo11n.pt').split(',') if name.strip()
+]
+
+# Recordings: one directory per stream with fixed-duration segment files
+RECORDINGS_ROOT = os.environ.get('RECORDINGS_ROOT', str(BASE_DIR / 'recordings'))
+RECORDING_SEGMENT_SECONDS = int(os.environ.get('RECORDING_SEGMENT_SECONDS', 60))
+
 # Logging configuration for debugging
 LOGGING = {
     'version': 1,
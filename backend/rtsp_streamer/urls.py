@@ -3,14 +3,49 @@ URL configuration for rtsp_streamer project.
 """
 from django.contrib import admin
 from django.urls import path, include
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponse
+import time
+
+# A running stream that has not produced a frame for this long counts as stalled
+STALLED_STREAM_SECONDS = 30
 
 def health_check(request):
+    from streaming.stream_processor import stream_processors
+    from streaming.model_pool import get_model_pool
+
+    now = time.time()
+    running = [p for p in list(stream_processors.values()) if p.is_running]
+    stalled = [
+        p.stream_id for p in running
+        if p.last_frame_at is not None and now - p.last_frame_at > STALLED_STREAM_SECONDS
+    ]
+    detector = get_model_pool().status()
+    if not detector['ready']:
+        status = 'starting'
+    else:
+        status = 'degraded' if stalled else 'healthy'
+    # ?probe=ready turns "not ready yet" into a 503 for load balancer readiness checks
+    http_status = 503 if request.GET.get('probe') == 'ready' and not detector['ready'] else 200
     return JsonResponse({
-        'status': 'healthy',
+        'status': status,
         'message': 'RTSP Streamer API is running',
-        'version': '1.0.0'
-    })
+        'version': '1.0.0',
+        'running_streams': len(running),
+        'stalled_streams': stalled,
+        'detector': detector
+    }, status=http_status)
+
+def capacity_view(request):
+    from streaming.capacity import get_capacity
+
+    capacity = get_capacity().snapshot()
+    # ?probe=admit answers 503 while the node cannot take another stream
+    http_status = 503 if request.GET.get('probe') == 'admit' and not capacity['can_admit'] else 200
+    return JsonResponse(capacity, status=http_status)
+
+def metrics_view(request):
+    from streaming.metrics import registry
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 def api_info(request):
     return JsonResponse({
@@ -18,8 +53,11 @@ def api_info(request):
         'version': '1.0.0',
         'endpoints': {
             'health': '/api/health/',
+            'metrics': '/api/metrics',
+            'capacity': '/api/capacity/',
             'streams': '/api/streams/',
-            'websocket': '/ws/stream/{stream_id}/'
+            'websocket': '/ws/stream/{stream_id}/',
+            'mjpeg': '/api/streams/{stream_id}/mjpeg'
         }
     })
 
@@ -27,5 +65,7 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('', api_info, name='api_info'),
     path('api/health/', health_check, name='health_check'),
+    path('api/metrics', metrics_view, name='metrics'),
+    path('api/capacity/', capacity_view, name='capacity'),
     path('api/', include('streaming.urls')),
 ]
\ No newline at end of file
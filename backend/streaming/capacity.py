@@ -0,0 +1,322 @@
+import os
+import threading
+import logging
+import time
+from collections import OrderedDict
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+POLICIES = ('reject', 'queue', 'degrade', 'off')
+
+# Per-frame CPU seconds assumed for stages nothing comparable has been measured
+# for yet: 1080p decode, a small YOLO model at 640 on CPU, 800px JPEG encode
+DEFAULT_FRAME_SECONDS = {
+    'capture': 0.006,
+    'inference': 0.08,
+    'annotate': 0.002,
+    'encode': 0.006,
+}
+# Measured means are trusted after this many frames
+MIN_SAMPLES = 30
+# A stream admitted but not running yet keeps its share reserved this long
+RESERVATION_SECONDS = 15.0
+# How often queued starts are retried
+QUEUE_POLL_SECONDS = 1.0
+# Smallest inference size the degrade policy goes down to
+DEGRADED_INFERENCE_SIZE = 320
+
+
+class Admission:
+    """Outcome of a start request: admitted, degraded, queued or rejected"""
+
+    def __init__(self, decision, cost, message='', position=None):
+        self.decision = decision
+        self.cost = cost
+        self.message = message
+        self.position = position  # Place in the start queue (queued only)
+
+    @property
+    def allowed(self):
+        return self.decision in ('admitted', 'degraded')
+
+    def as_dict(self):
+        result = {'decision': self.decision, 'cost_cores': round(self.cost, 3)}
+        if self.message:
+            result['message'] = self.message
+        if self.position is not None:
+            result['position'] = self.position
+        return result
+
+
+def _mean_seconds(histogram, stream_id):
+    """Mean of a per-stream latency histogram, or None before MIN_SAMPLES frames"""
+    summary = histogram.summary(stream_id)
+    if not summary or summary['count'] < MIN_SAMPLES:
+        return None
+    return summary['avg_ms'] / 1000
+
+
+def _detection_key(profile):
+    return (profile['detection_model'], profile['detection_backend'], profile['inference_size'])
+
+
+class CapacityModel:
+    """
+    Admission control for stream starts.
+
+    Every running stream costs ``frame_seconds * min(target_fps, min_fps)``
+    CPU cores: the time it spends per frame on capture (read and decode),
+    inference, post-processing and encoding (with drawing), taken from the pipeline metrics once
+    measured and estimated from comparable streams (or defaults) before that,
+    at the frame rate the node promises every stream. A new stream is started
+    only if its cost fits into what the running ones leave of ``budget``, so
+    one more camera cannot push all streams below ``min_fps``. Viewers joining
+    a stream that already runs cost nothing and are always let in, as is the
+    first stream on an empty node.
+    """
+
+    def __init__(self, budget=None, min_fps=5.0, policy='off'):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown admission policy: {policy}")
+        self.budget = float(budget or (os.cpu_count() or 1) * 0.85)
+        self.min_fps = float(min_fps)
+        self.policy = policy
+        self._lock = threading.Lock()
+        self._reserved = {}        # stream_id -> (cost, monotonic time)
+        self._queue = OrderedDict()  # stream_id -> (processor, wait_for_viewers)
+        self._thread = None
+
+    def frame_seconds(self, profile, stream_id=None):
+        """
+        Per-frame CPU seconds of a stream with ``profile``, and whether that is
+        measured (the stream itself ran long enough) or estimated
+        """
+        from .stream_processor import stream_processors
+
+        # Passthrough without decoding only remuxes, which costs next to nothing
+        if profile['output_mode'] == 'fmp4' and not (
+                profile['detection_enabled'] or profile['recording_enabled']):
+            return 0.0, False
+
+        stages = {
+            'capture': metrics.CAPTURE_SECONDS,
+            'inference': metrics.INFERENCE_SECONDS,
+            'annotate': metrics.ANNOTATE_SECONDS,
+            'encode': metrics.ENCODE_SECONDS,
+        }
+        if stream_id is not None:
+            measured = {name: _mean_seconds(histogram, stream_id) for name, histogram in stages.items()}
+            if measured['capture'] is not None and measured['encode'] is not None and (
+                    measured['inference'] is not None or not profile['detection_enabled']):
+                return sum(value or 0.0 for value in measured.values()), True
+
+        # Not measured yet: average the same stages over running streams doing
+        # the same work (same model and input size for inference, any detection
+        # for post-processing), else defaults
+        others = [p for p in list(stream_processors.values()) if p.is_running and p.stream_id != stream_id]
+        seconds = 0.0
+        for name in stages:
+            if name in ('inference', 'annotate'):
+                if not profile['detection_enabled']:
+                    continue
+                peers = [p for p in others if p.profile['detection_enabled']]
+                if name == 'inference':
+                    key = _detection_key(profile)
+                    peers = [p for p in peers if _detection_key(p.profile) == key]
+            else:
+                peers = others
+            values = [v for v in (_mean_seconds(stages[name], p.stream_id) for p in peers) if v is not None]
+            if values:
+                seconds += sum(values) / len(values)
+            elif name == 'inference':
+                seconds += DEFAULT_FRAME_SECONDS[name] * (profile['inference_size'] / 640) ** 2
+            elif name == 'encode':
+                seconds += DEFAULT_FRAME_SECONDS[name] * (profile['output_width'] / 800) ** 2
+            else:
+                seconds += DEFAULT_FRAME_SECONDS[name]
+        return seconds, False
+
+    def stream_cost(self, profile, stream_id=None):
+        """CPU cores a stream needs to keep its guaranteed frame rate"""
+        seconds, _ = self.frame_seconds(profile, stream_id)
+        return seconds * min(profile['target_fps'], self.min_fps)
+
+    def start_cost(self, processor, source_profiles=()):
+        """
+        Cores starting ``processor`` claims: its own cost plus that of the
+        streams it starts in turn (a mosaic's sources not running yet)
+        """
+        return (self.stream_cost(processor.profile, processor.stream_id)
+                + sum(self.stream_cost(profile) for profile in source_profiles))
+
+    def _running(self):
+        from .stream_processor import stream_processors
+        return [p for p in list(stream_processors.values()) if p.is_running]
+
+    def _load(self, exclude=None):
+        """
+        Cores claimed by running streams and by admitted ones that are not
+        running yet, and how many streams that is (lock held)
+        """
+        now = time.monotonic()
+        running = [p for p in self._running() if p.stream_id != exclude]
+        running_ids = {p.stream_id for p in running}
+        for stream_id, (_, reserved_at) in list(self._reserved.items()):
+            if stream_id in running_ids or now - reserved_at > RESERVATION_SECONDS:
+                del self._reserved[stream_id]
+        reserved = [cost for stream_id, (cost, _) in self._reserved.items() if stream_id != exclude]
+        load = sum(self.stream_cost(p.profile, p.stream_id) for p in running) + sum(reserved)
+        return load, len(running) + len(reserved)
+
+    def admit(self, processor, wait_for_viewers=True):
+        """
+        Decide whether ``processor`` (not running yet) may start. Callers start
+        it when the result is ``allowed``; the degrade policy has then already
+        lowered its profile, and the queue policy starts it later by itself
+        (dropping it if ``wait_for_viewers`` and its viewers left meanwhile).
+        Queries the database for mosaics, so async callers run it in a thread.
+        """
+        source_profiles = processor.source_profiles()
+        with self._lock:
+            stream_id = processor.stream_id
+            cost = self.start_cost(processor, source_profiles)
+            if self.policy == 'off':
+                return Admission('admitted', cost)
+            if stream_id in self._queue:
+                return Admission('queued', cost, 'Waiting for capacity',
+                                 list(self._queue).index(stream_id) + 1)
+
+            load, active = self._load(exclude=stream_id)
+            free = self.budget - load
+            if cost <= free or not active:
+                self._reserved[stream_id] = (cost, time.monotonic())
+                return Admission('admitted', cost)
+
+            if self.policy == 'degrade':
+                # Only the stream itself is degraded; a mosaic's sources keep their profiles
+                sources_cost = cost - self.stream_cost(processor.profile, stream_id)
+                overrides = self._degraded_overrides(processor.profile, free - sources_cost)
+                if overrides is not None:
+                    # Kept across profile reloads until the stream stops
+                    processor.degrade(overrides)
+                    cost = self.start_cost(processor, source_profiles)
+                    self._reserved[stream_id] = (cost, time.monotonic())
+                    logger.info(f"Admitted {stream_id} with a lower profile ({cost:.2f} cores)")
+                    return Admission('degraded', cost, 'Started with a lower processing profile')
+
+            message = f"Node at capacity: stream needs {cost:.2f} cores, {max(free, 0.0):.2f} of {self.budget:.2f} free"
+            if self.policy == 'queue':
+                self._queue[stream_id] = (processor, wait_for_viewers)
+                self._ensure_poller()
+                logger.info(f"Queued start of {stream_id}: {message}")
+                return Admission('queued', cost, message, len(self._queue))
+
+            logger.warning(f"Rejected start of {stream_id}: {message}")
+            return Admission('rejected', cost, message)
+
+    def is_queued(self, stream_id):
+        """Whether a start of ``stream_id`` is waiting for capacity"""
+        return stream_id in self._queue
+
+    def _degraded_overrides(self, profile, free):
+        """Profile overrides of the first cheaper variant that fits into ``free`` cores, or None"""
+        candidates = []
+        if profile['detection_enabled'] and profile['inference_size'] > DEGRADED_INFERENCE_SIZE:
+            candidates.append({'inference_size': DEGRADED_INFERENCE_SIZE})
+        if profile['detection_enabled']:
+            candidates.append({'detection_enabled': False})
+        for overrides in candidates:
+            if self.stream_cost({**profile, **overrides}) <= free:
+                return overrides
+        return None
+
+    def _ensure_poller(self):
+        """Start the queue thread (lock held)"""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run_queue, name='stream-admission', daemon=True)
+            self._thread.start()
+
+    def _run_queue(self):
+        while True:
+            time.sleep(QUEUE_POLL_SECONDS)
+            started = []
+            with self._lock:
+                queued = list(self._queue.items())
+            # Outside the lock: mosaics look up their sources in the database
+            source_profiles = {stream_id: processor.source_profiles() for stream_id, (processor, _) in queued}
+            with self._lock:
+                for stream_id, (processor, wait_for_viewers) in queued:
+                    if stream_id not in self._queue:
+                        continue
+                    if processor.is_running or (wait_for_viewers and not processor.consumers):
+                        del self._queue[stream_id]
+                        continue
+                    load, active = self._load(exclude=stream_id)
+                    cost = self.start_cost(processor, source_profiles[stream_id])
+                    # Strict order: a large stream at the head is not overtaken
+                    if cost > self.budget - load and active:
+                        break
+                    del self._queue[stream_id]
+                    self._reserved[stream_id] = (cost, time.monotonic())
+                    started.append(processor)
+                if not self._queue:
+                    self._thread = None
+            for processor in started:
+                logger.info(f"Starting queued stream {processor.stream_id}")
+                processor.start()
+            if self._thread is None:
+                return
+
+    def snapshot(self):
+        """Current load and headroom, per stream and in total (for /api/capacity/)"""
+        with self._lock:
+            load, _ = self._load()
+            queued = list(self._queue)
+        streams = []
+        for processor in self._running():
+            seconds, measured = self.frame_seconds(processor.profile, processor.stream_id)
+            streams.append({
+                'stream_id': processor.stream_id,
+                'cost_cores': round(seconds * min(processor.profile['target_fps'], self.min_fps), 3),
+                'frame_ms': round(seconds * 1000, 2),
+                'target_fps': processor.profile['target_fps'],
+                'measured': measured,
+            })
+
+        from .models import DEFAULT_PROFILE
+        new_stream_cost = self.stream_cost(DEFAULT_PROFILE)
+        headroom = self.budget - load
+        return {
+            'policy': self.policy,
+            'budget_cores': round(self.budget, 3),
+            'min_fps': self.min_fps,
+            'load_cores': round(load, 3),
+            'headroom_cores': round(headroom, 3),
+            'utilization': round(load / self.budget, 3) if self.budget else None,
+            # Whether a stream with the default profile would be admitted now
+            'can_admit': self.policy == 'off' or headroom >= new_stream_cost or not streams,
+            'default_stream_cost_cores': round(new_stream_cost, 3),
+            'running_streams': len(streams),
+            'queued_streams': queued,
+            'streams': streams,
+        }
+
+
+_capacity = None
+_capacity_lock = threading.Lock()
+
+
+def get_capacity():
+    """Return the process-wide capacity model"""
+    global _capacity
+    with _capacity_lock:
+        if _capacity is None:
+            from django.conf import settings
+            _capacity = CapacityModel(
+                budget=getattr(settings, 'STREAM_CAPACITY_CORES', None),
+                min_fps=getattr(settings, 'STREAM_ADMISSION_MIN_FPS', 5.0),
+                policy=getattr(settings, 'STREAM_ADMISSION_POLICY', 'off'),
+            )
+        return _capacity
@@ -1,18 +1,163 @@
 import json
+import time
+from collections import deque
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
+from django.core.exceptions import ValidationError
 from .models import Stream
-from .stream_processor import get_stream_processor, stop_stream_processor
+from .stream_processor import get_stream_processor, stop_stream_processor, RENDITIONS
+from .capacity import get_capacity
+from .status_tracker import get_status_tracker
+from . import metrics
 import logging
 
 logger = logging.getLogger(__name__)
 
-class StreamConsumer(AsyncWebsocketConsumer):
+# Streams one multiplexed connection may watch at once
+MAX_SUBSCRIPTIONS = 64
+
+
+@database_sync_to_async
+def get_stream(stream_id):
+    """Stream row for an id, or None (also for ids that are not UUIDs)"""
+    try:
+        return Stream.objects.get(id=stream_id)
+    except (Stream.DoesNotExist, ValidationError):
+        return None
+
+
+def track_viewer(viewer, is_active):
+    """Record a consumer or subscription joining or leaving its stream's viewers"""
+    tracker = get_status_tracker()
+    if is_active and not viewer.is_viewer:
+        viewer.is_viewer = True
+        tracker.viewer_joined(viewer.stream_id)
+    elif not is_active and viewer.is_viewer:
+        viewer.is_viewer = False
+        processor = viewer.stream_processor
+        tracker.viewer_left(viewer.stream_id, deactivate=not (processor and processor.consumers))
+
+
+class PendingDeliveryMixin:
+    """
+    Sends what stream processors left on a viewer: queued control messages,
+    then the latest detections, media fragment and frame. The viewer is the
+    consumer itself or, for multiplexed connections, one subscription.
+    """
+
+    async def deliver_pending(self, viewer):
+        while viewer.pending_messages:
+            message = viewer.pending_messages.popleft()
+            try:
+                if message.get('type') == 'mse_init':
+                    await self.send_mse_init(message)
+                else:
+                    await self.send_json(message)
+            except Exception as e:
+                logger.error(f"Error sending pending message: {e}")
+
+        # Detections go out just before the frame they belong to (same seq)
+        detections, viewer.pending_detections = viewer.pending_detections, None
+        if detections is not None:
+            try:
+                await self.send_json(detections)
+            except Exception as e:
+                logger.error(f"Error sending detections: {e}")
+
+        media, viewer.pending_media = viewer.pending_media, None
+        if media is not None:
+            try:
+                await self.send_media(viewer.stream_id, media['data'])
+                metrics.BYTES_SENT.inc(viewer.stream_id, amount=len(media['data']))
+            except Exception as e:
+                logger.error(f"Error sending media fragment: {e}")
+
+        frame, viewer.pending_frame = viewer.pending_frame, None
+        if frame is not None:
+            try:
+                await self.send_frame(frame)
+            except Exception as e:
+                logger.error(f"Error sending frame: {e}")
+
+    async def send_media(self, stream_id, data):
+        """Send an fMP4 segment as a binary message"""
+        await self.send(bytes_data=data)
+
+    async def send_mse_init(self, message):
+        """Announce the fMP4 codec, then send the initialization segment as binary"""
+        await self.send_json({key: value for key, value in message.items() if key != 'init'})
+        await self.send_media(message['stream_id'], message['init'])
+
+    async def send_frame(self, message):
+        """Send a frame message and record its size and end-to-end age"""
+        text_data = json.dumps(message)
+        await self.send(text_data=text_data)
+        metrics.BYTES_SENT.inc(message['stream_id'], amount=len(text_data))
+        if message.get('captured_at'):
+            metrics.FRAME_AGE_SECONDS.observe(
+                message['stream_id'], value=time.time() - message['captured_at']
+            )
+
+    async def admit(self, processor, viewer):
+        """
+        Start ``processor`` if the node has capacity for it. A rejected start
+        detaches the viewer again and is reported as an error; a queued one
+        keeps the viewer attached until the stream starts or the viewer leaves.
+        """
+        admission = await database_sync_to_async(get_capacity().admit)(processor)
+        if admission.allowed:
+            processor.start()
+        elif admission.decision == 'rejected':
+            processor.remove_consumer(viewer)
+            await self.send_json({'type': 'error', 'stream_id': processor.stream_id,
+                                  'code': 'capacity', 'message': admission.message})
+        return admission
+
+    async def send_admission(self, admission, stream_id):
+        """Tell the client its stream was queued or started with a lower profile"""
+        if admission and admission.decision in ('queued', 'degraded'):
+            await self.send_json({'type': f'stream_{admission.decision}', 'stream_id': stream_id,
+                                  **admission.as_dict()})
+
+    async def send_json(self, message):
+        """Send JSON message to client"""
+        # Handle both direct calls and channel layer calls
+        if isinstance(message, dict) and 'text' in message:
+            # Called from channel layer
+            await self.send(text_data=json.dumps(message['text']))
+        else:
+            # Direct call
+            await self.send(text_data=json.dumps(message))
+
+    def start_message_processor(self):
+        """Start periodic task to process pending messages"""
+        import asyncio
+        
+        async def message_processor():
+            while True:
+                try:
+                    await self.process_pending_messages()
+                    await asyncio.sleep(0.01)  # Process every 10ms for smooth video
+                except Exception as e:
+                    logger.error(f"Message processor error: {e}")
+                    await asyncio.sleep(0.1)
+        
+        # Start the task
+        self.message_task = asyncio.create_task(message_processor())
+
+
+class StreamConsumer(PendingDeliveryMixin, AsyncWebsocketConsumer):
     async def connect(self):
         self.stream_id = self.scope['url_route']['kwargs']['stream_id']
         self.group_name = f'stream_{self.stream_id}'
         self.stream_processor = None
-        self.pending_messages = []  # For thread-safe message queuing
+        self.is_viewer = False
+        self.pending_messages = deque()  # For thread-safe message queuing
+        self.pending_frame = None  # Latest undelivered frame (older ones are dropped)
+        self.pending_detections = None  # Detections for that frame (client overlay mode)
+        self.pending_media = None  # Latest fMP4 fragment (fmp4 output mode)
+        self.paused = False  # Frames are not delivered while paused
+        self.message_task = None
         
         # Join stream group
         await self.channel_layer.group_add(
@@ -39,31 +184,12 @@ class StreamConsumer(AsyncWebsocketConsumer):
 
     async def process_pending_messages(self):
         """Process any pending messages from stream processor"""
-        if hasattr(self, 'pending_messages') and self.pending_messages:
-            for message in self.pending_messages:
-                try:
-                    await self.send_json(message)
-                except Exception as e:
-                    logger.error(f"Error sending pending message: {e}")
-            self.pending_messages.clear()
-
-    def start_message_processor(self):
-        """Start periodic task to process pending messages"""
-        import asyncio
-        
-        async def message_processor():
-            while True:
-                try:
-                    await self.process_pending_messages()
-                    await asyncio.sleep(0.01)  # Process every 10ms for smooth video
-                except Exception as e:
-                    logger.error(f"Message processor error: {e}")
-                    await asyncio.sleep(0.1)
-        
-        # Start the task
-        asyncio.create_task(message_processor())
+        await self.deliver_pending(self)
 
     async def disconnect(self, close_code):
+        if self.message_task:
+            self.message_task.cancel()
+
         # Leave stream group
         await self.channel_layer.group_discard(
             self.group_name,
@@ -73,7 +199,9 @@ class StreamConsumer(AsyncWebsocketConsumer):
         # Remove from stream processor
         if self.stream_processor:
             self.stream_processor.remove_consumer(self)
-        
+
+        self.update_stream_status(False)
+
         logger.info(f"WebSocket disconnected for stream {self.stream_id}")
 
     async def receive(self, text_data):
@@ -92,6 +220,8 @@ class StreamConsumer(AsyncWebsocketConsumer):
                 await self.handle_pause()
             elif message_type == 'play':
                 await self.handle_play()
+            elif message_type == 'get_stats':
+                await self.handle_get_stats()
             else:
                 await self.send_error(f"Unknown message type: {message_type}")
                 
@@ -104,26 +234,32 @@ class StreamConsumer(AsyncWebsocketConsumer):
     async def handle_start_stream(self, data):
         """Handle start stream request"""
         rtsp_url = data.get('rtsp_url')
-        
+        stream = await self.get_stream_from_db()
+
         if not rtsp_url:
             # Try to get RTSP URL from database
-            stream = await self.get_stream_from_db()
             if stream:
                 rtsp_url = stream.rtsp_url
             else:
                 await self.send_error("No RTSP URL provided and stream not found in database")
                 return
-        
+
         # Get or create stream processor
-        self.stream_processor = get_stream_processor(self.stream_id, rtsp_url)
+        priority = stream.priority if stream else 1
+        profile = stream.processing_profile() if stream else None
+        self.stream_processor = get_stream_processor(self.stream_id, rtsp_url, priority, profile)
         self.stream_processor.add_consumer(self)
         
-        # Start the stream if not already running
+        # Start the stream if not already running (and the node has room for it)
         if not self.stream_processor.is_running:
-            self.stream_processor.start()
+            admission = await self.admit(self.stream_processor, self)
+            if admission.decision == 'rejected':
+                self.stream_processor = None
+                return
+            await self.send_admission(admission, self.stream_id)
         
-        # Update database
-        await self.update_stream_status(True)
+        # Record the viewer; the database is updated by the periodic flush
+        self.update_stream_status(True)
         
         logger.info(f"Started stream {self.stream_id} with URL: {rtsp_url}")
 
@@ -131,10 +267,10 @@ class StreamConsumer(AsyncWebsocketConsumer):
         """Handle stop stream request"""
         if self.stream_processor:
             self.stream_processor.remove_consumer(self)
-            self.stream_processor = None
-        
-        await self.update_stream_status(False)
-        
+
+        self.update_stream_status(False)
+        self.stream_processor = None
+
         await self.send(text_data=json.dumps({
             'type': 'stream_stopped',
             'stream_id': self.stream_id,
@@ -142,9 +278,9 @@ class StreamConsumer(AsyncWebsocketConsumer):
         }))
 
     async def handle_pause(self):
-        """Handle pause request"""
+        """Stop frame delivery to this viewer only"""
         if self.stream_processor:
-            self.stream_processor.set_pause(True)
+            self.stream_processor.set_consumer_pause(self, True)
         
         await self.send(text_data=json.dumps({
             'type': 'stream_paused',
@@ -153,9 +289,9 @@ class StreamConsumer(AsyncWebsocketConsumer):
         }))
 
     async def handle_play(self):
-        """Handle play request"""
+        """Resume frame delivery to this viewer"""
         if self.stream_processor:
-            self.stream_processor.set_pause(False)
+            self.stream_processor.set_consumer_pause(self, False)
             
         await self.send(text_data=json.dumps({
             'type': 'stream_resumed',
@@ -163,6 +299,14 @@ class StreamConsumer(AsyncWebsocketConsumer):
             'message': 'Stream resumed'
         }))
 
+    async def handle_get_stats(self):
+        """Send per-stream pipeline statistics"""
+        await self.send(text_data=json.dumps({
+            'type': 'stats',
+            'stream_id': self.stream_id,
+            'stats': metrics.stream_stats(self.stream_id)
+        }))
+
     async def send_error(self, message):
         """Send error message to client"""
         await self.send(text_data=json.dumps({
@@ -171,34 +315,188 @@ class StreamConsumer(AsyncWebsocketConsumer):
             'message': message
         }))
 
-    async def send_json(self, message):
-        """Send JSON message to client"""
-        # Handle both direct calls and channel layer calls
-        if isinstance(message, dict) and 'text' in message:
-            # Called from channel layer
-            await self.send(text_data=json.dumps(message['text']))
-        else:
-            # Direct call
-            await self.send(text_data=json.dumps(message))
-
-    @database_sync_to_async
-    def get_stream_from_db(self):
+    async def get_stream_from_db(self):
         """Get stream from database"""
-        try:
-            return Stream.objects.get(id=self.stream_id)
-        except Stream.DoesNotExist:
-            return None
+        return await get_stream(self.stream_id)
 
-    @database_sync_to_async
     def update_stream_status(self, is_active):
-        """Update stream status in database"""
+        """Record this consumer joining or leaving the stream's viewers"""
+        track_viewer(self, is_active)
+
+
+class StreamSubscription:
+    """
+    One stream watched over a multiplexed connection. It is registered with
+    the stream's processor in place of a consumer, so frames land in its own
+    latest-only slots, in its rendition and at most at its frame rate.
+    """
+
+    def __init__(self, stream_id):
+        self.stream_id = stream_id
+        self.stream_processor = None
+        self.is_viewer = False
+        self.pending_messages = deque()
+        self.pending_frame = None
+        self.pending_detections = None
+        self.pending_media = None
+        self.paused = False
+        self.rendition = 'full'
+        self.max_fps = None
+        self.min_frame_interval = 0.0
+        self.next_frame_at = 0.0
+
+    def configure(self, rendition, max_fps):
+        self.rendition = rendition
+        self.max_fps = max_fps
+        self.min_frame_interval = 1.0 / max_fps if max_fps else 0.0
+
+    def settings(self):
+        return {'stream_id': self.stream_id, 'rendition': self.rendition, 'fps': self.max_fps}
+
+
+class MultiplexConsumer(PendingDeliveryMixin, AsyncWebsocketConsumer):
+    """
+    One WebSocket for many streams (grid views). The client subscribes and
+    unsubscribes by stream id; every message carries its ``stream_id``, and
+    binary fMP4 messages are prefixed with it (one length byte, then the id).
+    A single 10 ms task drains all subscriptions of the connection.
+    """
+
+    async def connect(self):
+        self.subscriptions = {}
+        self.message_task = None
+        await self.accept()
+        await self.send_json({
+            'type': 'connection_established',
+            'message': 'Multiplexed WebSocket connection established',
+            'renditions': list(RENDITIONS),
+            'max_subscriptions': MAX_SUBSCRIPTIONS,
+        })
+        self.start_message_processor()
+
+    async def process_pending_messages(self):
+        for subscription in list(self.subscriptions.values()):
+            await self.deliver_pending(subscription)
+
+    async def send_media(self, stream_id, data):
+        prefix = stream_id.encode('utf-8')
+        await self.send(bytes_data=bytes([len(prefix)]) + prefix + data)
+
+    async def disconnect(self, close_code):
+        if self.message_task:
+            self.message_task.cancel()
+        for subscription in list(self.subscriptions.values()):
+            self.detach(subscription)
+        self.subscriptions.clear()
+        logger.info("Multiplexed WebSocket disconnected")
+
+    async def receive(self, text_data):
+        await self.process_pending_messages()
+
         try:
-            stream = Stream.objects.get(id=self.stream_id)
-            stream.is_active = is_active
-            if is_active:
-                stream.viewer_count += 1
+            data = json.loads(text_data)
+            message_type = data.get('type')
+            stream_id = data.get('stream_id')
+            if not isinstance(stream_id, str) or not 0 < len(stream_id) <= 128:
+                await self.send_error("stream_id is required")
+                return
+
+            if message_type == 'subscribe':
+                await self.handle_subscribe(stream_id, data)
+            elif message_type == 'unsubscribe':
+                await self.handle_unsubscribe(stream_id)
+            elif message_type in ('pause', 'play'):
+                await self.handle_pause(stream_id, message_type == 'pause')
+            elif message_type == 'get_stats':
+                await self.send_json({
+                    'type': 'stats',
+                    'stream_id': stream_id,
+                    'stats': metrics.stream_stats(stream_id)
+                })
             else:
-                stream.viewer_count = max(0, stream.viewer_count - 1)
-            stream.save()
-        except Stream.DoesNotExist:
-            pass
\ No newline at end of file
+                await self.send_error(f"Unknown message type: {message_type}", stream_id)
+
+        except json.JSONDecodeError:
+            await self.send_error("Invalid JSON message")
+        except Exception as e:
+            logger.error(f"Error handling message: {e}")
+            await self.send_error(f"Error: {str(e)}")
+
+    async def handle_subscribe(self, stream_id, data):
+        """Start watching a stream, or change the rendition/FPS of a subscription"""
+        rendition = data.get('rendition') or 'full'
+        if rendition not in RENDITIONS:
+            await self.send_error(f"Unknown rendition: {rendition}", stream_id)
+            return
+        max_fps = data.get('fps')
+        if max_fps is not None:
+            try:
+                max_fps = float(max_fps)
+            except (TypeError, ValueError):
+                max_fps = -1
+            if not 0.1 <= max_fps <= 60:
+                await self.send_error("fps must be between 0.1 and 60", stream_id)
+                return
+
+        subscription = self.subscriptions.get(stream_id)
+        admission = None
+        if subscription is None:
+            if len(self.subscriptions) >= MAX_SUBSCRIPTIONS:
+                await self.send_error(
+                    f"At most {MAX_SUBSCRIPTIONS} streams per connection", stream_id
+                )
+                return
+
+            stream = await get_stream(stream_id)
+            rtsp_url = data.get('rtsp_url') or (stream.rtsp_url if stream else None)
+            if not rtsp_url:
+                await self.send_error(
+                    "No RTSP URL provided and stream not found in database", stream_id
+                )
+                return
+
+            subscription = StreamSubscription(stream_id)
+            subscription.configure(rendition, max_fps)
+            priority = stream.priority if stream else 1
+            profile = stream.processing_profile() if stream else None
+            processor = get_stream_processor(stream_id, rtsp_url, priority, profile)
+            subscription.stream_processor = processor
+            processor.add_consumer(subscription)
+            if not processor.is_running:
+                admission = await self.admit(processor, subscription)
+                if admission.decision == 'rejected':
+                    return
+            self.subscriptions[stream_id] = subscription
+            track_viewer(subscription, True)
+            logger.info(f"Subscribed to stream {stream_id} ({rendition}, fps={max_fps})")
+        else:
+            subscription.configure(rendition, max_fps)
+
+        await self.send_json({'type': 'subscribed', **subscription.settings()})
+        await self.send_admission(admission, stream_id)
+
+    async def handle_unsubscribe(self, stream_id):
+        subscription = self.subscriptions.pop(stream_id, None)
+        if subscription:
+            self.detach(subscription)
+        await self.send_json({'type': 'unsubscribed', 'stream_id': stream_id})
+
+    async def handle_pause(self, stream_id, paused):
+        subscription = self.subscriptions.get(stream_id)
+        if subscription is None:
+            await self.send_error("Not subscribed to this stream", stream_id)
+            return
+        subscription.stream_processor.set_consumer_pause(subscription, paused)
+        status = 'paused' if paused else 'resumed'
+        await self.send_json({'type': f'stream_{status}', 'stream_id': stream_id, 'message': f'Stream {status}'})
+
+    def detach(self, subscription):
+        """Stop delivering a stream to this connection"""
+        if subscription.stream_processor:
+            subscription.stream_processor.remove_consumer(subscription)
+        track_viewer(subscription, False)
+        subscription.stream_processor = None
+
+    async def send_error(self, message, stream_id=None):
+        """Send error message to client"""
+        await self.send_json({'type': 'error', 'stream_id': stream_id, 'message': message})
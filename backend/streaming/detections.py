@@ -0,0 +1,142 @@
+import functools
+
+import cv2
+import numpy as np
+
+BOX_COLOR = (0, 255, 0)
+TEXT_COLOR = (0, 0, 0)
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+FONT_SCALE = 0.7
+FONT_THICKNESS = 2
+BOX_THICKNESS = 3
+
+
+class Detections:
+    """
+    Detections of one frame as parallel NumPy arrays.
+
+    ``xyxy`` is float32 (N, 4) in frame pixels, ``confidence`` float32 (N,),
+    ``class_id`` int32 (N,), sorted by descending confidence once filtered.
+    """
+
+    def __init__(self, xyxy=None, confidence=None, class_id=None):
+        self.xyxy = np.zeros((0, 4), np.float32) if xyxy is None else xyxy
+        self.confidence = np.zeros(0, np.float32) if confidence is None else confidence
+        self.class_id = np.zeros(0, np.int32) if class_id is None else class_id
+
+    def __len__(self):
+        return len(self.confidence)
+
+    @classmethod
+    def from_results(cls, results):
+        """Pull boxes out of ultralytics results with one device->host copy per array"""
+        parts = [result.boxes for result in results if result.boxes is not None and len(result.boxes)]
+        if not parts:
+            return cls()
+        xyxy = np.concatenate([boxes.xyxy.cpu().numpy() for boxes in parts]).astype(np.float32, copy=False)
+        confidence = np.concatenate([boxes.conf.cpu().numpy() for boxes in parts]).astype(np.float32, copy=False)
+        class_id = np.concatenate([boxes.cls.cpu().numpy() for boxes in parts]).astype(np.int32)
+        return cls(xyxy, confidence, class_id)
+
+    def normalized(self, width, height):
+        """Boxes as [x1, y1, x2, y2] fractions of the frame size, rounded for the wire"""
+        scale = np.array([width, height, width, height], dtype=np.float32)
+        boxes = np.clip(self.xyxy / scale, 0.0, 1.0).astype(np.float64)
+        return np.round(boxes, 4).tolist()
+
+    @classmethod
+    def concatenate(cls, parts):
+        parts = [part for part in parts if len(part)]
+        if not parts:
+            return cls()
+        if len(parts) == 1:
+            return parts[0]
+        return cls(
+            np.concatenate([part.xyxy for part in parts]),
+            np.concatenate([part.confidence for part in parts]),
+            np.concatenate([part.class_id for part in parts]),
+        )
+
+    def offset(self, dx, dy):
+        """Boxes shifted by ``(dx, dy)``, e.g. from crop to frame coordinates"""
+        if not (dx or dy) or not len(self):
+            return self
+        shift = np.array([dx, dy, dx, dy], dtype=np.float32)
+        return Detections(self.xyxy + shift, self.confidence, self.class_id)
+
+    def scaled(self, factor):
+        """Boxes for a frame resized by ``factor``"""
+        if factor == 1 or not len(self):
+            return self
+        return Detections(self.xyxy * np.float32(factor), self.confidence, self.class_id)
+
+    def inside(self, mask):
+        """Keep boxes whose centre falls on a non-zero pixel of ``mask`` (same coordinates)"""
+        if mask is None or not len(self):
+            return self
+        height, width = mask.shape
+        centre_x = np.clip((self.xyxy[:, 0] + self.xyxy[:, 2]) / 2, 0, width - 1).astype(np.int32)
+        centre_y = np.clip((self.xyxy[:, 1] + self.xyxy[:, 3]) / 2, 0, height - 1).astype(np.int32)
+        keep = mask[centre_y, centre_x] > 0
+        return Detections(self.xyxy[keep], self.confidence[keep], self.class_id[keep])
+
+    def nms(self, iou_threshold):
+        """Class-aware non-maximum suppression"""
+        if len(self) < 2:
+            return self
+        xywh = np.column_stack([self.xyxy[:, :2], self.xyxy[:, 2:] - self.xyxy[:, :2]])
+        indices = cv2.dnn.NMSBoxesBatched(
+            xywh.tolist(), self.confidence.tolist(), self.class_id.tolist(), 0.0, iou_threshold
+        )
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+        return Detections(self.xyxy[indices], self.confidence[indices], self.class_id[indices])
+
+    def filter(self, min_confidence=0.0, classes=None, max_boxes=None):
+        """Keep boxes above ``min_confidence`` of the given classes, highest confidence first"""
+        keep = self.confidence >= min_confidence
+        if classes:
+            keep &= np.isin(self.class_id, np.asarray(classes, dtype=np.int32))
+        indices = np.flatnonzero(keep)
+        indices = indices[np.argsort(-self.confidence[indices], kind='stable')]
+        if max_boxes:
+            indices = indices[:max_boxes]
+        return Detections(self.xyxy[indices], self.confidence[indices], self.class_id[indices])
+
+    def matches(self, other, tolerance):
+        """
+        Same objects as ``other``: equal classes, and every box corner within
+        ``tolerance`` pixels of its counterpart (boxes paired in class and
+        position order, so confidence jitter does not matter)
+        """
+        if other is None or len(self) != len(other):
+            return False
+        if not len(self):
+            return True
+        mine = np.lexsort((self.xyxy[:, 1], self.xyxy[:, 0], self.class_id))
+        theirs = np.lexsort((other.xyxy[:, 1], other.xyxy[:, 0], other.class_id))
+        return bool(np.array_equal(self.class_id[mine], other.class_id[theirs])
+                    and np.abs(self.xyxy[mine] - other.xyxy[theirs]).max() <= tolerance)
+
+
+@functools.lru_cache(maxsize=4096)
+def _label(name, conf_bucket):
+    """Label text and its rendered size; confidence is bucketed to 0.01 steps"""
+    text = f"{name} {conf_bucket / 100:.2f}"
+    (width, height), _ = cv2.getTextSize(text, FONT, FONT_SCALE, FONT_THICKNESS)
+    return text, width, height
+
+
+def draw_detections(frame, detections, names):
+    """Draw boxes with filled label backgrounds in place"""
+    if not len(detections):
+        return frame
+
+    boxes = detections.xyxy.astype(np.int32)
+    buckets = np.rint(detections.confidence * 100).astype(np.int32)
+    for (x1, y1, x2, y2), class_id, bucket in zip(boxes.tolist(), detections.class_id.tolist(),
+                                                  buckets.tolist()):
+        text, text_width, text_height = _label(names.get(class_id, str(class_id)), bucket)
+        cv2.rectangle(frame, (x1, y1), (x2, y2), BOX_COLOR, BOX_THICKNESS)
+        cv2.rectangle(frame, (x1, y1 - text_height - 10), (x1 + text_width, y1), BOX_COLOR, -1)
+        cv2.putText(frame, text, (x1, y1 - 5), FONT, FONT_SCALE, TEXT_COLOR, FONT_THICKNESS)
+    return frame
@@ -0,0 +1,242 @@
+import abc
+import ast
+import os
+import logging
+
+import cv2
+import numpy as np
+
+from .detections import Detections
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('ultralytics', 'onnxruntime', 'openvino')
+
+# NMS IoU threshold for exported models (matches the ultralytics default)
+NMS_IOU = 0.7
+# Padding colour used by ultralytics letterboxing
+LETTERBOX_COLOR = 114
+
+
+def parse_model_spec(spec, backend='auto'):
+    """Split ``"backend:path"`` into ``(backend, path)``; plain paths keep ``backend``"""
+    prefix, sep, rest = spec.partition(':')
+    if sep and prefix in BACKENDS:
+        return prefix, rest
+    return backend, spec
+
+
+def resolve_backend(path, backend='auto'):
+    """Pick a backend: explicit choice, then DETECTOR_BACKEND, then the file type"""
+    if backend == 'auto':
+        from django.conf import settings
+        backend = getattr(settings, 'DETECTOR_BACKEND', 'auto')
+    if backend != 'auto':
+        return backend
+    if path.endswith('.xml') or path.rstrip('/').endswith('_openvino_model'):
+        return 'openvino'
+    if path.endswith('.onnx'):
+        return 'onnxruntime'
+    return 'ultralytics'
+
+
+def create_detector(path, backend='auto'):
+    """Load a detector for ``path`` with the requested (or inferred) backend"""
+    backend = resolve_backend(path, backend)
+    if backend == 'ultralytics':
+        return UltralyticsDetector(path)
+    if backend == 'onnxruntime':
+        return OnnxRuntimeDetector(path)
+    if backend == 'openvino':
+        return OpenVinoDetector(path)
+    raise ValueError(f"Unknown detector backend: {backend}")
+
+
+def _threads_per_detector():
+    """Split the CPU between the scheduler workers so runtimes do not oversubscribe it"""
+    from django.conf import settings
+    workers = getattr(settings, 'STREAM_WORKER_THREADS', None) or 1
+    return max(1, (os.cpu_count() or 1) // workers)
+
+
+class Detector(abc.ABC):
+    """
+    Common interface: ``detect(frame, conf, classes, imgsz)`` returns
+    Detections in frame pixels. ``imgsz`` is the longest side of the network
+    input; models exported with a fixed input size ignore it.
+    """
+    backend = None
+
+    def __init__(self, path):
+        self.path = path
+        self.names = {}
+
+    @abc.abstractmethod
+    def detect(self, frame, conf=0.25, classes=None, imgsz=640):
+        """Detect objects in a BGR ``frame``"""
+
+
+class UltralyticsDetector(Detector):
+    """PyTorch eager inference through ultralytics (any model it can load)"""
+    backend = 'ultralytics'
+
+    def __init__(self, path):
+        super().__init__(path)
+        # Imported on first use: ultralytics pulls in torch, which takes seconds
+        from ultralytics import YOLO
+        self.model = YOLO(path)
+        self.names = self.model.names
+
+    def detect(self, frame, conf=0.25, classes=None, imgsz=640):
+        results = self.model(frame, conf=conf, classes=classes or None, imgsz=imgsz, verbose=False)
+        return Detections.from_results(results)
+
+
+class ExportedYoloDetector(Detector):
+    """
+    YOLO models exported by ultralytics (``yolo export format=onnx|openvino``),
+    run without torch. Pre- and post-processing mirror ultralytics: letterbox
+    to the model's square input, then confidence filtering and class-aware NMS
+    on the ``(1, 4 + classes, anchors)`` output. int8-quantized exports use
+    the same layout and load the same way.
+    """
+
+    def __init__(self, path, imgsz=None):
+        super().__init__(path)
+        # None when the model was exported with dynamic=True
+        self.imgsz = imgsz
+        self._canvas = None
+
+    @abc.abstractmethod
+    def _infer(self, blob):
+        """Run the network on a preprocessed NCHW float32 ``blob``"""
+
+    def detect(self, frame, conf=0.25, classes=None, imgsz=640):
+        blob, scale, left, top = self._preprocess(frame, self.imgsz or imgsz)
+        output = self._infer(blob)
+        return self._postprocess(output, frame.shape, scale, left, top, conf, classes)
+
+    def _preprocess(self, frame, size):
+        height, width = frame.shape[:2]
+        scale = min(size / height, size / width)
+        new_width, new_height = round(width * scale), round(height * scale)
+        left, top = (size - new_width) // 2, (size - new_height) // 2
+
+        # Reuse the padded canvas: a checked-out detector is used by one thread
+        if self._canvas is None or self._canvas.shape[0] != size:
+            self._canvas = np.full((size, size, 3), LETTERBOX_COLOR, dtype=np.uint8)
+        else:
+            self._canvas.fill(LETTERBOX_COLOR)
+        self._canvas[top:top + new_height, left:left + new_width] = cv2.resize(
+            frame, (new_width, new_height), interpolation=cv2.INTER_LINEAR
+        )
+        blob = cv2.dnn.blobFromImage(self._canvas, 1 / 255.0, swapRB=True)
+        return blob, scale, left, top
+
+    def _postprocess(self, output, shape, scale, left, top, conf, classes):
+        predictions = output[0].T  # (anchors, 4 + classes)
+        scores = predictions[:, 4:]
+        class_id = scores.argmax(axis=1)
+        confidence = scores[np.arange(len(scores)), class_id]
+
+        keep = confidence >= conf
+        if classes:
+            keep &= np.isin(class_id, classes)
+        if not keep.any():
+            return Detections()
+        boxes, confidence, class_id = predictions[keep, :4], confidence[keep], class_id[keep]
+
+        # Centre/size in letterboxed pixels -> corners in frame pixels
+        xyxy = np.empty_like(boxes)
+        xyxy[:, 0] = (boxes[:, 0] - boxes[:, 2] / 2 - left) / scale
+        xyxy[:, 1] = (boxes[:, 1] - boxes[:, 3] / 2 - top) / scale
+        xyxy[:, 2] = (boxes[:, 0] + boxes[:, 2] / 2 - left) / scale
+        xyxy[:, 3] = (boxes[:, 1] + boxes[:, 3] / 2 - top) / scale
+        xyxy[:, [0, 2]] = np.clip(xyxy[:, [0, 2]], 0, shape[1])
+        xyxy[:, [1, 3]] = np.clip(xyxy[:, [1, 3]], 0, shape[0])
+        return Detections(
+            xyxy.astype(np.float32, copy=False),
+            confidence.astype(np.float32, copy=False),
+            class_id.astype(np.int32),
+        ).nms(NMS_IOU)
+
+
+def _parse_names(value):
+    """ultralytics stores class names as the repr of a dict in model metadata"""
+    try:
+        names = ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return {}
+    return {int(k): str(v) for k, v in names.items()} if isinstance(names, dict) else {}
+
+
+class OnnxRuntimeDetector(ExportedYoloDetector):
+    backend = 'onnxruntime'
+
+    def __init__(self, path):
+        try:
+            import onnxruntime
+        except ImportError:
+            raise ImportError('The onnxruntime backend requires the "onnxruntime" package')
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = _threads_per_detector()
+        options.inter_op_num_threads = 1
+        session = onnxruntime.InferenceSession(
+            path, sess_options=options, providers=['CPUExecutionProvider']
+        )
+        model_input = session.get_inputs()[0]
+        imgsz = model_input.shape[2] if isinstance(model_input.shape[2], int) else None
+        super().__init__(path, imgsz)
+        self.session = session
+        self.input_name = model_input.name
+        self.names = _parse_names(session.get_modelmeta().custom_metadata_map.get('names', ''))
+
+    def _infer(self, blob):
+        return self.session.run(None, {self.input_name: blob})[0]
+
+
+class OpenVinoDetector(ExportedYoloDetector):
+    backend = 'openvino'
+
+    def __init__(self, path):
+        try:
+            import openvino
+        except ImportError:
+            raise ImportError('The openvino backend requires the "openvino" package')
+
+        directory = None
+        if os.path.isdir(path):
+            # ultralytics exports a directory holding <name>.xml and metadata.yaml
+            directory = path
+            path = next(os.path.join(path, f) for f in sorted(os.listdir(path)) if f.endswith('.xml'))
+
+        core = openvino.Core()
+        model = core.read_model(path)
+        imgsz = model.inputs[0].get_partial_shape()[2]
+        imgsz = imgsz.get_length() if imgsz.is_static else None
+        super().__init__(path, imgsz)
+        self.compiled = core.compile_model(model, 'CPU', {
+            'PERFORMANCE_HINT': 'LATENCY',
+            'INFERENCE_NUM_THREADS': _threads_per_detector(),
+        })
+        self.request = self.compiled.create_infer_request()
+        self.names = self._read_names(model, directory or os.path.dirname(path))
+
+    @staticmethod
+    def _read_names(model, directory):
+        metadata = os.path.join(directory, 'metadata.yaml')
+        if os.path.exists(metadata):
+            try:
+                import yaml
+                with open(metadata) as f:
+                    names = (yaml.safe_load(f) or {}).get('names') or {}
+                return {int(k): str(v) for k, v in names.items()}
+            except Exception as e:
+                logger.warning(f"Could not read class names from {metadata}: {e}")
+        if model.has_rt_info(['framework', 'names']):
+            return _parse_names(model.get_rt_info(['framework', 'names']).astype(str))
+        return {}
+
+    def _infer(self, blob):
+        return self.request.infer({0: blob})[self.compiled.output(0)]
@@ -0,0 +1,138 @@
+import threading
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+
+from django.db import close_old_connections
+
+from .status_tracker import _as_uuid
+
+logger = logging.getLogger(__name__)
+
+
+class DetectionEventWriter:
+    """
+    Buffers detections in memory and writes them as DetectionEvent rows in
+    batches from a background thread.
+
+    The hot path only appends the frame's arrays to a list; building model
+    instances, normalizing boxes and the ``bulk_create`` all happen in the
+    flusher. If the database falls behind, the oldest buffered frames are
+    dropped once ``max_buffered`` is reached rather than growing memory.
+    """
+
+    def __init__(self, flush_interval=2.0, batch_size=1000, max_buffered=20000,
+                 retention_days=30):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_buffered = max_buffered
+        self.retention_days = retention_days
+        self._lock = threading.Lock()
+        self._buffer = []   # (stream_uuid, datetime, detections, names, width, height)
+        self._buffered_rows = 0
+        self._dropped = 0
+        self._last_prune = 0.0
+        self._thread = None
+
+    def record(self, stream_id, captured_at, detections, names, width, height):
+        """Queue a frame's detections (called from the hot path)"""
+        stream_id = _as_uuid(stream_id)
+        if stream_id is None or not len(detections):
+            return
+        timestamp = datetime.fromtimestamp(captured_at, timezone.utc)
+        with self._lock:
+            self._buffer.append((stream_id, timestamp, detections, names, width, height))
+            self._buffered_rows += len(detections)
+            while self._buffered_rows > self.max_buffered and len(self._buffer) > 1:
+                dropped = self._buffer.pop(0)
+                self._buffered_rows -= len(dropped[2])
+                self._dropped += len(dropped[2])
+        self._ensure_flusher()
+
+    def flush(self):
+        """Write all buffered detections to the database"""
+        from .models import DetectionEvent, Stream
+
+        with self._lock:
+            buffer, self._buffer = self._buffer, []
+            self._buffered_rows = 0
+            dropped, self._dropped = self._dropped, 0
+
+        if dropped:
+            logger.warning(f"Dropped {dropped} detection events: database writes fell behind")
+        if not buffer:
+            return
+
+        try:
+            # Streams may have been deleted since their frames were buffered
+            existing = set(Stream.objects.filter(
+                id__in={entry[0] for entry in buffer}
+            ).values_list('id', flat=True))
+
+            events = []
+            for stream_id, timestamp, detections, names, width, height in buffer:
+                if stream_id not in existing:
+                    continue
+                boxes = detections.normalized(width, height)
+                for class_id, confidence, (x1, y1, x2, y2) in zip(
+                    detections.class_id.tolist(), detections.confidence.tolist(), boxes
+                ):
+                    events.append(DetectionEvent(
+                        stream_id=stream_id, timestamp=timestamp, class_id=class_id,
+                        label=str(names.get(class_id, class_id))[:64],
+                        confidence=round(confidence, 3), x1=x1, y1=y1, x2=x2, y2=y2,
+                    ))
+            DetectionEvent.objects.bulk_create(events, batch_size=self.batch_size)
+        except Exception as e:
+            logger.error(f"Failed to write detection events: {e}")
+
+    def prune(self):
+        """Delete events older than the retention period, one stream at a time"""
+        from .models import DetectionEvent, Stream
+
+        if not self.retention_days:
+            return
+        cutoff = datetime.now(timezone.utc) - timedelta(days=self.retention_days)
+        try:
+            for stream_id in Stream.objects.values_list('id', flat=True):
+                # Each delete is a range scan on the (stream, timestamp) index
+                DetectionEvent.objects.filter(stream_id=stream_id, timestamp__lt=cutoff).delete()
+        except Exception as e:
+            logger.error(f"Failed to prune detection events: {e}")
+
+    def _ensure_flusher(self):
+        if self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._run, name='detection-event-writer', daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            close_old_connections()
+            self.flush()
+            if time.monotonic() - self._last_prune > 3600:
+                self._last_prune = time.monotonic()
+                self.prune()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_event_writer():
+    """Return the process-wide detection event writer"""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            from django.conf import settings
+            _writer = DetectionEventWriter(
+                flush_interval=getattr(settings, 'DETECTION_EVENT_FLUSH_INTERVAL', 2.0),
+                retention_days=getattr(settings, 'DETECTION_EVENT_RETENTION_DAYS', 30),
+            )
+        return _writer
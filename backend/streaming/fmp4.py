@@ -0,0 +1,94 @@
+import struct
+
+# Top-level boxes that make up the initialization segment; everything after
+# it comes as (moof, mdat) fragment pairs
+INIT_BOXES = (b'ftyp', b'moov')
+
+
+def passthrough_command(url, transport='tcp'):
+    """
+    FFmpeg command remuxing a camera's H.264 into fragmented MP4 on stdout
+    without re-encoding. ``frag_keyframe`` starts every fragment at a
+    keyframe, so a viewer that misses fragments can resume from the next one.
+    """
+    command = ['ffmpeg', '-hide_banner', '-loglevel', 'error']
+    if url.startswith('rtsp://'):
+        command += ['-rtsp_transport', transport]
+    elif not url.startswith(('http://', 'https://')):
+        # Local files play at their native rate and loop, like the OpenCV path
+        command += ['-re', '-stream_loop', '-1']
+    return command + [
+        '-i', url,
+        '-an',
+        '-c:v', 'copy',
+        '-f', 'mp4',
+        '-movflags', 'frag_keyframe+empty_moov+default_base_moof',
+        'pipe:1',
+    ]
+
+
+def read_exactly(pipe, size):
+    chunks, remaining = [], size
+    while remaining:
+        chunk = pipe.read(remaining)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b''.join(chunks)
+
+
+def read_boxes(pipe):
+    """Yield ``(type, box_bytes)`` for each top-level MP4 box read from ``pipe``"""
+    while True:
+        header = read_exactly(pipe, 8)
+        if header is None:
+            return
+        size, box_type = struct.unpack('>I4s', header)
+        if size == 1:
+            # 64-bit largesize follows the type
+            extended = read_exactly(pipe, 8)
+            if extended is None:
+                return
+            header += extended
+            size = struct.unpack('>Q', extended)[0]
+        elif size == 0:
+            # Box extends to the end of the stream; not produced by fragmented output
+            return
+        body = read_exactly(pipe, size - len(header))
+        if body is None:
+            return
+        yield box_type, header + body
+
+
+def read_fragments(pipe):
+    """
+    Split an fMP4 byte stream into the initialization segment followed by
+    media fragments (each a ``moof`` + ``mdat`` pair), yielding bytes.
+    """
+    init, fragment = [], []
+    for box_type, data in read_boxes(pipe):
+        if box_type in INIT_BOXES:
+            init.append(data)
+            if box_type == b'moov':
+                yield b''.join(init)
+                init = []
+            continue
+        fragment.append(data)
+        if box_type == b'mdat':
+            yield b''.join(fragment)
+            fragment = []
+
+
+def codec_string(init_segment):
+    """
+    RFC 6381 codec string for Media Source Extensions, e.g. ``avc1.64001F``,
+    from the avcC box inside the initialization segment (None if not H.264).
+    """
+    index = init_segment.find(b'avcC')
+    if index == -1 or index + 8 > len(init_segment):
+        return None
+    # avcC payload: configurationVersion, AVCProfileIndication,
+    # profile_compatibility, AVCLevelIndication
+    profile, compatibility, level = init_segment[index + 5:index + 8]
+    return f'avc1.{profile:02X}{compatibility:02X}{level:02X}'
@@ -0,0 +1,61 @@
+import hashlib
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'streams:list:version'
+# last_frame_time changes too often to invalidate listings; instead the ETag
+# changes every this many seconds, which bounds how stale it can be
+FRAME_TIME_BUCKET_SECONDS = 30
+
+
+def get_list_version():
+    """Current version of the cached stream listings"""
+    return cache.get_or_set(VERSION_KEY, 1, timeout=None)
+
+
+def invalidate_stream_list():
+    """Invalidate every cached stream listing"""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        # Key expired or was evicted; any new value invalidates old entries
+        cache.set(VERSION_KEY, get_list_version() + 1, timeout=None)
+
+
+def stream_list_etag(queryset, request_uri):
+    """
+    ETag for a stream listing.
+
+    Keyed on the newest ``updated_at`` and the row count (so deletes change it
+    too), the cache version, the request URI with its query string, which
+    covers the host, cursor, page size and ``fields`` selection, and a time
+    bucket so ``last_frame_time`` is refreshed.
+    """
+    state = queryset.aggregate(latest=Max('updated_at'), total=Count('id'))
+    latest = state['latest'].isoformat() if state['latest'] else ''
+    bucket = int(time.time() // FRAME_TIME_BUCKET_SECONDS)
+    raw = f"{get_list_version()}:{latest}:{state['total']}:{bucket}:{request_uri}"
+    return '"' + hashlib.md5(raw.encode('utf-8')).hexdigest() + '"'
+
+
+def etag_matches(if_none_match, etag):
+    """Check an If-None-Match header against an ETag (weak comparison)"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in candidates or etag in [tag.removeprefix('W/') for tag in candidates]
+
+
+def get_cached_listing(etag):
+    return cache.get(f'streams:list:{etag}')
+
+
+def set_cached_listing(etag, data):
+    cache.set(f'streams:list:{etag}', data,
+              timeout=getattr(settings, 'STREAM_LIST_CACHE_TIMEOUT', 30))
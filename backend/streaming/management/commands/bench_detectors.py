@@ -0,0 +1,189 @@
+"""
+Latency and accuracy comparison of detection backends on a fixed clip.
+
+Every model runs on the same frames; the first one is the reference the
+others are scored against, so an exported or int8-quantized model can be
+checked for both speed and agreement with the original:
+
+    python manage.py bench_detectors --clip samples/gate.mp4 \
+        --model yolo11n.pt \
+        --model onnxruntime:yolo11n.onnx \
+        --model openvino:yolo11n_int8_openvino_model \
+        --output bench/detectors.json
+"""
+import json
+import os
+import platform
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import cv2
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from streaming.detectors import create_detector, parse_model_spec
+from streaming.management.commands.bench_pipeline import generate_clip, percentile, _ms
+
+# Boxes of the same class overlapping at least this much count as a match
+MATCH_IOU = 0.5
+
+
+def read_frames(path, count):
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise CommandError(f"Could not open clip {path}")
+    frames = []
+    while len(frames) < count:
+        ok, frame = capture.read()
+        if not ok:
+            break
+        frames.append(frame)
+    capture.release()
+    if not frames:
+        raise CommandError(f"No frames could be read from {path}")
+    return frames
+
+
+def box_iou(a, b):
+    """Pairwise IoU of two (N, 4) and (M, 4) xyxy arrays"""
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    intersection = np.clip(bottom_right - top_left, 0, None).prod(axis=2)
+    area_a = (a[:, 2:] - a[:, :2]).prod(axis=1)
+    area_b = (b[:, 2:] - b[:, :2]).prod(axis=1)
+    return intersection / np.maximum(area_a[:, None] + area_b[None, :] - intersection, 1e-9)
+
+
+def match(reference, candidate):
+    """Greedy one-to-one matching; returns (matched, IoUs of the matches)"""
+    if not len(reference) or not len(candidate):
+        return 0, []
+    iou = box_iou(reference.xyxy, candidate.xyxy)
+    iou[reference.class_id[:, None] != candidate.class_id[None, :]] = 0
+    ious = []
+    while True:
+        i, j = np.unravel_index(iou.argmax(), iou.shape)
+        if iou[i, j] < MATCH_IOU:
+            break
+        ious.append(float(iou[i, j]))
+        iou[i, :] = 0
+        iou[:, j] = 0
+    return len(ious), ious
+
+
+class Command(BaseCommand):
+    help = 'Compare detection backends for latency and agreement on a fixed clip'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', action='append', required=True,
+                            help='Model to run, optionally as backend:path (repeatable; '
+                                 'the first is the accuracy reference)')
+        parser.add_argument('--clip', help='Local video file (default: synthetic clip)')
+        parser.add_argument('--frames', type=int, default=100, help='Frames to run per model')
+        parser.add_argument('--warmup', type=int, default=5, help='Untimed inferences per model')
+        parser.add_argument('--conf', type=float, default=0.25, help='Confidence threshold')
+        parser.add_argument('--imgsz', type=int, default=640,
+                            help='Inference size (fixed-size exported models ignore it)')
+        parser.add_argument('--label', default='', help='Free-form label stored in the results')
+        parser.add_argument('--output', help='Write JSON results to this file (default: stdout)')
+
+    def handle(self, *args, **options):
+        workdir = None
+        clip = options['clip']
+        try:
+            if not clip:
+                workdir = tempfile.mkdtemp(prefix='rtsp-bench-')
+                clip = os.path.join(workdir, 'clip.avi')
+                self.stderr.write('Generating 1280x720 synthetic clip...')
+                generate_clip(clip, 1280, 720, 30.0, max(1.0, options['frames'] / 30.0))
+            frames = read_frames(clip, options['frames'])
+        finally:
+            if workdir:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+        models, reference = [], None
+        for spec in options['model']:
+            self.stderr.write(f"Running {spec} on {len(frames)} frames...")
+            outputs, result = self._run_model(spec, frames, options)
+            if reference is None:
+                reference = outputs
+            result['agreement'] = self._agreement(reference, outputs)
+            models.append(result)
+
+        results = {'meta': self._meta(options, clip, len(frames)), 'models': models}
+        payload = json.dumps(results, indent=2)
+        if options['output']:
+            os.makedirs(os.path.dirname(os.path.abspath(options['output'])), exist_ok=True)
+            with open(options['output'], 'w') as f:
+                f.write(payload)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+        else:
+            self.stdout.write(payload)
+
+    def _run_model(self, spec, frames, options):
+        backend, path = parse_model_spec(spec)
+        started = time.perf_counter()
+        try:
+            detector = create_detector(path, backend)
+        except Exception as e:
+            raise CommandError(f"Could not load {spec}: {e}")
+        load_seconds = time.perf_counter() - started
+
+        for frame in frames[:options['warmup']]:
+            detector.detect(frame, options['conf'], imgsz=options['imgsz'])
+
+        outputs, latencies = [], []
+        for frame in frames:
+            started = time.perf_counter()
+            outputs.append(detector.detect(frame, options['conf'], imgsz=options['imgsz']))
+            latencies.append(time.perf_counter() - started)
+
+        total = sum(latencies)
+        return outputs, {
+            'model': spec,
+            'backend': detector.backend,
+            'load_seconds': round(load_seconds, 2),
+            'latency_ms': {
+                'mean': _ms(statistics.mean(latencies)),
+                'p50': _ms(percentile(latencies, 0.50)),
+                'p95': _ms(percentile(latencies, 0.95)),
+            },
+            'fps': round(len(latencies) / total, 2) if total else None,
+            'boxes_per_frame': round(statistics.mean(len(d) for d in outputs), 2),
+        }
+
+    @staticmethod
+    def _agreement(reference, outputs):
+        """Precision/recall of a model's boxes against the reference model's"""
+        matched = reference_boxes = candidate_boxes = 0
+        ious = []
+        for expected, actual in zip(reference, outputs):
+            count, frame_ious = match(expected, actual)
+            matched += count
+            ious += frame_ious
+            reference_boxes += len(expected)
+            candidate_boxes += len(actual)
+        return {
+            'precision': round(matched / candidate_boxes, 4) if candidate_boxes else None,
+            'recall': round(matched / reference_boxes, 4) if reference_boxes else None,
+            'mean_iou': round(statistics.mean(ious), 4) if ious else None,
+        }
+
+    @staticmethod
+    def _meta(options, clip, frames):
+        return {
+            'label': options['label'],
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'opencv': cv2.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'clip': options['clip'] or 'synthetic',
+            'frames': frames,
+            'match_iou': MATCH_IOU,
+            'conf': options['conf'],
+            'imgsz': options['imgsz'],
+        }
@@ -0,0 +1,301 @@
+"""
+Reproducible benchmark for the frame pipeline.
+
+Drives real StreamProcessors from synthetic local sources with fake viewers
+and writes machine-readable results, so versions can be compared offline:
+
+    python manage.py bench_pipeline --streams 4 --viewers 2 --duration 30 \
+        --output bench/$(git rev-parse --short HEAD).json
+"""
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+import cv2
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from streaming import metrics
+from streaming.stream_processor import get_stream_processor, stop_stream_processor
+from streaming.scheduler import get_scheduler
+
+
+def generate_clip(path, width, height, fps, seconds):
+    """Write a synthetic clip with moving shapes (deterministic for a given size)"""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), fps, (width, height))
+    if not writer.isOpened():
+        raise CommandError(f"Could not create synthetic clip at {path}")
+
+    rng = np.random.default_rng(0)
+    background = rng.integers(0, 64, (height, width, 3), dtype=np.uint8)
+    frames = int(fps * seconds)
+    for i in range(frames):
+        frame = background.copy()
+        x = int((i / frames) * (width - 200)) + 100
+        cv2.rectangle(frame, (x - 60, height // 3), (x + 60, height // 3 + 240), (40, 160, 220), -1)
+        cv2.circle(frame, (width - x, 2 * height // 3), 80, (200, 80, 40), -1)
+        cv2.putText(frame, f'{i:06d}', (20, 60), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (255, 255, 255), 3)
+        writer.write(frame)
+    writer.release()
+
+
+def serve_directory(directory):
+    """Serve a directory over HTTP on a free localhost port (stand-in for an HTTP camera)"""
+    handler = partial(SimpleHTTPRequestHandler, directory=directory)
+    handler.log_message = lambda *args: None
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    # Viewers disconnecting mid-response is expected when the run ends
+    server.handle_error = lambda *args: None
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def rss_bytes():
+    """Current resident set size (falls back to peak RSS off Linux)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class FakeViewer:
+    """Stands in for a StreamConsumer: drains its frame slot like the 10 ms poll loop"""
+
+    def __init__(self):
+        self.pending_messages = deque()
+        self.pending_frame = None
+        self.pending_detections = None
+        self.frames = 0
+        self.bytes = 0
+        self.ages = []
+
+    def drain(self):
+        self.pending_messages.clear()
+        self.pending_detections = None
+        frame, self.pending_frame = self.pending_frame, None
+        if frame is not None:
+            payload = json.dumps(frame)
+            self.frames += 1
+            self.bytes += len(payload)
+            self.ages.append(time.time() - frame['captured_at'])
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the frame pipeline against synthetic local sources'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--streams', type=int, default=1, help='Concurrent streams')
+        parser.add_argument('--viewers', type=int, default=1, help='Fake viewers per stream')
+        parser.add_argument('--duration', type=float, default=20.0, help='Measured seconds')
+        parser.add_argument('--warmup', type=float, default=5.0, help='Seconds before measuring')
+        parser.add_argument('--source', choices=['file', 'http', 'demo', 'url'], default='file',
+                            help='file: synthetic clip, http: clip served over local HTTP, '
+                                 'demo: built-in test pattern, url: --url as given')
+        parser.add_argument('--url', help='Source URL for --source url (e.g. a local RTSP server)')
+        parser.add_argument('--width', type=int, default=1280)
+        parser.add_argument('--height', type=int, default=720)
+        parser.add_argument('--fps', type=float, default=30.0, help='Source and target FPS')
+        parser.add_argument('--clip-seconds', type=float, default=10.0,
+                            help='Length of the synthetic clip (it loops)')
+        parser.add_argument('--no-detection', action='store_true', help='Disable detection')
+        parser.add_argument('--model', default=None, help='Detection model for the profile')
+        parser.add_argument('--backend', default=None,
+                            choices=['auto', 'ultralytics', 'onnxruntime', 'openvino'],
+                            help='Detection backend for the profile')
+        parser.add_argument('--label', default='', help='Free-form label stored in the results')
+        parser.add_argument('--output', help='Write JSON results to this file (default: stdout)')
+
+    def handle(self, *args, **options):
+        workdir = tempfile.mkdtemp(prefix='rtsp-bench-')
+        server = None
+        try:
+            source = self._prepare_source(options, workdir)
+            if options['source'] == 'http':
+                server = serve_directory(workdir)
+                source = f'http://127.0.0.1:{server.server_address[1]}/clip.avi'
+            results = self._run(source, options)
+        finally:
+            if server:
+                server.shutdown()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        payload = json.dumps(results, indent=2)
+        if options['output']:
+            os.makedirs(os.path.dirname(os.path.abspath(options['output'])), exist_ok=True)
+            with open(options['output'], 'w') as f:
+                f.write(payload)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+        else:
+            self.stdout.write(payload)
+
+    def _prepare_source(self, options, workdir):
+        if options['source'] == 'url':
+            if not options['url']:
+                raise CommandError('--source url requires --url')
+            return options['url']
+        if options['source'] == 'demo':
+            # An unopenable source makes the processor fall back to its test pattern
+            return os.path.join(workdir, 'missing-demo-source')
+
+        path = os.path.join(workdir, 'clip.avi')
+        seconds = options['clip_seconds']
+        if options['source'] == 'http':
+            # Only local files loop; over HTTP the clip must outlast the run
+            seconds = max(seconds, options['warmup'] + options['duration'] + 5)
+        self.stderr.write(f"Generating {options['width']}x{options['height']} synthetic clip...")
+        generate_clip(path, options['width'], options['height'], options['fps'], seconds)
+        return path
+
+    def _run(self, source, options):
+        profile = {'detection_enabled': not options['no_detection'], 'target_fps': options['fps']}
+        if options['model']:
+            profile['detection_model'] = options['model']
+        if options['backend']:
+            profile['detection_backend'] = options['backend']
+
+        rss_before = rss_bytes()
+        processors, viewers = [], []
+        for i in range(options['streams']):
+            stream_id = f'bench-{i}'
+            processor = get_stream_processor(stream_id, source, profile=profile)
+            stream_viewers = [FakeViewer() for _ in range(options['viewers'])]
+            for viewer in stream_viewers:
+                processor.add_consumer(viewer)
+            processors.append(processor)
+            viewers.append(stream_viewers)
+
+        stop = threading.Event()
+
+        def drain_loop():
+            while not stop.is_set():
+                for stream_viewers in viewers:
+                    for viewer in stream_viewers:
+                        viewer.drain()
+                time.sleep(0.01)
+
+        drainer = threading.Thread(target=drain_loop, daemon=True)
+        drainer.start()
+        for processor in processors:
+            processor.start()
+
+        try:
+            time.sleep(options['warmup'])
+            # Measure only the steady state after warm-up
+            for stream_viewers in viewers:
+                for viewer in stream_viewers:
+                    viewer.frames, viewer.bytes, viewer.ages = 0, 0, []
+            processed_before = [metrics.FRAMES_PROCESSED.value(p.stream_id) for p in processors]
+            stage_before = {p.stream_id: metrics.stream_stats(p.stream_id) for p in processors}
+            cpu_before, wall_before = time.process_time(), time.perf_counter()
+
+            time.sleep(options['duration'])
+
+            cpu_seconds = time.process_time() - cpu_before
+            wall_seconds = time.perf_counter() - wall_before
+            rss_after = rss_bytes()
+            per_stream = []
+            for processor, stream_viewers, before in zip(processors, viewers, processed_before):
+                stats = metrics.stream_stats(processor.stream_id)
+                ages = [age for viewer in stream_viewers for age in viewer.ages]
+                per_stream.append({
+                    'stream_id': processor.stream_id,
+                    'processed_fps': round((stats['frames_processed'] - before) / wall_seconds, 2),
+                    'delivered_fps_per_viewer': round(
+                        statistics.mean(v.frames for v in stream_viewers) / wall_seconds, 2
+                    ) if stream_viewers else None,
+                    'bytes_per_second_per_viewer': round(
+                        statistics.mean(v.bytes for v in stream_viewers) / wall_seconds
+                    ) if stream_viewers else None,
+                    'stages_ms': self._stage_delta(stage_before[processor.stream_id], stats),
+                    'frame_age_ms': {
+                        'p50': _ms(percentile(ages, 0.50)),
+                        'p95': _ms(percentile(ages, 0.95)),
+                        'p99': _ms(percentile(ages, 0.99)),
+                    },
+                    'dropped_scheduler': stats['frames_dropped_scheduler']
+                    - stage_before[processor.stream_id]['frames_dropped_scheduler'],
+                    'dropped_viewer': stats['frames_dropped_viewer']
+                    - stage_before[processor.stream_id]['frames_dropped_viewer'],
+                })
+        finally:
+            stop.set()
+            for processor in processors:
+                stop_stream_processor(processor.stream_id)
+
+        streams = max(1, options['streams'])
+        return {
+            'meta': self._meta(options, source),
+            'summary': {
+                'streams': options['streams'],
+                'viewers_per_stream': options['viewers'],
+                'measured_seconds': round(wall_seconds, 2),
+                'total_processed_fps': round(sum(s['processed_fps'] for s in per_stream), 2),
+                'mean_processed_fps': round(statistics.mean(s['processed_fps'] for s in per_stream), 2)
+                if per_stream else 0,
+                'cpu_percent': round(cpu_seconds / wall_seconds * 100, 1),
+                'cpu_percent_per_stream': round(cpu_seconds / wall_seconds * 100 / streams, 1),
+                'rss_mb': round(rss_after / 2**20, 1),
+                'rss_mb_per_stream': round((rss_after - rss_before) / 2**20 / streams, 1),
+                'scheduler_workers': get_scheduler().workers,
+            },
+            'streams': per_stream,
+        }
+
+    @staticmethod
+    def _stage_delta(before, after):
+        """Mean per-stage milliseconds over the measured window"""
+        stages = {}
+        for stage in ('capture', 'inference', 'annotate', 'encode'):
+            a, b = after.get(stage), before.get(stage)
+            if not a:
+                continue
+            count = a['count'] - (b['count'] if b else 0)
+            total = a['avg_ms'] * a['count'] - (b['avg_ms'] * b['count'] if b else 0)
+            stages[stage] = round(total / count, 3) if count else None
+        return stages
+
+    @staticmethod
+    def _meta(options, source):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5
+            ).stdout.strip() or None
+        except (OSError, subprocess.SubprocessError):
+            commit = None
+        return {
+            'label': options['label'],
+            'commit': commit,
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'opencv': cv2.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'source': options['source'] if options['source'] != 'url' else source,
+            'config': {key: options[key] for key in (
+                'streams', 'viewers', 'duration', 'warmup', 'width', 'height', 'fps',
+                'clip_seconds', 'no_detection', 'model', 'backend'
+            )},
+        }
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2) if seconds is not None else None
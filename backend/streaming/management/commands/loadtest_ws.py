@@ -0,0 +1,227 @@
+"""
+WebSocket fan-out load generator.
+
+Opens many /ws/stream/{id}/ connections against a running ASGI server, sends
+start_stream and measures what each client actually receives:
+
+    python manage.py loadtest_ws --base-url ws://127.0.0.1:8000 \
+        --rtsp-url /path/to/clip.mp4 --streams 4 --clients 400 --duration 60 \
+        --slow-fraction 0.1 --slow-delay 0.2 --output loadtest.json
+"""
+import asyncio
+import json
+import statistics
+import time
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+
+CAPTURED_AT_KEY = '"captured_at": '
+
+
+def extract_captured_at(text):
+    """
+    Read ``captured_at`` from a frame message without parsing the whole JSON.
+
+    Frames are mostly base64 payload; full json.loads per frame would make the
+    load generator itself the bottleneck at high client counts.
+    """
+    index = text.rfind(CAPTURED_AT_KEY)
+    if index == -1:
+        return None
+    start = index + len(CAPTURED_AT_KEY)
+    end = start
+    while end < len(text) and text[end] not in ',}':
+        end += 1
+    try:
+        return float(text[start:end])
+    except ValueError:
+        return None
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+
+class ClientStats:
+    def __init__(self, index, stream_id, slow):
+        self.index = index
+        self.stream_id = stream_id
+        self.slow = slow
+        self.connect_seconds = None
+        self.first_frame_seconds = None
+        self.frames = 0
+        self.bytes = 0
+        self.ages = []
+        self.gaps = []
+        self.errors = []
+        self.measuring = False
+
+    def summary(self, window):
+        return {
+            'client': self.index,
+            'stream_id': self.stream_id,
+            'slow': self.slow,
+            'connect_ms': _ms(self.connect_seconds),
+            'first_frame_ms': _ms(self.first_frame_seconds),
+            'fps': round(self.frames / window, 2) if window else 0,
+            'bytes_per_second': round(self.bytes / window) if window else 0,
+            'frame_age_p50_ms': _ms(percentile(self.ages, 0.50)),
+            'frame_age_p99_ms': _ms(percentile(self.ages, 0.99)),
+            'gap_p99_ms': _ms(percentile(self.gaps, 0.99)),
+            'errors': self.errors[:5],
+        }
+
+
+class Command(BaseCommand):
+    help = 'Load-test WebSocket frame fan-out against a running ASGI server'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='ws://127.0.0.1:8000', help='WebSocket base URL')
+        parser.add_argument('--stream-id', action='append', dest='stream_ids',
+                            help='Existing stream id to watch (repeatable)')
+        parser.add_argument('--streams', type=int, default=1,
+                            help='Number of generated stream ids when --stream-id is not given')
+        parser.add_argument('--rtsp-url', help='Source URL sent with start_stream')
+        parser.add_argument('--clients', type=int, default=100, help='Total WebSocket clients')
+        parser.add_argument('--ramp', type=float, default=50.0, help='New connections per second')
+        parser.add_argument('--duration', type=float, default=30.0, help='Measured seconds')
+        parser.add_argument('--warmup', type=float, default=5.0,
+                            help='Seconds after the last connection before measuring')
+        parser.add_argument('--slow-fraction', type=float, default=0.0,
+                            help='Fraction of clients that read slowly')
+        parser.add_argument('--slow-delay', type=float, default=0.2,
+                            help='Seconds a slow client sleeps after each message')
+        parser.add_argument('--output', help='Write JSON results to this file (default: stdout)')
+
+    def handle(self, *args, **options):
+        try:
+            import websockets  # noqa: F401
+        except ImportError:
+            raise CommandError('loadtest_ws requires the "websockets" package')
+
+        stream_ids = options['stream_ids'] or [f'loadtest-{i}' for i in range(options['streams'])]
+        if not options['stream_ids'] and not options['rtsp_url']:
+            raise CommandError('Generated stream ids need --rtsp-url (or pass --stream-id)')
+
+        results = asyncio.run(self._run(stream_ids, options))
+        payload = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(payload)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+        else:
+            self.stdout.write(payload)
+
+    async def _run(self, stream_ids, options):
+        slow_every = round(1 / options['slow_fraction']) if options['slow_fraction'] > 0 else 0
+        clients = [
+            ClientStats(i, stream_ids[i % len(stream_ids)], bool(slow_every) and i % slow_every == 0)
+            for i in range(options['clients'])
+        ]
+        stop = asyncio.Event()
+        tasks = []
+        for client in clients:
+            tasks.append(asyncio.create_task(self._client(client, options, stop)))
+            await asyncio.sleep(1 / options['ramp'] if options['ramp'] > 0 else 0)
+
+        await asyncio.sleep(options['warmup'])
+        for client in clients:
+            client.frames, client.bytes, client.ages, client.gaps = 0, 0, [], []
+            client.measuring = True
+        started = time.perf_counter()
+        await asyncio.sleep(options['duration'])
+        window = time.perf_counter() - started
+        for client in clients:
+            client.measuring = False
+        stop.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        return self._report(clients, window, options, stream_ids)
+
+    async def _client(self, client, options, stop):
+        import websockets
+
+        url = f"{options['base_url'].rstrip('/')}/ws/stream/{client.stream_id}/"
+        start_message = {'type': 'start_stream'}
+        if options['rtsp_url']:
+            start_message['rtsp_url'] = options['rtsp_url']
+
+        connect_started = time.perf_counter()
+        try:
+            async with websockets.connect(url, max_size=None, open_timeout=30) as ws:
+                client.connect_seconds = time.perf_counter() - connect_started
+                await ws.send(json.dumps(start_message))
+                last_frame = None
+                while not stop.is_set():
+                    try:
+                        text = await asyncio.wait_for(ws.recv(), timeout=1.0)
+                    except asyncio.TimeoutError:
+                        continue
+                    if not isinstance(text, str) or '"type": "frame"' not in text[:40]:
+                        continue
+
+                    now = time.perf_counter()
+                    if client.first_frame_seconds is None:
+                        client.first_frame_seconds = now - connect_started
+                    if client.measuring:
+                        client.frames += 1
+                        client.bytes += len(text)
+                        captured_at = extract_captured_at(text)
+                        if captured_at is not None:
+                            client.ages.append(time.time() - captured_at)
+                        if last_frame is not None:
+                            client.gaps.append(now - last_frame)
+                    last_frame = now
+
+                    if client.slow:
+                        await asyncio.sleep(options['slow_delay'])
+        except Exception as e:
+            client.errors.append(f'{type(e).__name__}: {e}')
+
+    def _report(self, clients, window, options, stream_ids):
+        def aggregate(group):
+            ages = [age for c in group for age in c.ages]
+            gaps = [gap for c in group for gap in c.gaps]
+            fps = [c.frames / window for c in group] if window else []
+            connects = [c.connect_seconds for c in group if c.connect_seconds is not None]
+            return {
+                'clients': len(group),
+                'connected': len(connects),
+                'failed': sum(1 for c in group if c.errors and c.connect_seconds is None),
+                'fps_mean': round(statistics.mean(fps), 2) if fps else 0,
+                'fps_min': round(min(fps), 2) if fps else 0,
+                'frame_age_ms': {q: _ms(percentile(ages, p)) for q, p in
+                                 (('p50', 0.5), ('p95', 0.95), ('p99', 0.99), ('max', 1.0))},
+                'inter_frame_gap_ms': {q: _ms(percentile(gaps, p)) for q, p in
+                                       (('p50', 0.5), ('p99', 0.99))},
+                'connect_ms': {q: _ms(percentile(connects, p)) for q, p in
+                               (('p50', 0.5), ('p99', 0.99))},
+                'bytes_per_second': round(sum(c.bytes for c in group) / window) if window else 0,
+            }
+
+        fast = [c for c in clients if not c.slow]
+        slow = [c for c in clients if c.slow]
+        return {
+            'meta': {
+                'timestamp': datetime.now(timezone.utc).isoformat(),
+                'base_url': options['base_url'],
+                'stream_ids': stream_ids,
+                'clients': options['clients'],
+                'ramp_per_second': options['ramp'],
+                'measured_seconds': round(window, 2),
+                'slow_fraction': options['slow_fraction'],
+                'slow_delay': options['slow_delay'],
+            },
+            'all': aggregate(clients),
+            'normal_readers': aggregate(fast),
+            'slow_readers': aggregate(slow) if slow else None,
+            'clients': [c.summary(window) for c in clients],
+        }
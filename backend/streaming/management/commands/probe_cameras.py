@@ -0,0 +1,72 @@
+"""
+Probe camera streams once and print reachability and stream metadata:
+
+    python manage.py probe_cameras
+    python manage.py probe_cameras --stream-id <uuid> --json
+    python manage.py probe_cameras --url rtsp://127.0.0.1:8554/cam --timeout 2
+
+Registered streams are probed concurrently on the prober's worker pool and the
+results are cached like the background prober's (so with a Redis cache the
+API reports them right away). ``--url`` probes arbitrary URLs without touching
+the database, e.g. local stand-in servers.
+"""
+import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from streaming.models import Stream
+from streaming.prober import CameraProber, probe_url
+
+
+class Command(BaseCommand):
+    help = 'Probe camera streams (RTSP DESCRIBE / ffprobe) and report reachability, codec, size and fps'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stream-id', action='append', dest='stream_ids',
+                            help='Stream to probe (repeatable; default: all camera streams)')
+        parser.add_argument('--url', action='append', dest='urls',
+                            help='Probe this URL instead of registered streams (repeatable)')
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent probes')
+        parser.add_argument('--timeout', type=float, default=5.0, help='Seconds per probe')
+        parser.add_argument('--json', action='store_true', help='Print JSON instead of a table')
+
+    def handle(self, *args, **options):
+        if options['urls']:
+            with ThreadPoolExecutor(max_workers=max(1, options['workers'])) as pool:
+                probes = pool.map(lambda url: probe_url(url, options['timeout']), options['urls'])
+                results = dict(zip(options['urls'], probes))
+            rows = list(results.items())
+        else:
+            streams = Stream.objects.filter(kind='camera')
+            if options['stream_ids']:
+                stream_ids = []
+                for stream_id in options['stream_ids']:
+                    try:
+                        stream_ids.append(uuid.UUID(stream_id))
+                    except ValueError:
+                        raise CommandError(f'Invalid stream id: {stream_id}')
+                streams = streams.filter(id__in=stream_ids)
+            streams = list(streams)
+            if not streams:
+                raise CommandError('No camera streams to probe')
+            prober = CameraProber(workers=options['workers'], ttl=settings.CAMERA_PROBE_TTL,
+                                  interval=0, timeout=options['timeout'])
+            results = prober.probe_streams(streams, max_age=0)
+            rows = [(str(stream.id), results[str(stream.id)]) for stream in streams]
+
+        if options['json']:
+            self.stdout.write(json.dumps(dict(rows), indent=2))
+        else:
+            for key, result in rows:
+                size = f"{result['width']}x{result['height']}" if result['width'] else '-'
+                self.stdout.write(
+                    f"{key}  {result['status']:<11} {result['codec'] or '-':<6} {size:<10} "
+                    f"{result['fps'] or '-':<6} {result['latency_ms']:>7.1f} ms  {result.get('error') or ''}"
+                )
+
+        unreachable = sum(1 for _, result in rows if not result['reachable'])
+        if unreachable:
+            self.stderr.write(f"{unreachable} of {len(rows)} unreachable")
@@ -0,0 +1,210 @@
+import threading
+import bisect
+
+# Latency buckets in seconds, from sub-millisecond encodes to multi-second stalls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    pairs = list(zip(labelnames, labelvalues))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Metric:
+    """Base class for a labelled metric; the first label is always the stream id"""
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=('stream',)):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def remove_stream(self, stream_id):
+        with self._lock:
+            for key in [key for key in self._values if key[0] == stream_id]:
+                del self._values[key]
+
+    def _header(self):
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues):
+        return self._values.get(labelvalues, 0)
+
+    def render(self):
+        lines = self._header()
+        with self._lock:
+            for key, value in self._values.items():
+                lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {value}')
+        return lines
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, *labelvalues, value):
+        with self._lock:
+            self._values[labelvalues] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=('stream',), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, *labelvalues, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labelvalues)
+            if state is None:
+                # [per-bucket counts (+Inf last), sum, count]
+                state = self._values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def summary(self, *labelvalues):
+        """Count, mean and bucket-estimated p50/p95/p99 in milliseconds"""
+        with self._lock:
+            state = self._values.get(labelvalues)
+            if state is None:
+                return None
+            counts, total, count = list(state[0]), state[1], state[2]
+
+        def quantile_ms(q):
+            # Upper bound of the bucket holding the quantile; None past the last bucket
+            target = q * count
+            running = 0
+            for i, bucket_count in enumerate(counts[:-1]):
+                running += bucket_count
+                if running >= target:
+                    return self.buckets[i] * 1000
+            return None
+
+        return {
+            'count': count,
+            'avg_ms': round(total / count * 1000, 3) if count else 0.0,
+            'p50_ms': quantile_ms(0.50),
+            'p95_ms': quantile_ms(0.95),
+            'p99_ms': quantile_ms(0.99),
+        }
+
+    def render(self):
+        lines = self._header()
+        with self._lock:
+            items = [(key, list(state[0]), state[1], state[2]) for key, state in self._values.items()]
+        for key, counts, total, count in items:
+            running = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                running += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                labels = _format_labels(self.labelnames, key, ('le', le))
+                lines.append(f'{self.name}_bucket{labels} {running}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {total}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, documentation, labelnames=('stream',)):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=('stream',)):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=('stream',), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def remove_stream(self, stream_id):
+        """Drop all series of a stream whose processor went away"""
+        for metric in self._metrics:
+            metric.remove_stream(stream_id)
+
+    def render(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+CAPTURE_SECONDS = registry.histogram(
+    'rtsp_capture_seconds', 'Time spent reading (and decoding) a frame from the source')
+INFERENCE_SECONDS = registry.histogram(
+    'rtsp_inference_seconds', 'Time spent in object detection per frame')
+ANNOTATE_SECONDS = registry.histogram(
+    'rtsp_annotate_seconds',
+    'Time spent post-processing detections per frame (region merging, filtering, NMS, event recording)')
+ENCODE_SECONDS = registry.histogram(
+    'rtsp_encode_seconds', 'Time spent resizing, drawing detections and JPEG/base64 encoding per frame')
+FRAME_AGE_SECONDS = registry.histogram(
+    'rtsp_frame_age_seconds', 'End-to-end age of a frame from capture to WebSocket send')
+FRAMES_PROCESSED = registry.counter(
+    'rtsp_frames_processed_total', 'Frames processed and fanned out to viewers')
+FRAMES_STATIC = registry.counter(
+    'rtsp_frames_static_total', 'Frames not processed or sent because the scene had not changed')
+FRAMES_DROPPED = registry.counter(
+    'rtsp_frames_dropped_total',
+    'Frames dropped before delivery '
+    '(scheduler: worker pool busy, viewer: slow consumer, recorder: disk writes behind)',
+    labelnames=('stream', 'reason'))
+BYTES_SENT = registry.counter(
+    'rtsp_bytes_sent_total', 'Bytes sent to WebSocket viewers')
+RECORDED_BYTES = registry.counter(
+    'rtsp_recorded_bytes_total', 'JPEG bytes appended to recording segments')
+READ_FAILURES = registry.counter(
+    'rtsp_read_failures_total', 'Failed frame reads from the source')
+RECONNECTS = registry.counter(
+    'rtsp_reconnects_total', 'Connection attempts after the first one (fallback methods)')
+VIEWERS = registry.gauge(
+    'rtsp_viewers', 'Consumers attached to a stream processor')
+
+
+def stream_stats(stream_id):
+    """Per-stream snapshot used by the WebSocket ``stats`` message"""
+    return {
+        'frames_processed': FRAMES_PROCESSED.value(stream_id),
+        'frames_dropped_scheduler': FRAMES_DROPPED.value(stream_id, 'scheduler'),
+        'frames_dropped_viewer': FRAMES_DROPPED.value(stream_id, 'viewer'),
+        'frames_static': FRAMES_STATIC.value(stream_id),
+        'bytes_sent': BYTES_SENT.value(stream_id),
+        'frames_dropped_recorder': FRAMES_DROPPED.value(stream_id, 'recorder'),
+        'recorded_bytes': RECORDED_BYTES.value(stream_id),
+        'read_failures': READ_FAILURES.value(stream_id),
+        'reconnects': RECONNECTS.value(stream_id),
+        'viewers': VIEWERS.value(stream_id),
+        'capture': CAPTURE_SECONDS.summary(stream_id),
+        'inference': INFERENCE_SECONDS.summary(stream_id),
+        'annotate': ANNOTATE_SECONDS.summary(stream_id),
+        'encode': ENCODE_SECONDS.summary(stream_id),
+        'frame_age': FRAME_AGE_SECONDS.summary(stream_id),
+    }
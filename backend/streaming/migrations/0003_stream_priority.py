@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 08:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('streaming', '0002_alter_stream_rtsp_url'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stream',
+            name='priority',
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+    ]
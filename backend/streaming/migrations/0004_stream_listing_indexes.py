@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-19 08:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('streaming', '0003_stream_priority'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stream',
+            index=models.Index(fields=['-created_at'], name='stream_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stream',
+            index=models.Index(fields=['updated_at'], name='stream_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.5 on 2026-10-19 08:26
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('streaming', '0004_stream_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stream',
+            name='confidence_threshold',
+            field=models.FloatField(default=0.25, validators=[django.core.validators.MinValueValidator(0.0), django.core.validators.MaxValueValidator(1.0)]),
+        ),
+        migrations.AddField(
+            model_name='stream',
+            name='detection_enabled',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='stream',
+            name='detection_model',
+            field=models.CharField(default='yolo11n.pt', max_length=200),
+        ),
+        migrations.AddField(
+            model_name='stream',
+            name='jpeg_quality',
+            field=models.PositiveSmallIntegerField(default=85, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(100)]),
+        ),
+        migrations.AddField(
+            model_name='stream',
+            name='output_width',
+            field=models.PositiveIntegerField(default=800, validators=[django.core.validators.MinValueValidator(64), django.core.validators.MaxValueValidator(3840)]),
+        ),
+        migrations.AddField(
+            model_name='stream',
+            name='rtsp_transport',
+            field=models.CharField(choices=[('tcp', 'TCP'), ('udp', 'UDP')], default='tcp', max_length=8),
+        ),
+        migrations.AddField(
+            model_name='stream',
+            name='target_fps',
+            field=models.FloatField(default=30.0, validators=[django.core.validators.MinValueValidator(0.1), django.core.validators.MaxValueValidator(60.0)]),
+        ),
+    ]
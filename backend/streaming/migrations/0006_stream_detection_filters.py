@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-19 08:37
+
+import django.core.validators
+import streaming.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('streaming', '0005_stream_processing_profile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stream',
+            name='detection_classes',
+            field=models.JSONField(blank=True, default=list, validators=[streaming.models.validate_class_ids]),
+        ),
+        migrations.AddField(
+            model_name='stream',
+            name='max_boxes',
+            field=models.PositiveSmallIntegerField(default=100, validators=[django.core.validators.MaxValueValidator(1000)]),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 08:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('streaming', '0006_stream_detection_filters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stream',
+            name='overlay_mode',
+            field=models.CharField(choices=[('server', 'Drawn into the frame'), ('client', 'Sent as data for the viewer to draw')], default='server', max_length=8),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-19 08:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('streaming', '0007_stream_overlay_mode'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stream',
+            name='record_detections',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='DetectionEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('timestamp', models.DateTimeField()),
+                ('class_id', models.PositiveSmallIntegerField()),
+                ('label', models.CharField(max_length=64)),
+                ('confidence', models.FloatField()),
+                ('x1', models.FloatField()),
+                ('y1', models.FloatField()),
+                ('x2', models.FloatField()),
+                ('y2', models.FloatField()),
+                ('stream', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='detection_events', to='streaming.stream')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['stream', 'timestamp'], name='detection_stream_time_idx'), models.Index(fields=['stream', 'class_id', 'timestamp'], name='detection_class_time_idx')],
+            },
+        ),
+    ]
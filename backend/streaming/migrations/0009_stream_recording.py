@@ -0,0 +1,24 @@
+# Generated by Django 5.2.5 on 2026-10-19 08:44
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('streaming', '0008_detection_events'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stream',
+            name='recording_enabled',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='stream',
+            name='recording_retention_hours',
+            field=models.PositiveSmallIntegerField(default=24, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(720)]),
+        ),
+    ]
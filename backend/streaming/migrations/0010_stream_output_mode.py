@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 08:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('streaming', '0009_stream_recording'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stream',
+            name='output_mode',
+            field=models.CharField(choices=[('mjpeg', 'Per-frame JPEG'), ('fmp4', 'H.264 passthrough as fragmented MP4')], default='mjpeg', max_length=8),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 08:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('streaming', '0010_stream_output_mode'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stream',
+            name='detection_backend',
+            field=models.CharField(choices=[('auto', 'From DETECTOR_BACKEND or the model file type'), ('ultralytics', 'PyTorch (ultralytics)'), ('onnxruntime', 'ONNX Runtime'), ('openvino', 'OpenVINO')], default='auto', max_length=16),
+        ),
+    ]
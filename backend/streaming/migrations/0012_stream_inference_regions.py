@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-19 08:59
+
+import django.core.validators
+import streaming.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('streaming', '0011_stream_detection_backend'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stream',
+            name='inference_size',
+            field=models.PositiveSmallIntegerField(default=640, validators=[django.core.validators.MinValueValidator(160), django.core.validators.MaxValueValidator(1280), streaming.models.validate_inference_size]),
+        ),
+        migrations.AddField(
+            model_name='stream',
+            name='roi_regions',
+            field=models.JSONField(blank=True, default=list, validators=[streaming.models.validate_roi_regions]),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.5 on 2026-10-19 09:07
+
+import streaming.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('streaming', '0012_stream_inference_regions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stream',
+            name='kind',
+            field=models.CharField(choices=[('camera', 'Camera'), ('mosaic', 'Mosaic of other streams')], default='camera', max_length=8),
+        ),
+        migrations.AddField(
+            model_name='stream',
+            name='mosaic_layout',
+            field=models.JSONField(blank=True, default=dict, validators=[streaming.models.validate_mosaic_layout]),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.5 on 2026-10-19 09:14
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('streaming', '0013_stream_mosaic'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stream',
+            name='static_max_skip_seconds',
+            field=models.FloatField(default=10.0, validators=[django.core.validators.MinValueValidator(1.0), django.core.validators.MaxValueValidator(600.0)]),
+        ),
+        migrations.AddField(
+            model_name='stream',
+            name='static_threshold',
+            field=models.FloatField(default=0.0, validators=[django.core.validators.MinValueValidator(0.0), django.core.validators.MaxValueValidator(100.0)]),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-19 09:50
+
+import streaming.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('streaming', '0014_stream_static_frames'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='stream',
+            name='detection_model',
+            field=models.CharField(default='yolo11n.pt', max_length=200, validators=[streaming.models.validate_detection_model]),
+        ),
+    ]
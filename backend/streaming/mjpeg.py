@@ -0,0 +1,82 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+from .capacity import get_capacity
+from .playback import mjpeg_part
+from .status_tracker import get_status_tracker
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Frame rates a client can ask for with ?fps=
+MIN_CLIENT_FPS = 0.1
+MAX_CLIENT_FPS = 60.0
+# Without new frames (e.g. a static scene) the last one is repeated this often,
+# so NVRs and proxies with read timeouts keep the connection
+REPEAT_SECONDS = 10.0
+
+
+class MjpegClient:
+    """
+    One HTTP multipart MJPEG client, attached to a stream processor like a
+    WebSocket viewer. The processor hands it the JPEG bytes it already encoded
+    (``jpeg_frames``); the client keeps only the latest one, so a slow client
+    skips frames instead of queueing them, and wakes its response generator on
+    the event loop, so clients need no threads of their own.
+    """
+
+    jpeg_frames = True
+
+    def __init__(self, stream_id, loop, fps=None):
+        self.stream_id = stream_id
+        self.loop = loop
+        self.min_frame_interval = 1.0 / fps if fps else 0.0
+        self.next_frame_at = 0.0
+        self.pending_jpeg = None  # (jpeg bytes, captured_at) not sent yet
+        self.wakeup = asyncio.Event()
+        # Control messages of the stream are not used; keep only a few
+        self.pending_messages = deque(maxlen=16)
+
+    def offer_jpeg(self, jpeg, captured_at):
+        """Called by the processor's worker with every encoded frame"""
+        now = time.monotonic()
+        if self.min_frame_interval:
+            if now < self.next_frame_at:
+                return
+            self.next_frame_at = max(self.next_frame_at + self.min_frame_interval, now)
+        if self.pending_jpeg is not None:
+            metrics.FRAMES_DROPPED.inc(self.stream_id, 'viewer')
+        self.pending_jpeg = (jpeg, captured_at)
+        try:
+            self.loop.call_soon_threadsafe(self.wakeup.set)
+        except RuntimeError:
+            pass  # The client's event loop is gone
+
+    async def parts(self, processor):
+        """Multipart body: the latest frame whenever there is a new one"""
+        last = None
+        get_status_tracker().viewer_joined(self.stream_id)
+        try:
+            # A queued stream (see capacity) is not running yet; keep waiting
+            while processor.is_running or get_capacity().is_queued(processor.stream_id):
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), REPEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if last is None:
+                        continue
+                    yield mjpeg_part(last[0], last[1])
+                    continue
+                self.wakeup.clear()
+                pending, self.pending_jpeg = self.pending_jpeg, None
+                if pending is None:
+                    continue
+                last = pending
+                yield mjpeg_part(*pending)
+                metrics.BYTES_SENT.inc(self.stream_id, amount=len(pending[0]))
+                metrics.FRAME_AGE_SECONDS.observe(self.stream_id, value=time.time() - pending[1])
+        finally:
+            processor.remove_consumer(self)
+            get_status_tracker().viewer_left(self.stream_id, deactivate=not processor.consumers)
+            logger.info(f"MJPEG client left stream {self.stream_id}")
@@ -0,0 +1,166 @@
+import threading
+import logging
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from .detectors import create_detector, parse_model_spec, resolve_backend
+
+logger = logging.getLogger(__name__)
+
+# After a model fails to load, checkouts fail fast for this long (doubling on
+# each further failure up to LOAD_RETRY_MAX_SECONDS) instead of retrying on
+# every frame
+LOAD_RETRY_SECONDS = 5.0
+LOAD_RETRY_MAX_SECONDS = 300.0
+
+
+def check_model_allowed(name, backend):
+    """Raise ValueError unless DETECTION_MODELS allows ``name`` on the (resolved) ``backend``"""
+    from .models import allowed_detection_models
+
+    backends = allowed_detection_models().get(name, set())
+    if 'auto' not in backends and backend not in backends:
+        raise ValueError(f"Detection model {backend}:{name} is not listed in DETECTION_MODELS")
+
+
+class ModelPool:
+    """
+    Detection models shared by all streams.
+
+    Each (backend, model) pair keeps a free list of loaded detectors. A worker checks an
+    instance out for the duration of one inference, so an instance is never
+    used by two threads at once, and the pool only grows to the number of
+    concurrent inferences (bounded by the scheduler's worker count) instead of
+    one model per stream.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._idle = {}       # model key -> [loaded instances not in use]
+        self._instances = {}  # model key -> instances created
+        self._warm = {}       # model key -> warm-up seconds
+        self._errors = {}     # model key -> last load/warm-up error
+        self._retry = {}      # model key -> (monotonic time loading may be retried, backoff seconds)
+        self._warm_up_thread = None
+        self._warm_up_names = []
+
+    @staticmethod
+    def key(name, backend='auto'):
+        """Pool key for a model, e.g. ``"onnxruntime:yolo11n.onnx"``"""
+        return f'{resolve_backend(name, backend)}:{name}'
+
+    def available(self, name, backend='auto'):
+        """False while a failed model is backing off (checkout would raise)"""
+        key = self.key(name, backend)
+        with self._lock:
+            retry = self._retry.get(key)
+        return retry is None or time.monotonic() >= retry[0]
+
+    @contextmanager
+    def checkout(self, name, backend='auto'):
+        """
+        Borrow a loaded detector for ``name``, loading a new one if all are
+        busy. Only models allowed by DETECTION_MODELS are loaded; after a load
+        failure the error is raised again without retrying until the backoff
+        expires.
+        """
+        key = self.key(name, backend)
+        with self._lock:
+            idle = self._idle.get(key)
+            detector = idle.pop() if idle else None
+            retry = self._retry.get(key)
+            if detector is None and retry is not None and time.monotonic() < retry[0]:
+                raise RuntimeError(self._errors.get(key) or f"Detection model {key} failed to load")
+        if detector is None:
+            try:
+                check_model_allowed(name, resolve_backend(name, backend))
+                detector = create_detector(name, backend)
+            except Exception as e:
+                with self._lock:
+                    delay = min(retry[1] * 2, LOAD_RETRY_MAX_SECONDS) if retry else LOAD_RETRY_SECONDS
+                    self._retry[key] = (time.monotonic() + delay, delay)
+                    self._errors[key] = str(e)
+                logger.error(f"Loading detection model {key} failed, retrying in {delay:.0f}s: {e}")
+                raise
+            with self._lock:
+                self._instances[key] = self._instances.get(key, 0) + 1
+                self._retry.pop(key, None)
+                self._errors.pop(key, None)
+            logger.info(f"Loaded detection model {key}")
+        try:
+            yield detector
+        finally:
+            with self._lock:
+                self._idle.setdefault(key, []).append(detector)
+
+    def warm_up(self, specs, imgsz=640):
+        """
+        Load each model and run one dummy inference so the first frame is not
+        slow. Specs are model names, optionally prefixed with a backend
+        (``"openvino:yolo11n_int8_openvino_model"``).
+        """
+        for spec in specs:
+            backend, name = parse_model_spec(spec)
+            key = self.key(name, backend)
+            started = time.perf_counter()
+            try:
+                with self.checkout(name, backend) as detector:
+                    detector.detect(np.zeros((imgsz, imgsz, 3), dtype=np.uint8))
+            except Exception as e:
+                with self._lock:
+                    self._errors[key] = str(e)
+                logger.error(f"Warm-up of detection model {key} failed: {e}")
+                continue
+            with self._lock:
+                self._warm[key] = time.perf_counter() - started
+                self._errors.pop(key, None)
+            logger.info(f"Detection model {key} warmed up in {self._warm[key]:.1f}s")
+
+    def start_warm_up(self, specs):
+        """Warm up models on a background thread (used at server startup)"""
+        specs = [spec for spec in specs if spec]
+        if not specs:
+            return
+        self._warm_up_names = []
+        for spec in specs:
+            backend, name = parse_model_spec(spec)
+            self._warm_up_names.append(self.key(name, backend))
+        self._warm_up_thread = threading.Thread(
+            target=self.warm_up, args=(specs,), name='model-warm-up', daemon=True
+        )
+        self._warm_up_thread.start()
+
+    def status(self):
+        """Readiness snapshot for the health endpoint"""
+        warming = bool(self._warm_up_thread and self._warm_up_thread.is_alive())
+        with self._lock:
+            models = {
+                name: {
+                    'instances': self._instances.get(name, 0),
+                    'idle': len(self._idle.get(name, [])),
+                    'warm_up_seconds': round(self._warm[name], 2) if name in self._warm else None,
+                    'error': self._errors.get(name),
+                }
+                for name in set(self._instances) | set(self._warm_up_names) | set(self._errors)
+            }
+        return {
+            # Ready once every model requested for warm-up is loaded and warm
+            'ready': not warming and all(name in self._warm for name in self._warm_up_names),
+            'warming': warming,
+            'models': models,
+        }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_model_pool():
+    """Return the process-wide detection model pool"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ModelPool()
+        return _pool
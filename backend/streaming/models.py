@@ -1,11 +1,24 @@
 from django.db import models
-from django.core.validators import URLValidator
+from django.core.validators import URLValidator, MinValueValidator, MaxValueValidator
 from django.core.exceptions import ValidationError
+import os
 import uuid
 import re
 
+# Source URL of composite (mosaic) streams, which have no camera of their own
+MOSAIC_URL = 'mosaic://'
+# Most tiles a mosaic can have
+MAX_MOSAIC_TILES = 64
+# Smallest region of interest, as a fraction of the frame width and height;
+# smaller ones crop to nothing on low-resolution cameras
+MIN_ROI_SIZE = 0.01
+
 def validate_rtsp_url(value):
     """Custom validator for RTSP and HTTP URLs"""
+    # Mosaic streams are composed from other streams
+    if value == MOSAIC_URL:
+        return
+
     # Allow HTTP/HTTPS URLs
     if value.startswith(('http://', 'https://')):
         try:
@@ -23,14 +36,251 @@ def validate_rtsp_url(value):
     # If we get here, it's neither valid HTTP nor RTSP
     raise ValidationError('Enter a valid RTSP, HTTP, or HTTPS URL.')
 
+def validate_class_ids(value):
+    """Detection class filter: a list of non-negative class ids (empty = all)"""
+    if not isinstance(value, list) or not all(
+        isinstance(item, int) and not isinstance(item, bool) and item >= 0 for item in value
+    ):
+        raise ValidationError('Enter a list of non-negative class ids.')
+
+def validate_inference_size(value):
+    """Network input size must be a multiple of the model stride"""
+    if value % 32:
+        raise ValidationError('Inference size must be a multiple of 32.')
+
+def allowed_detection_models():
+    """
+    ``{model: backends}`` streams may use, from DETECTION_MODELS and
+    DETECTOR_WARMUP_MODELS; ``"auto"`` in backends allows any runtime.
+    """
+    from django.conf import settings
+
+    runtimes = {choice for choice, _ in Stream.BACKEND_CHOICES} - {'auto'}
+    allowed = {}
+    for spec in (list(getattr(settings, 'DETECTION_MODELS', []))
+                 + list(getattr(settings, 'DETECTOR_WARMUP_MODELS', []))):
+        backend, sep, name = spec.partition(':')
+        if not (sep and backend in runtimes):
+            backend, name = 'auto', spec
+        allowed.setdefault(name, set()).add(backend)
+    return allowed
+
+def validate_detection_model(value):
+    """Only models listed in DETECTION_MODELS; never URLs or paths outside the working directory"""
+    if ('://' in value or os.path.isabs(value) or value.startswith(('/', '\\'))
+            or '..' in re.split(r'[\\/]', value)):
+        raise ValidationError('Enter a model name from DETECTION_MODELS, not a URL or path.')
+    allowed = allowed_detection_models()
+    if value not in allowed:
+        raise ValidationError(f"Unknown detection model. Available: {', '.join(sorted(allowed))}.")
+
+def validate_mosaic_layout(value):
+    """
+    Mosaic layout: ``{"tiles": [...], "columns": 3, "tile_aspect": 1.78}``.
+    Each tile is a stream id or ``{"stream": id, "fps": 5}``; ``columns``
+    (default: square grid) and ``tile_aspect`` (width / height, default 16:9)
+    are optional. An empty object is allowed for camera streams.
+    """
+    if not isinstance(value, dict):
+        raise ValidationError('Enter a layout object.')
+    unknown = set(value) - {'tiles', 'columns', 'tile_aspect'}
+    if unknown:
+        raise ValidationError(f"Unknown layout keys: {', '.join(sorted(unknown))}.")
+    tiles = value.get('tiles', [])
+    if not isinstance(tiles, list) or len(tiles) > MAX_MOSAIC_TILES:
+        raise ValidationError(f'tiles must be a list of at most {MAX_MOSAIC_TILES} streams.')
+    for tile in tiles:
+        if isinstance(tile, dict):
+            fps = tile.get('fps')
+            if set(tile) - {'stream', 'fps'} or (
+                fps is not None and not (isinstance(fps, (int, float)) and not isinstance(fps, bool)
+                                         and 0.1 <= fps <= 60)
+            ):
+                raise ValidationError('A tile is {"stream": id, "fps": 0.1-60}.')
+            tile = tile.get('stream')
+        try:
+            uuid.UUID(str(tile))
+        except ValueError:
+            raise ValidationError(f'Invalid stream id in tiles: {tile!r}.')
+    columns = value.get('columns')
+    if columns is not None and not (isinstance(columns, int) and not isinstance(columns, bool)
+                                    and 1 <= columns <= 16):
+        raise ValidationError('columns must be between 1 and 16.')
+    aspect = value.get('tile_aspect')
+    if aspect is not None and not (isinstance(aspect, (int, float)) and not isinstance(aspect, bool)
+                                   and 0.25 <= aspect <= 4):
+        raise ValidationError('tile_aspect must be between 0.25 and 4.')
+
+def validate_roi_regions(value):
+    """
+    Regions of interest: a list of regions, each a list of [x, y] points as
+    fractions of the frame size. Two points are the corners of a rectangle,
+    three or more a polygon. Regions must have an area, at least
+    MIN_ROI_SIZE of the frame wide and high.
+    """
+    message = 'Enter a list of regions, each a list of at least two [x, y] points between 0 and 1.'
+    if not isinstance(value, list) or len(value) > 16:
+        raise ValidationError(message)
+    for region in value:
+        if not isinstance(region, list) or not 2 <= len(region) <= 64:
+            raise ValidationError(message)
+        for point in region:
+            if not (
+                isinstance(point, list) and len(point) == 2
+                and all(isinstance(c, (int, float)) and not isinstance(c, bool) and 0 <= c <= 1
+                        for c in point)
+            ):
+                raise ValidationError(message)
+        xs, ys = [point[0] for point in region], [point[1] for point in region]
+        too_small = max(xs) - min(xs) < MIN_ROI_SIZE or max(ys) - min(ys) < MIN_ROI_SIZE
+        if not too_small and len(region) > 2:
+            # Shoelace formula; points on one line enclose nothing
+            area = abs(sum(x0 * y1 - x1 * y0 for (x0, y0), (x1, y1)
+                           in zip(region, region[1:] + region[:1]))) / 2
+            too_small = area < MIN_ROI_SIZE ** 2
+        if too_small:
+            raise ValidationError(f'Region {region} has no area: regions must be at least '
+                                  f'{MIN_ROI_SIZE:g} of the frame wide and high.')
+
+# Processing profile used when a stream has no database row (or before one is
+# loaded). Field defaults on Stream come from here as well.
+DEFAULT_PROFILE = {
+    'detection_enabled': True,
+    'detection_model': 'yolo11n.pt',
+    'detection_backend': 'auto',
+    'inference_size': 640,
+    'roi_regions': [],
+    'confidence_threshold': 0.25,
+    'target_fps': 30.0,
+    'static_threshold': 0.0,
+    'static_max_skip_seconds': 10.0,
+    'output_width': 800,
+    'jpeg_quality': 85,
+    'rtsp_transport': 'tcp',
+    'max_boxes': 100,
+    'detection_classes': [],
+    'overlay_mode': 'server',
+    'record_detections': False,
+    'recording_enabled': False,
+    'recording_retention_hours': 24,
+    'output_mode': 'mjpeg',
+    'mosaic_layout': {},
+}
+
+PROFILE_FIELDS = list(DEFAULT_PROFILE)
+
+
 class Stream(models.Model):
+    TRANSPORT_CHOICES = [
+        ('tcp', 'TCP'),
+        ('udp', 'UDP'),
+    ]
+    OUTPUT_CHOICES = [
+        ('mjpeg', 'Per-frame JPEG'),
+        ('fmp4', 'H.264 passthrough as fragmented MP4'),
+    ]
+    BACKEND_CHOICES = [
+        ('auto', 'From DETECTOR_BACKEND or the model file type'),
+        ('ultralytics', 'PyTorch (ultralytics)'),
+        ('onnxruntime', 'ONNX Runtime'),
+        ('openvino', 'OpenVINO'),
+    ]
+    OVERLAY_CHOICES = [
+        ('server', 'Drawn into the frame'),
+        ('client', 'Sent as data for the viewer to draw'),
+    ]
+
+    KIND_CHOICES = [
+        ('camera', 'Camera'),
+        ('mosaic', 'Mosaic of other streams'),
+    ]
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    # Mosaic streams tile the latest frames of other streams into one picture
+    # (see mosaic_layout); their rtsp_url is MOSAIC_URL
+    kind = models.CharField(max_length=8, choices=KIND_CHOICES, default='camera')
     rtsp_url = models.CharField(max_length=500, validators=[validate_rtsp_url])
     title = models.CharField(max_length=200, blank=True)
     description = models.TextField(blank=True)
     is_active = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    # Scheduling weight: higher priority streams get a larger share of the
+    # worker pool and keep their FPS longer when the node is saturated
+    priority = models.PositiveSmallIntegerField(default=1)
+
+    # Processing profile: read by StreamProcessor at start and hot-reloaded
+    # when the stream is updated (transport changes apply on reconnect)
+    detection_enabled = models.BooleanField(default=DEFAULT_PROFILE['detection_enabled'])
+    detection_model = models.CharField(
+        max_length=200, default=DEFAULT_PROFILE['detection_model'], validators=[validate_detection_model]
+    )
+    # Runtime for detection_model; exported .onnx / OpenVINO models (including
+    # int8-quantized ones) run without torch and are much faster on CPU
+    detection_backend = models.CharField(
+        max_length=16, choices=BACKEND_CHOICES, default=DEFAULT_PROFILE['detection_backend']
+    )
+    # Longest side of the network input, and the parts of the frame to run
+    # detection on (empty = whole frame); boxes are mapped back to the frame
+    inference_size = models.PositiveSmallIntegerField(
+        default=DEFAULT_PROFILE['inference_size'],
+        validators=[MinValueValidator(160), MaxValueValidator(1280), validate_inference_size]
+    )
+    roi_regions = models.JSONField(default=list, blank=True, validators=[validate_roi_regions])
+    confidence_threshold = models.FloatField(
+        default=DEFAULT_PROFILE['confidence_threshold'],
+        validators=[MinValueValidator(0.0), MaxValueValidator(1.0)]
+    )
+    target_fps = models.FloatField(
+        default=DEFAULT_PROFILE['target_fps'],
+        validators=[MinValueValidator(0.1), MaxValueValidator(60.0)]
+    )
+    # Frames where less than this percentage of the picture changed since the
+    # last one sent are not processed or sent (0 = off). A full frame still
+    # goes out every static_max_skip_seconds.
+    static_threshold = models.FloatField(
+        default=DEFAULT_PROFILE['static_threshold'],
+        validators=[MinValueValidator(0.0), MaxValueValidator(100.0)]
+    )
+    static_max_skip_seconds = models.FloatField(
+        default=DEFAULT_PROFILE['static_max_skip_seconds'],
+        validators=[MinValueValidator(1.0), MaxValueValidator(600.0)]
+    )
+    output_width = models.PositiveIntegerField(
+        default=DEFAULT_PROFILE['output_width'],
+        validators=[MinValueValidator(64), MaxValueValidator(3840)]
+    )
+    jpeg_quality = models.PositiveSmallIntegerField(
+        default=DEFAULT_PROFILE['jpeg_quality'],
+        validators=[MinValueValidator(1), MaxValueValidator(100)]
+    )
+    rtsp_transport = models.CharField(
+        max_length=8, choices=TRANSPORT_CHOICES, default=DEFAULT_PROFILE['rtsp_transport']
+    )
+    # Most confident boxes drawn per frame (0 = no limit) and class ids to keep
+    max_boxes = models.PositiveSmallIntegerField(
+        default=DEFAULT_PROFILE['max_boxes'], validators=[MaxValueValidator(1000)]
+    )
+    detection_classes = models.JSONField(default=list, blank=True, validators=[validate_class_ids])
+    overlay_mode = models.CharField(
+        max_length=8, choices=OVERLAY_CHOICES, default=DEFAULT_PROFILE['overlay_mode']
+    )
+    # fmp4 remuxes the camera's H.264 for Media Source Extensions players;
+    # detections (if enabled) are then only sent as data. Applies on restart.
+    output_mode = models.CharField(
+        max_length=8, choices=OUTPUT_CHOICES, default=DEFAULT_PROFILE['output_mode']
+    )
+    # Persist detections as DetectionEvent rows (written in batches)
+    record_detections = models.BooleanField(default=DEFAULT_PROFILE['record_detections'])
+    # Record sent frames to disk, keeping a rolling window of footage
+    recording_enabled = models.BooleanField(default=DEFAULT_PROFILE['recording_enabled'])
+    recording_retention_hours = models.PositiveSmallIntegerField(
+        default=DEFAULT_PROFILE['recording_retention_hours'],
+        validators=[MinValueValidator(1), MaxValueValidator(720)]
+    )
+    # Tiles and grid of mosaic streams; the picture is output_width wide
+    mosaic_layout = models.JSONField(default=dict, blank=True, validators=[validate_mosaic_layout])
     
     # Stream statistics
     viewer_count = models.IntegerField(default=0)
@@ -38,6 +288,41 @@ class Stream(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Cursor pagination orders by created_at; listing ETags use Max(updated_at)
+            models.Index(fields=['-created_at'], name='stream_created_idx'),
+            models.Index(fields=['updated_at'], name='stream_updated_idx'),
+        ]
     
+    def processing_profile(self):
+        """Return the processing profile as a plain dict for StreamProcessor"""
+        return {field: getattr(self, field) for field in PROFILE_FIELDS}
+
+    def __str__(self):
+        return f"{self.title or 'Stream'} - {self.rtsp_url[:50]}"
+
+
+class DetectionEvent(models.Model):
+    """One detected object on one frame; boxes are fractions of the frame size"""
+    id = models.BigAutoField(primary_key=True)
+    stream = models.ForeignKey(Stream, on_delete=models.CASCADE, related_name='detection_events',
+                               db_index=False)
+    timestamp = models.DateTimeField()
+    class_id = models.PositiveSmallIntegerField()
+    label = models.CharField(max_length=64)
+    confidence = models.FloatField()
+    x1 = models.FloatField()
+    y1 = models.FloatField()
+    x2 = models.FloatField()
+    y2 = models.FloatField()
+
+    class Meta:
+        indexes = [
+            # Time-range scans per stream, optionally narrowed to one class;
+            # the first also serves the stream foreign key
+            models.Index(fields=['stream', 'timestamp'], name='detection_stream_time_idx'),
+            models.Index(fields=['stream', 'class_id', 'timestamp'], name='detection_class_time_idx'),
+        ]
+
     def __str__(self):
-        return f"{self.title or 'Stream'} - {self.rtsp_url[:50]}"
\ No newline at end of file
+        return f"{self.label} {self.confidence:.2f} @ {self.timestamp}"
@@ -0,0 +1,299 @@
+import math
+import threading
+import logging
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+from django.db import close_old_connections
+
+from .capacity import get_capacity
+from .scheduler import get_scheduler
+from .stream_processor import StreamProcessor, get_stream_processor, stream_processors
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# How often the compositor re-reads its source streams (and restarts stopped ones)
+RESYNC_SECONDS = 5.0
+# An unchanged mosaic is still re-sent this often, for viewers that just joined
+HEARTBEAT_SECONDS = 1.0
+DEFAULT_TILE_ASPECT = 16 / 9
+
+
+class TileFeed:
+    """
+    Consumer attached to a source stream's processor. It receives the decoded,
+    output-sized frames (``raw_frames``) instead of JPEG messages and keeps the
+    latest one, at most ``fps`` times per second.
+    """
+
+    raw_frames = True
+
+    def __init__(self, stream_id, fps=None):
+        self.stream_id = stream_id
+        self.frame = None
+        self.version = 0  # Bumped for every accepted frame
+        self.next_frame_at = 0.0
+        self.set_fps(fps)
+        # Control messages of the source stream are not used; keep only a few
+        self.pending_messages = deque(maxlen=16)
+
+    def set_fps(self, fps):
+        self.min_frame_interval = 1.0 / fps if fps else 0.0
+
+    def offer_frame(self, frame):
+        """Called by the source processor's worker with every processed frame"""
+        now = time.monotonic()
+        if self.min_frame_interval:
+            if now < self.next_frame_at:
+                return
+            self.next_frame_at = max(self.next_frame_at + self.min_frame_interval, now)
+        self.frame = frame
+        self.version += 1
+
+
+def layout_tiles(layout):
+    """(stream id, fps or None) for each tile of a mosaic layout"""
+    tiles = []
+    for tile in (layout or {}).get('tiles', []):
+        if isinstance(tile, dict):
+            tiles.append((str(tile.get('stream')), tile.get('fps')))
+        else:
+            tiles.append((str(tile), None))
+    return tiles
+
+
+def grid_geometry(count, width, columns=None, tile_aspect=None):
+    """
+    Tile rectangles ``(x, y, w, h)`` for ``count`` tiles in a ``width`` pixels
+    wide canvas, and the canvas height. Columns default to a square grid.
+    """
+    columns = min(columns or math.ceil(math.sqrt(count)), count) or 1
+    rows = math.ceil(count / columns)
+    tile_width = width // columns
+    tile_height = max(2, int(round(tile_width / (tile_aspect or DEFAULT_TILE_ASPECT))))
+    rects = [
+        ((index % columns) * tile_width, (index // columns) * tile_height, tile_width, tile_height)
+        for index in range(count)
+    ]
+    return rects, rows * tile_height
+
+
+class MosaicProcessor(StreamProcessor):
+    """
+    Composite stream for video walls: tiles the latest frames of other streams
+    into one canvas, which is then encoded once and sent like any other stream.
+
+    A compositor thread attaches a TileFeed to every source stream and submits
+    a job to the frame scheduler at ``target_fps``. The job draws changed tiles
+    straight into a preallocated canvas (``cv2.resize`` into canvas views, or a
+    plain slice copy when the size already matches) and hands the canvas to the
+    normal encode path. The scheduler runs one job per stream at a time, so the
+    canvas is never drawn while it is being encoded.
+    """
+
+    def __init__(self, rtsp_url, stream_id, priority=1, profile=None):
+        super().__init__(rtsp_url, stream_id, priority, mosaic_profile(profile))
+        self.feeds = {}  # source stream id -> (processor, TileFeed); replaced, never mutated
+        self.tiles = layout_tiles(self.profile['mosaic_layout'])
+        self.layout_changed = True
+        self.canvas = None
+        self.canvas_key = None
+        self.rects = []
+        self.drawn = []  # Per tile: (feed, version, fitted rectangle) last drawn
+        self.composed_at = 0.0
+        self.rejected_sources = set()  # Sources admission control turned down (logged once)
+
+    def update_profile(self, profile):
+        """Hot-reload the profile; layout changes are picked up by the compositor"""
+        super().update_profile(mosaic_profile(profile))
+        self.tiles = layout_tiles(self.profile['mosaic_layout'])
+        self.layout_changed = True
+
+    def start(self):
+        """Start compositing"""
+        if self.is_running:
+            return
+
+        self.is_running = True
+        get_scheduler().register(self.stream_id, self.priority)
+        self._sync_recorder()
+        self.thread = threading.Thread(target=self._run_compositor, daemon=True)
+        self.thread.start()
+        logger.info(f"Started mosaic {self.stream_id} with {len(self.tiles)} tiles")
+
+    def _run_compositor(self):
+        """Keep the source streams attached and schedule a composition per output frame"""
+        try:
+            self._send_message({
+                'type': 'stream_started',
+                'stream_id': self.stream_id,
+                'rtsp_url': self.rtsp_url,
+                'message': 'Mosaic started'
+            })
+            synced_at = 0.0
+            while self.is_running:
+                started = time.monotonic()
+                if self.layout_changed or started - synced_at >= RESYNC_SECONDS:
+                    self.layout_changed = False
+                    self._sync_feeds()
+                    synced_at = started
+
+                if self.is_idle():
+                    time.sleep(0.1)
+                    continue
+
+                if not get_scheduler().submit(self, None, time.time()):
+                    metrics.FRAMES_DROPPED.inc(self.stream_id, 'scheduler')
+                frame_delay = 1.0 / self.profile['target_fps']
+                time.sleep(max(0.0, frame_delay - (time.monotonic() - started)))
+
+        except Exception as e:
+            logger.error(f"Error in mosaic compositor: {str(e)}")
+            self._send_error(f"Mosaic error: {str(e)}")
+        finally:
+            self._detach_feeds(self.feeds)
+            self.feeds = {}
+            get_scheduler().unregister(self.stream_id)
+            self.is_running = False
+
+    def _sync_feeds(self):
+        """Attach to the layout's source streams, (re)starting them as needed"""
+        from .models import Stream
+
+        # Per source stream, the highest rate any of its tiles asks for
+        rates = {}
+        for stream_id, fps in self.tiles:
+            if stream_id in rates:
+                fps = None if rates[stream_id] is None or fps is None else max(rates[stream_id], fps)
+            rates[stream_id] = fps
+
+        close_old_connections()
+        sources = {
+            str(stream.id): stream
+            for stream in Stream.objects.filter(id__in=list(rates), kind='camera')
+        }
+
+        feeds = {}
+        for stream_id, stream in sources.items():
+            attached = self.feeds.get(stream_id)
+            processor = stream_processors.get(stream_id)
+            if attached and attached[0] is processor:
+                feed = attached[1]
+                feed.set_fps(rates[stream_id])
+            else:
+                processor = get_stream_processor(
+                    stream_id, stream.rtsp_url, stream.priority, stream.processing_profile()
+                )
+                feed = TileFeed(stream_id, rates[stream_id])
+                processor.add_consumer(feed)
+            # Starts new sources and restarts ones that stopped (lost connection),
+            # as far as the node has capacity for them
+            if not processor.is_running:
+                self._start_source(processor)
+            feeds[stream_id] = (processor, feed)
+
+        missing = set(rates) - set(sources)
+        if missing:
+            logger.warning(f"Mosaic {self.stream_id}: unknown source streams {', '.join(sorted(missing))}")
+
+        stale = {
+            stream_id: attached for stream_id, attached in self.feeds.items()
+            if feeds.get(stream_id) != attached
+        }
+        self.feeds = feeds
+        self._detach_feeds(stale)
+
+    def _start_source(self, processor):
+        """Start a source stream through admission control; rejected ones are retried on resync"""
+        admission = get_capacity().admit(processor)
+        if admission.allowed:
+            processor.start()
+            self.rejected_sources.discard(processor.stream_id)
+        elif admission.decision == 'rejected' and processor.stream_id not in self.rejected_sources:
+            self.rejected_sources.add(processor.stream_id)
+            logger.warning(f"Mosaic {self.stream_id}: source {processor.stream_id} not started: {admission.message}")
+
+    def source_profiles(self):
+        """Profiles of the source streams not running yet, which the compositor will start"""
+        from .models import Stream
+
+        pending = set()
+        for stream_id, _ in self.tiles:
+            processor = stream_processors.get(stream_id)
+            if not (processor and processor.is_running):
+                pending.add(stream_id)
+        if not pending:
+            return []
+        close_old_connections()
+        return [stream.processing_profile() for stream in Stream.objects.filter(id__in=pending, kind='camera')]
+
+    def _detach_feeds(self, feeds):
+        # Sources nobody else watches stop with their last consumer
+        for processor, feed in feeds.values():
+            processor.remove_consumer(feed)
+
+    def _process_frame(self, frame, captured_at=None):
+        """Compose the canvas from the latest tile frames, then encode and send it"""
+        tiles, feeds = self.tiles, self.feeds
+        key = (len(tiles), self.profile['output_width'],
+               self.profile['mosaic_layout'].get('columns'),
+               self.profile['mosaic_layout'].get('tile_aspect'))
+        if key != self.canvas_key:
+            self.rects, height = grid_geometry(len(tiles), *key[1:]) if tiles else ([], 2)
+            self.canvas = np.zeros((height, self.profile['output_width'], 3), dtype=np.uint8)
+            self.canvas_key = key
+            self.drawn = [None] * len(tiles)
+        elif len(self.drawn) != len(tiles):
+            self.drawn = [None] * len(tiles)
+
+        changed = False
+        for index, ((stream_id, _), rect) in enumerate(zip(tiles, self.rects)):
+            attached = feeds.get(stream_id)
+            feed = attached[1] if attached else None
+            tile_frame = feed.frame if feed else None
+            version = feed.version if feed else 0
+            drawn = self.drawn[index]
+            if drawn and drawn[0] is feed and drawn[1] == version:
+                continue
+            changed = True
+            self.drawn[index] = (feed, version, self._draw_tile(tile_frame, rect, drawn))
+
+        now = time.monotonic()
+        if not changed and now - self.composed_at < HEARTBEAT_SECONDS:
+            return
+        self.composed_at = now
+        super()._process_frame(self.canvas, captured_at)
+
+    def _draw_tile(self, frame, rect, drawn):
+        """Fit ``frame`` into its tile, keeping the aspect ratio; returns the area used"""
+        x, y, width, height = rect
+        view = self.canvas[y:y + height, x:x + width]
+        if frame is None:
+            view[:] = 0
+            return None
+
+        frame_height, frame_width = frame.shape[:2]
+        scale = min(width / frame_width, height / frame_height)
+        fit_width = max(1, int(frame_width * scale))
+        fit_height = max(1, int(frame_height * scale))
+        left, top = (width - fit_width) // 2, (height - fit_height) // 2
+        fitted = (left, top, fit_width, fit_height)
+        # Clear the letterbox bars when the fitted area moved
+        if not drawn or drawn[2] != fitted:
+            view[:] = 0
+
+        target = view[top:top + fit_height, left:left + fit_width]
+        if (fit_width, fit_height) == (frame_width, frame_height):
+            target[:] = frame
+        else:
+            # Resized straight into the canvas, no intermediate image
+            cv2.resize(frame, (fit_width, fit_height), dst=target, interpolation=cv2.INTER_AREA)
+        return fitted
+
+
+def mosaic_profile(profile):
+    """Mosaics only compose and encode; the sources run detection themselves"""
+    return {**(profile or {}), 'detection_enabled': False, 'output_mode': 'mjpeg'}
@@ -0,0 +1,9 @@
+from rest_framework.pagination import CursorPagination
+
+
+class StreamCursorPagination(CursorPagination):
+    """Cursor pagination over streams, newest first (stable under inserts)"""
+    ordering = '-created_at'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
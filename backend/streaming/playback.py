@@ -0,0 +1,207 @@
+import asyncio
+import bisect
+import mmap
+import time
+
+from asgiref.sync import sync_to_async
+
+from .recording import INDEX_RECORD, list_segments
+
+# Upper bound on frames sent per second during accelerated playback; faster
+# speeds jump ahead through the index instead of sending every frame
+MAX_PLAYBACK_FPS = 30.0
+# Recording gaps longer than this (in playback seconds) are skipped, not waited out
+MAX_PLAYBACK_GAP = 1.0
+
+MJPEG_BOUNDARY = 'frame'
+
+
+def mjpeg_part(jpeg_bytes, timestamp=None):
+    """One part of a multipart/x-mixed-replace MJPEG response"""
+    headers = [
+        f'--{MJPEG_BOUNDARY}',
+        'Content-Type: image/jpeg',
+        f'Content-Length: {len(jpeg_bytes)}',
+    ]
+    if timestamp is not None:
+        headers.append(f'X-Timestamp: {timestamp:.6f}')
+    return ('\r\n'.join(headers) + '\r\n\r\n').encode('ascii') + jpeg_bytes + b'\r\n'
+
+
+def _map(path):
+    """Read-only mmap of a file, or None if it is missing or empty"""
+    try:
+        with open(path, 'rb') as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+
+class _Timestamps:
+    """Sequence view over the timestamps of a memory-mapped index (for bisect)"""
+
+    def __init__(self, index, length):
+        self._index = index
+        self._length = length
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, i):
+        return INDEX_RECORD.unpack_from(self._index, i * INDEX_RECORD.size)[0]
+
+
+class SegmentReader:
+    """
+    Random access to one recorded segment through memory-mapped index and
+    data files. Only the pages that are actually touched get read.
+    """
+
+    def __init__(self, start_us, data_path, index_path):
+        self.start_us = start_us
+        self._index = _map(index_path)
+        self._data = _map(data_path)
+        # The writer may be mid-append: ignore a partial trailing record and
+        # records whose data is not fully on disk yet
+        length = len(self._index) // INDEX_RECORD.size if self._index else 0
+        data_size = len(self._data) if self._data else 0
+        while length:
+            _, offset, size = INDEX_RECORD.unpack_from(self._index, (length - 1) * INDEX_RECORD.size)
+            if offset + size <= data_size:
+                break
+            length -= 1
+        self.timestamps = _Timestamps(self._index, length)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def find(self, timestamp_us):
+        """Position of the first frame captured at or after ``timestamp_us``"""
+        return bisect.bisect_left(self.timestamps, timestamp_us)
+
+    def frame(self, position):
+        """``(timestamp_us, jpeg_bytes)`` of the frame at ``position``"""
+        timestamp_us, offset, length = INDEX_RECORD.unpack_from(
+            self._index, position * INDEX_RECORD.size
+        )
+        return timestamp_us, self._data[offset:offset + length]
+
+    def close(self):
+        for mapped in (self._index, self._data):
+            if mapped:
+                mapped.close()
+
+
+class Recording:
+    """Seekable view over all recorded segments of a stream"""
+
+    def __init__(self, stream_id):
+        self.segments = list_segments(stream_id)
+        self._starts = [start_us for start_us, _, _ in self.segments]
+        self._readers = {}
+
+    def __bool__(self):
+        return bool(self.segments)
+
+    def reader(self, segment):
+        if segment not in self._readers:
+            self._readers[segment] = SegmentReader(*self.segments[segment])
+        return self._readers[segment]
+
+    def seek(self, timestamp_us):
+        """
+        ``(segment, position)`` of the first frame at or after ``timestamp_us``,
+        or None past the end: a bisect over segment start times, then one over
+        the segment's index.
+        """
+        segment = max(bisect.bisect_right(self._starts, timestamp_us) - 1, 0)
+        while segment < len(self.segments):
+            reader = self.reader(segment)
+            position = reader.find(timestamp_us)
+            if position < len(reader):
+                return segment, position
+            segment += 1
+        return None
+
+    def frame_at(self, timestamp_us):
+        """Latest frame captured at or before ``timestamp_us`` (else the next one)"""
+        found = self.seek(timestamp_us)
+        if found is None:
+            if not self.segments:
+                return None
+            segment = len(self.segments) - 1
+            reader = self.reader(segment)
+            return reader.frame(len(reader) - 1) if len(reader) else None
+        segment, position = found
+        reader = self.reader(segment)
+        timestamp, jpeg = reader.frame(position)
+        if timestamp > timestamp_us:
+            if position > 0:
+                return reader.frame(position - 1)
+            if segment > 0:
+                previous = self.reader(segment - 1)
+                if len(previous):
+                    return previous.frame(len(previous) - 1)
+        return timestamp, jpeg
+
+    def frames(self, start_us, end_us=None, min_step_us=0):
+        """
+        Yield ``(timestamp_us, jpeg_bytes)`` from ``start_us`` on. With
+        ``min_step_us`` consecutive frames are at least that far apart; the
+        skip is another index seek, not a scan.
+        """
+        found = self.seek(start_us)
+        while found is not None:
+            segment, position = found
+            reader = self.reader(segment)
+            timestamp, jpeg = reader.frame(position)
+            if end_us is not None and timestamp >= end_us:
+                return
+            yield timestamp, jpeg
+
+            if min_step_us:
+                found = self.seek(timestamp + min_step_us)
+            elif position + 1 < len(reader):
+                found = segment, position + 1
+            else:
+                found = self.seek(timestamp + 1)
+
+    def close(self):
+        for reader in self._readers.values():
+            reader.close()
+        self._readers.clear()
+
+
+async def replay(stream_id, start, end=None, speed=1.0):
+    """
+    Async iterator of MJPEG parts replaying a recording in real time (or
+    ``speed`` times faster) from ``start`` to ``end`` (epoch seconds).
+
+    Listing, opening and reading segments touch the disk, so they run in a
+    worker thread rather than on the event loop.
+    """
+    recording = await sync_to_async(Recording, thread_sensitive=False)(stream_id)
+    try:
+        min_step_us = int(speed / MAX_PLAYBACK_FPS * 1_000_000) if speed > 1 else 0
+        end_us = int(end * 1_000_000) if end is not None else None
+        frames = recording.frames(int(start * 1_000_000), end_us, min_step_us)
+        next_frame = sync_to_async(next, thread_sensitive=False)
+        anchor_wall = anchor_ts = None
+        while True:
+            found = await next_frame(frames, None)
+            if found is None:
+                break
+            timestamp_us, jpeg = found
+            now = time.monotonic()
+            if anchor_ts is None:
+                anchor_wall, anchor_ts = now, timestamp_us
+            else:
+                due = anchor_wall + (timestamp_us - anchor_ts) / 1_000_000 / speed
+                if due - now > MAX_PLAYBACK_GAP:
+                    # Gap in the recording: continue right away from here
+                    anchor_wall, anchor_ts = now, timestamp_us
+                elif due > now:
+                    await asyncio.sleep(due - now)
+            yield mjpeg_part(jpeg, timestamp_us / 1_000_000)
+    finally:
+        await sync_to_async(recording.close, thread_sensitive=False)()
@@ -0,0 +1,442 @@
+import base64
+import hashlib
+import json
+import os
+import re
+import shutil
+import socket
+import ssl
+import subprocess
+import threading
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import urlsplit, unquote
+
+from django.core.cache import cache
+from django.db import close_old_connections
+
+from .list_cache import invalidate_stream_list
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = 'camera_probe:'
+USER_AGENT = 'rtsp-streamer-probe'
+# RTSP payload names (SDP rtpmap) as ffprobe/FFmpeg codec names
+SDP_CODECS = {
+    'H264': 'h264',
+    'H265': 'hevc',
+    'JPEG': 'mjpeg',
+    'MP4V-ES': 'mpeg4',
+}
+
+
+def _cache_key(url):
+    return CACHE_PREFIX + hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _result(status, method, started, **fields):
+    """Probe result; only ``ok`` means the stream can be opened"""
+    return {
+        'reachable': status == 'ok',
+        'status': status,
+        'method': method,
+        'codec': fields.pop('codec', None),
+        'width': fields.pop('width', None),
+        'height': fields.pop('height', None),
+        'fps': fields.pop('fps', None),
+        'latency_ms': round((time.perf_counter() - started) * 1000, 1),
+        'checked_at': _now(),
+        **fields,
+    }
+
+
+def parse_sdp(sdp):
+    """Codec, size and frame rate of the first video track of an SDP description"""
+    info = {}
+    in_video = False
+    payloads = []
+    for line in sdp.splitlines():
+        line = line.strip()
+        if line.startswith('m='):
+            if in_video:
+                break
+            parts = line[2:].split()
+            in_video = parts[:1] == ['video']
+            payloads = parts[3:]
+        elif not in_video or not line.startswith('a='):
+            continue
+        elif line.startswith('a=rtpmap:'):
+            payload, _, encoding = line[len('a=rtpmap:'):].partition(' ')
+            if payload in payloads and 'codec' not in info:
+                name = encoding.split('/')[0].upper()
+                info['codec'] = SDP_CODECS.get(name, name.lower())
+        elif line.startswith(('a=framerate:', 'a=x-framerate:')):
+            try:
+                info['fps'] = float(line.split(':', 1)[1])
+            except ValueError:
+                pass
+        elif line.startswith('a=x-dimensions:'):
+            match = re.match(r'(\d+)\s*,\s*(\d+)', line.split(':', 1)[1])
+            if match:
+                info['width'], info['height'] = int(match.group(1)), int(match.group(2))
+        elif line.startswith('a=cliprect:') and 'width' not in info:
+            # top,left,bottom,right
+            values = re.findall(r'\d+', line)
+            if len(values) == 4:
+                info['height'], info['width'] = int(values[2]), int(values[3])
+    return info
+
+
+def _digest_authorization(header, username, password, uri):
+    """Authorization header answering a Digest challenge (RFC 2069 form, as cameras use)"""
+    params = dict(re.findall(r'(\w+)="?([^",]*)"?', header))
+    realm, nonce = params.get('realm', ''), params.get('nonce', '')
+    ha1 = hashlib.md5(f'{username}:{realm}:{password}'.encode('utf-8')).hexdigest()
+    ha2 = hashlib.md5(f'DESCRIBE:{uri}'.encode('utf-8')).hexdigest()
+    response = hashlib.md5(f'{ha1}:{nonce}:{ha2}'.encode('utf-8')).hexdigest()
+    return (f'Digest username="{username}", realm="{realm}", nonce="{nonce}", '
+            f'uri="{uri}", response="{response}"')
+
+
+def _rtsp_request(sock, uri, cseq, authorization=None):
+    """Send a DESCRIBE and read the response: (status code, headers, body)"""
+    lines = [f'DESCRIBE {uri} RTSP/1.0', f'CSeq: {cseq}', 'Accept: application/sdp', f'User-Agent: {USER_AGENT}']
+    if authorization:
+        lines.append(f'Authorization: {authorization}')
+    sock.sendall(('\r\n'.join(lines) + '\r\n\r\n').encode('utf-8'))
+
+    data = b''
+    while b'\r\n\r\n' not in data:
+        chunk = sock.recv(4096)
+        if not chunk:
+            raise ConnectionError('Connection closed by camera')
+        data += chunk
+        if len(data) > 65536:
+            raise ConnectionError('Oversized RTSP response')
+    head, _, body = data.partition(b'\r\n\r\n')
+    head_lines = head.decode('utf-8', 'replace').split('\r\n')
+    status_line = head_lines[0].split()
+    if len(status_line) < 2 or not status_line[0].startswith('RTSP/'):
+        raise ConnectionError(f'Not an RTSP server: {head_lines[0][:80]}')
+    headers = {}
+    for line in head_lines[1:]:
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    length = int(headers.get('content-length', 0) or 0)
+    while len(body) < length:
+        chunk = sock.recv(length - len(body))
+        if not chunk:
+            break
+        body += chunk
+    return int(status_line[1]), headers, body.decode('utf-8', 'replace')
+
+
+def rtsp_describe(url, timeout=5.0):
+    """
+    Probe an RTSP camera with a DESCRIBE handshake: reachability, credentials
+    and, from the SDP, codec and (when the camera advertises them) size and
+    frame rate. Basic and Digest authentication use the URL's credentials.
+    """
+    started = time.perf_counter()
+    parts = urlsplit(url)
+    secure = parts.scheme == 'rtsps'
+    host, port = parts.hostname, parts.port or (322 if secure else 554)
+    username, password = unquote(parts.username or ''), unquote(parts.password or '')
+    # Credentials never go into the request line
+    netloc = host if parts.port is None else f'{host}:{parts.port}'
+    if ':' in host:
+        netloc = f'[{host}]' if parts.port is None else f'[{host}]:{parts.port}'
+    uri = f'{parts.scheme}://{netloc}{parts.path or "/"}' + (f'?{parts.query}' if parts.query else '')
+
+    sock = None
+    try:
+        sock = socket.create_connection((host, port), timeout=timeout)
+        if secure:
+            context = ssl.create_default_context()
+            # Cameras ship self-signed certificates
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+            sock = context.wrap_socket(sock, server_hostname=host)
+        sock.settimeout(max(0.1, timeout - (time.perf_counter() - started)))
+
+        authorization = None
+        if username:
+            token = base64.b64encode(f'{username}:{password}'.encode('utf-8')).decode('ascii')
+            authorization = f'Basic {token}'
+        code, headers, body = _rtsp_request(sock, uri, 1, authorization)
+        challenge = headers.get('www-authenticate', '')
+        if code == 401 and username and challenge.lower().startswith('digest'):
+            code, headers, body = _rtsp_request(
+                sock, uri, 2, _digest_authorization(challenge, username, password, uri))
+    except (OSError, ValueError) as e:
+        return _result('unreachable', 'rtsp-describe', started, error=str(e) or type(e).__name__)
+    finally:
+        if sock is not None:
+            sock.close()
+
+    if code == 200:
+        return _result('ok', 'rtsp-describe', started, **parse_sdp(body))
+    if code == 401:
+        return _result('auth_failed', 'rtsp-describe', started, error='Authentication required or rejected')
+    if code == 404:
+        return _result('not_found', 'rtsp-describe', started, error='Stream path not found')
+    return _result('error', 'rtsp-describe', started, error=f'RTSP status {code}')
+
+
+def _parse_rate(value):
+    """ffprobe frame rates are fractions ("25/1")"""
+    try:
+        numerator, _, denominator = (value or '').partition('/')
+        rate = float(numerator) / float(denominator or 1)
+    except (ValueError, ZeroDivisionError):
+        return None
+    return round(rate, 2) if rate > 0 else None
+
+
+def ffprobe(url, timeout=5.0, rtsp_transport='tcp'):
+    """Probe any URL FFmpeg can open with ffprobe; None when ffprobe is not installed"""
+    binary = shutil.which('ffprobe')
+    if binary is None:
+        return None
+    started = time.perf_counter()
+    command = [binary, '-v', 'error']
+    if url.startswith(('rtsp://', 'rtsps://')):
+        command += ['-rtsp_transport', rtsp_transport, '-timeout', str(int(timeout * 1_000_000))]
+    elif url.startswith(('http://', 'https://')):
+        command += ['-rw_timeout', str(int(timeout * 1_000_000))]
+    command += ['-select_streams', 'v:0', '-show_entries',
+                'stream=codec_name,width,height,avg_frame_rate,r_frame_rate', '-of', 'json', url]
+    try:
+        completed = subprocess.run(command, capture_output=True, timeout=timeout + 1)
+    except subprocess.TimeoutExpired:
+        return _result('unreachable', 'ffprobe', started, error='Timed out')
+    if completed.returncode != 0:
+        error = completed.stderr.decode('utf-8', 'replace').strip().splitlines()
+        error = error[-1] if error else f'ffprobe exited with {completed.returncode}'
+        status = 'auth_failed' if '401' in error else 'not_found' if '404' in error else 'unreachable'
+        return _result(status, 'ffprobe', started, error=error)
+
+    streams = json.loads(completed.stdout or b'{}').get('streams') or []
+    if not streams:
+        return _result('error', 'ffprobe', started, error='No video track')
+    stream = streams[0]
+    return _result('ok', 'ffprobe', started,
+                   codec=stream.get('codec_name'), width=stream.get('width'), height=stream.get('height'),
+                   fps=_parse_rate(stream.get('avg_frame_rate')) or _parse_rate(stream.get('r_frame_rate')))
+
+
+def opencv_probe(url, timeout=5.0):
+    """Open the URL with OpenCV and read one frame (used without ffprobe, and for local files)"""
+    import cv2
+
+    started = time.perf_counter()
+    timeout_ms = int(timeout * 1000)
+    cap = cv2.VideoCapture(url, cv2.CAP_FFMPEG, [
+        cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, timeout_ms,
+        cv2.CAP_PROP_READ_TIMEOUT_MSEC, timeout_ms,
+    ])
+    try:
+        if not cap.isOpened():
+            return _result('unreachable', 'opencv', started, error='Could not open stream')
+        ret, frame = cap.read()
+        if not ret or frame is None:
+            return _result('error', 'opencv', started, error='Opened but no frame could be read')
+        fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+        codec = ''.join(chr((fourcc >> (8 * i)) & 0xFF) for i in range(4)).strip('\x00 ').lower()
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        return _result('ok', 'opencv', started, codec=codec or None,
+                       width=frame.shape[1], height=frame.shape[0], fps=round(fps, 2) if fps > 0 else None)
+    finally:
+        cap.release()
+
+
+def probe_url(url, timeout=5.0, rtsp_transport='tcp'):
+    """
+    Probe a camera URL. RTSP cameras get a DESCRIBE handshake (one round trip,
+    no media), completed by ffprobe when the SDP does not give the size; other
+    URLs are probed with ffprobe, or OpenCV when it is not installed.
+    """
+    try:
+        if url.startswith(('rtsp://', 'rtsps://')):
+            result = rtsp_describe(url, timeout)
+            if result['reachable'] and result['width'] is None:
+                detailed = ffprobe(url, timeout, rtsp_transport)
+                if detailed and detailed['reachable']:
+                    result.update({key: detailed[key] or result[key] for key in ('codec', 'width', 'height', 'fps')})
+            return result
+        if url.startswith(('http://', 'https://')) or not os.path.isfile(url):
+            result = ffprobe(url, timeout)
+            if result is not None:
+                return result
+        return opencv_probe(url, timeout)
+    except Exception as e:
+        logger.warning(f"Probe of {url} failed: {e}")
+        return _result('error', 'probe', time.perf_counter(), error=str(e))
+
+
+def cached_probe(url):
+    """The cached probe result for a URL, or None when it was not probed within the TTL"""
+    return cache.get(_cache_key(url))
+
+
+def cached_probes(urls):
+    """Cached probe results for many URLs in one cache round trip"""
+    keys = {_cache_key(url): url for url in urls}
+    return {keys[key]: result for key, result in cache.get_many(list(keys)).items()}
+
+
+def result_age(result):
+    """Seconds since a probe result was taken"""
+    checked_at = datetime.fromisoformat(result['checked_at'])
+    return (datetime.now(timezone.utc) - checked_at).total_seconds()
+
+
+def connection_hints(url):
+    """
+    What the processor may skip when connecting: ``reachable`` is False when a
+    recent probe failed, ``open_method`` the RTSP configuration that worked last
+    """
+    result = cached_probe(url) or {}
+    return {'reachable': result.get('reachable'), 'open_method': result.get('open_method')}
+
+
+def record_connection(url, open_method=None, width=None, height=None, fps=None):
+    """Store what a processor learned by connecting (it is a successful probe too)"""
+    prober = get_prober()
+    previous = cached_probe(url) or {}
+    result = {
+        **previous,
+        'reachable': True,
+        'status': 'ok',
+        'method': previous.get('method') or 'connection',
+        'checked_at': _now(),
+    }
+    for key, value in (('open_method', open_method), ('width', width), ('height', height), ('fps', fps)):
+        if value:
+            result[key] = value
+    prober.store(url, result, previous)
+
+
+class CameraProber:
+    """
+    Probes the registered camera streams in the background so the API can
+    report reachability and stream metadata without anyone opening a viewing
+    session, and so processors can skip connection methods known to fail.
+
+    Every ``interval`` seconds the URLs whose result is older than ``ttl`` are
+    probed concurrently on at most ``workers`` threads; results live in the
+    Django cache (shared between workers when it is Redis) for ``ttl`` seconds.
+    """
+
+    def __init__(self, workers=8, ttl=180.0, interval=60.0, timeout=5.0):
+        self.workers = max(1, int(workers))
+        self.ttl = float(ttl)
+        self.interval = float(interval)
+        self.timeout = float(timeout)
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='camera-probe')
+        self._in_flight = {}   # url -> future of the probe running for it
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def store(self, url, result, previous=None):
+        """Cache a result; listings are invalidated when reachability changed"""
+        cache.set(_cache_key(url), result, timeout=self.ttl)
+        if previous is None or previous.get('status') != result['status']:
+            invalidate_stream_list()
+
+    def probe(self, url, rtsp_transport='tcp'):
+        """Probe one URL now and cache the result"""
+        previous = cached_probe(url)
+        result = probe_url(url, self.timeout, rtsp_transport)
+        # Keep what connections learned, probes cannot tell it
+        if previous and previous.get('open_method'):
+            result['open_method'] = previous['open_method']
+        self.store(url, result, previous)
+        if previous and previous.get('reachable') and not result['reachable']:
+            logger.warning(f"Camera {url} became unreachable: {result.get('error')}")
+        return result
+
+    def probe_streams(self, streams, max_age=None):
+        """
+        Probe camera streams concurrently (bounded by the pool). Cached results
+        younger than ``max_age`` seconds (default: any still cached) are reused;
+        0 probes everything. Returns ``{stream id: result}`` for all of them.
+        """
+        targets = {}
+        for stream in streams:
+            if stream.kind == 'camera':
+                targets.setdefault(stream.rtsp_url, []).append(stream)
+        results = {
+            url: result for url, result in cached_probes(targets).items()
+            if max_age is None or result_age(result) < max_age
+        }
+
+        # A URL being probed by another caller is waited on, not probed twice
+        futures = {}
+        with self._lock:
+            for url, url_streams in targets.items():
+                if url in results:
+                    continue
+                if url not in self._in_flight:
+                    self._in_flight[url] = self._pool.submit(self._probe_tracked, url,
+                                                             url_streams[0].rtsp_transport)
+                futures[url] = self._in_flight[url]
+        for url, future in futures.items():
+            results[url] = future.result()
+        return {str(stream.id): results[url] for url, url_streams in targets.items() for stream in url_streams}
+
+    def _probe_tracked(self, url, rtsp_transport):
+        try:
+            return self.probe(url, rtsp_transport)
+        finally:
+            # Inserted under the lock right after submit, so it is there by now
+            with self._lock:
+                self._in_flight.pop(url, None)
+
+    def start(self):
+        """Start probing in the background (no-op when the interval is 0)"""
+        with self._lock:
+            if self.interval <= 0 or (self._thread and self._thread.is_alive()):
+                return
+            self._thread = threading.Thread(target=self._run, name='camera-prober', daemon=True)
+            self._thread.start()
+        logger.info(f"Camera prober started ({self.workers} workers, every {self.interval:g}s)")
+
+    def _run(self):
+        from .models import Stream
+
+        while True:
+            try:
+                close_old_connections()
+                streams = list(Stream.objects.filter(kind='camera').only('id', 'kind', 'rtsp_url', 'rtsp_transport'))
+                # Refresh results before they expire, so listings always have one
+                self.probe_streams(streams, max_age=self.interval)
+            except Exception as e:
+                logger.error(f"Camera probe run failed: {e}")
+            time.sleep(self.interval)
+
+
+_prober = None
+_prober_lock = threading.Lock()
+
+
+def get_prober():
+    """Return the process-wide camera prober"""
+    global _prober
+    with _prober_lock:
+        if _prober is None:
+            from django.conf import settings
+            _prober = CameraProber(
+                workers=getattr(settings, 'CAMERA_PROBE_WORKERS', 8),
+                ttl=getattr(settings, 'CAMERA_PROBE_TTL', 180.0),
+                interval=getattr(settings, 'CAMERA_PROBE_INTERVAL', 60.0),
+                timeout=getattr(settings, 'CAMERA_PROBE_TIMEOUT', 5.0),
+            )
+        return _prober
@@ -0,0 +1,163 @@
+import sys
+import threading
+import logging
+import time
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# Safety limits so profiling can stay enabled in production builds
+MAX_CONCURRENT_SAMPLERS = 4
+MAX_DURATION_SECONDS = 600
+MAX_STACK_DEPTH = 64
+MIN_INTERVAL_SECONDS = 0.001
+MAX_INTERVAL_SECONDS = 1.0
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    module = frame.f_globals.get('__name__', '?')
+    return f"{module}:{code.co_name}"
+
+
+class StackSampler:
+    """
+    Low-overhead statistical profiler for a stream's threads.
+
+    A daemon thread wakes every ``interval`` seconds, reads the current Python
+    stack of the target threads via ``sys._current_frames()`` and counts folded
+    stacks. Nothing runs in the sampled threads themselves, and no thread
+    exists while profiling is off.
+    """
+
+    def __init__(self, get_thread_idents, interval=0.005, max_seconds=60):
+        self.get_thread_idents = get_thread_idents
+        self.interval = min(max(float(interval), MIN_INTERVAL_SECONDS), MAX_INTERVAL_SECONDS)
+        self.max_seconds = min(float(max_seconds), MAX_DURATION_SECONDS)
+        self.stacks = Counter()
+        self.samples = 0
+        self.started_at = None
+        self.stopped_at = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()  # Guards stacks and samples against readers
+
+    @property
+    def is_running(self):
+        return bool(self._thread and self._thread.is_alive())
+
+    def start(self):
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
+
+    def _run(self):
+        deadline = time.monotonic() + self.max_seconds
+        while not self._stop.wait(self.interval):
+            if time.monotonic() > deadline:
+                break
+            idents = self.get_thread_idents()
+            if not idents:
+                continue
+            frames = sys._current_frames()
+            sampled = []
+            for ident in idents:
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                sampled.append(';'.join(reversed(stack)))
+            del frames
+            with self._lock:
+                self.stacks.update(sampled)
+                self.samples += len(sampled)
+        self.stopped_at = time.time()
+
+    def snapshot(self):
+        """Copy of the stack counts and the sample total, safe while sampling"""
+        with self._lock:
+            return Counter(self.stacks), self.samples
+
+    def collapsed(self):
+        """Folded stacks, one ``stack count`` per line (flamegraph.pl / speedscope)"""
+        stacks, _ = self.snapshot()
+        return '\n'.join(f'{stack} {count}' for stack, count in stacks.most_common()) + '\n'
+
+    def summary(self, top=25):
+        """Top functions by self and cumulative samples"""
+        stacks, samples = self.snapshot()
+        self_counts, total_counts = Counter(), Counter()
+        for stack, count in stacks.items():
+            names = stack.split(';')
+            self_counts[names[-1]] += count
+            for name in set(names):
+                total_counts[name] += count
+
+        def table(counts):
+            return [
+                {'function': name, 'samples': count,
+                 'percent': round(count * 100 / samples, 1) if samples else 0.0}
+                for name, count in counts.most_common(top)
+            ]
+
+        end = self.stopped_at or time.time()
+        return {
+            'running': self.is_running,
+            'samples': samples,
+            'interval_ms': self.interval * 1000,
+            'duration_seconds': round(end - self.started_at, 2) if self.started_at else 0,
+            'top_self': table(self_counts),
+            'top_cumulative': table(total_counts),
+        }
+
+
+# stream_id -> StackSampler (kept after stopping so results can be fetched)
+_samplers = {}
+_samplers_lock = threading.Lock()
+
+
+def start_profiling(processor, interval=0.005, max_seconds=60):
+    """Start sampling a processor's capture thread and the worker handling its frames"""
+    with _samplers_lock:
+        running = [sid for sid, s in _samplers.items() if s.is_running and sid != processor.stream_id]
+        if len(running) >= MAX_CONCURRENT_SAMPLERS:
+            raise RuntimeError(f"At most {MAX_CONCURRENT_SAMPLERS} streams can be profiled at once")
+
+        previous = _samplers.get(processor.stream_id)
+        if previous:
+            previous.stop()
+
+        def thread_idents():
+            idents = []
+            if processor.thread and processor.thread.ident:
+                idents.append(processor.thread.ident)
+            if processor.active_worker_ident:
+                idents.append(processor.active_worker_ident)
+            return idents
+
+        sampler = StackSampler(thread_idents, interval, max_seconds)
+        _samplers[processor.stream_id] = sampler
+        sampler.start()
+    logger.info(f"Started profiling stream {processor.stream_id}")
+    return sampler
+
+
+def stop_profiling(stream_id):
+    """Stop sampling a stream; its results stay available"""
+    sampler = _samplers.get(stream_id)
+    if sampler:
+        sampler.stop()
+        logger.info(f"Stopped profiling stream {stream_id}")
+    return sampler
+
+
+def get_profiler(stream_id):
+    return _samplers.get(stream_id)
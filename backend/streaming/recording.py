@@ -0,0 +1,192 @@
+import os
+import re
+import queue
+import struct
+import threading
+import logging
+import time
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Index record per frame: capture time (epoch microseconds), offset and length
+# of the JPEG in the segment's data file. Fixed size, so the index can be
+# binary-searched or memory-mapped without parsing.
+INDEX_RECORD = struct.Struct('<qQI')
+
+DATA_SUFFIX = '.mjpg'
+INDEX_SUFFIX = '.idx'
+
+# Frames waiting for the writer thread; when full, new frames are dropped
+# instead of blocking the worker that produced them
+MAX_QUEUED_FRAMES = 256
+# Frames appended per write() call
+MAX_BATCH_FRAMES = 64
+
+SAFE_STREAM_ID = re.compile(r'^[\w-]+$')
+
+
+def get_recordings_root():
+    from django.conf import settings
+    return str(getattr(settings, 'RECORDINGS_ROOT'))
+
+
+def stream_directory(stream_id, root=None):
+    """Directory holding a stream's segments"""
+    stream_id = str(stream_id)
+    if not SAFE_STREAM_ID.match(stream_id):
+        raise ValueError(f"Invalid stream id for recording: {stream_id!r}")
+    return os.path.join(root or get_recordings_root(), stream_id)
+
+
+def list_segments(stream_id, root=None):
+    """
+    Return ``(start_us, data_path, index_path)`` for every segment of a
+    stream, oldest first. Segment files are named after their first frame's
+    capture time in epoch microseconds.
+    """
+    try:
+        directory = stream_directory(stream_id, root)
+        names = os.listdir(directory)
+    except (OSError, ValueError):
+        return []
+
+    segments = []
+    for name in names:
+        if not name.endswith(INDEX_SUFFIX):
+            continue
+        stem = name[:-len(INDEX_SUFFIX)]
+        if not stem.isdigit():
+            continue
+        segments.append((
+            int(stem),
+            os.path.join(directory, stem + DATA_SUFFIX),
+            os.path.join(directory, name),
+        ))
+    segments.sort()
+    return segments
+
+
+class SegmentRecorder:
+    """
+    Appends already-encoded JPEG frames of one stream to fixed-duration
+    segment files on disk.
+
+    ``write()`` only puts the bytes on a bounded queue; a writer thread
+    appends queued frames in batches (one write for the data, one for the
+    index records) and rolls to a new segment every ``segment_seconds``.
+    Retention is a ring buffer over whole segments: when a segment is rolled,
+    segments older than ``retention_hours`` are unlinked, so deleting old
+    footage never rewrites anything.
+    """
+
+    def __init__(self, stream_id, root=None, segment_seconds=60, retention_hours=24):
+        self.stream_id = str(stream_id)
+        self.directory = stream_directory(stream_id, root)
+        self.segment_seconds = float(segment_seconds)
+        self.retention_hours = float(retention_hours)
+        self._queue = queue.Queue(maxsize=MAX_QUEUED_FRAMES)
+        self._thread = None
+        self._data_file = None
+        self._index_file = None
+        self._segment_start = None
+        self._offset = 0
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._thread = threading.Thread(
+            target=self._run, name=f'recorder-{self.stream_id}', daemon=True
+        )
+        self._thread.start()
+        logger.info(f"Recording stream {self.stream_id} to {self.directory}")
+
+    def write(self, jpeg_bytes, captured_at):
+        """Queue an encoded frame (called from the hot path, never blocks)"""
+        try:
+            self._queue.put_nowait((captured_at, jpeg_bytes))
+        except queue.Full:
+            metrics.FRAMES_DROPPED.inc(self.stream_id, 'recorder')
+
+    def close(self):
+        """Flush queued frames, close the current segment and stop the writer"""
+        if self._thread:
+            self._queue.put(None)
+            self._thread.join(timeout=5.0)
+            self._thread = None
+
+    def _run(self):
+        running = True
+        while running:
+            batch = [self._queue.get()]
+            while len(batch) < MAX_BATCH_FRAMES:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                running = False
+                batch = [item for item in batch if item is not None]
+            try:
+                self._append(batch)
+            except OSError as e:
+                logger.error(f"Recording write failed for {self.stream_id}: {e}")
+                self._close_segment()
+        self._close_segment()
+
+    def _append(self, batch):
+        data, index = [], []
+        for captured_at, jpeg_bytes in batch:
+            if self._segment_start is None or captured_at - self._segment_start >= self.segment_seconds:
+                # Write out what belongs to the finished segment, then roll
+                self._write_chunk(data, index)
+                data, index = [], []
+                self._roll_segment(captured_at)
+            data.append(jpeg_bytes)
+            index.append(INDEX_RECORD.pack(int(captured_at * 1_000_000), self._offset, len(jpeg_bytes)))
+            self._offset += len(jpeg_bytes)
+        self._write_chunk(data, index)
+
+    def _write_chunk(self, data, index):
+        if not data:
+            return
+        payload = b''.join(data)
+        # Data first, so an index record never points past the data file
+        self._data_file.write(payload)
+        self._data_file.flush()
+        self._index_file.write(b''.join(index))
+        self._index_file.flush()
+        metrics.RECORDED_BYTES.inc(self.stream_id, amount=len(payload))
+
+    def _roll_segment(self, captured_at):
+        self._close_segment()
+        stem = str(int(captured_at * 1_000_000))
+        self._data_file = open(os.path.join(self.directory, stem + DATA_SUFFIX), 'ab')
+        self._index_file = open(os.path.join(self.directory, stem + INDEX_SUFFIX), 'ab')
+        self._segment_start = captured_at
+        self._offset = self._data_file.tell()
+        self._enforce_retention()
+
+    def _close_segment(self):
+        for f in (self._data_file, self._index_file):
+            if f:
+                try:
+                    f.close()
+                except OSError:
+                    pass
+        self._data_file = self._index_file = None
+        self._segment_start = None
+
+    def _enforce_retention(self):
+        # A segment goes once its last possible frame is past retention
+        cutoff_us = int((time.time() - self.retention_hours * 3600 - self.segment_seconds) * 1_000_000)
+        segments = list_segments(self.stream_id, os.path.dirname(self.directory))
+        # Keep the newest segment (the one just opened) regardless of clock skew
+        for start_us, data_path, index_path in segments[:-1]:
+            if start_us >= cutoff_us:
+                break
+            for path in (index_path, data_path):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
@@ -0,0 +1,77 @@
+import functools
+
+import cv2
+import numpy as np
+
+# Network input sizes are multiples of the model stride
+STRIDE = 32
+
+
+class Region:
+    """
+    A pixel rectangle of the frame to run inference on. ``mask`` (crop-sized,
+    uint8) is set for polygons: detections whose centre falls outside it are
+    dropped.
+    """
+
+    def __init__(self, left, top, right, bottom, mask=None):
+        self.left = left
+        self.top = top
+        self.right = right
+        self.bottom = bottom
+        self.mask = mask
+
+    def crop(self, frame):
+        """View of the region in ``frame`` (no copy)"""
+        return frame[self.top:self.bottom, self.left:self.right]
+
+    def inference_size(self, size):
+        """
+        ``size``, but no larger than the crop itself: a small doorway crop is
+        not upscaled to the full inference size.
+        """
+        longest = max(self.right - self.left, self.bottom - self.top)
+        return min(size, -(-longest // STRIDE) * STRIDE)
+
+
+def _freeze(regions):
+    return tuple(tuple(tuple(point) for point in region) for region in regions)
+
+
+def frame_regions(regions, width, height):
+    """
+    Pixel regions for a ``width`` x ``height`` frame from the profile's
+    ``roi_regions`` (normalized points); the whole frame when there are none.
+    """
+    if not regions:
+        return (Region(0, 0, width, height),)
+    return _frame_regions(_freeze(regions), width, height)
+
+
+@functools.lru_cache(maxsize=256)
+def _frame_regions(regions, width, height):
+    result = []
+    for region in regions:
+        points = np.array(region, dtype=np.float64) * (width, height)
+        left, top = np.floor(points.min(axis=0)).astype(int)
+        right, bottom = np.ceil(points.max(axis=0)).astype(int)
+        left, top = max(left, 0), max(top, 0)
+        right, bottom = min(right, width), min(bottom, height)
+        if right - left < 2 or bottom - top < 2:
+            continue
+
+        mask = None
+        if len(region) > 2 and not _is_rectangle(points):
+            mask = np.zeros((bottom - top, right - left), dtype=np.uint8)
+            polygon = np.round(points - (left, top)).astype(np.int32)
+            cv2.fillPoly(mask, [polygon], 255)
+        result.append(Region(left, top, right, bottom, mask))
+    return tuple(result)
+
+
+def _is_rectangle(points):
+    """Axis-aligned rectangles need no mask"""
+    if len(points) != 4:
+        return False
+    xs, ys = np.unique(points[:, 0]), np.unique(points[:, 1])
+    return len(xs) == 2 and len(ys) == 2
@@ -3,4 +3,6 @@ from . import consumers
 
 websocket_urlpatterns = [
     re_path(r'ws/stream/(?P<stream_id>[^/]+)/$', consumers.StreamConsumer.as_asgi()),
+    # One connection for many streams (grid views)
+    re_path(r'ws/streams/$', consumers.MultiplexConsumer.as_asgi()),
 ]
\ No newline at end of file
@@ -0,0 +1,147 @@
+import os
+import threading
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class FrameScheduler:
+    """
+    Multiplexes frame processing for many streams over a fixed worker pool.
+
+    Capture threads only read frames and hand the latest one to the scheduler;
+    CPU-heavy work (inference, drawing, encoding) runs on ``workers`` threads.
+    Each stream holds at most one pending frame, so a stream that is not served
+    in time simply has its older frame replaced (its FPS drops) instead of
+    queueing up work. Streams are picked by weighted fair queuing: every stream
+    accumulates ``busy_seconds / weight`` of virtual time and the pending stream
+    with the lowest virtual time runs next, so low-priority cameras degrade first
+    when the node is saturated.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = max(1, int(workers or os.cpu_count() or 1))
+        self._cond = threading.Condition()
+        self._pending = {}      # stream_id -> (processor, frame, captured_at)
+        self._weights = {}      # stream_id -> weight
+        self._vtime = {}        # stream_id -> virtual time
+        self._in_flight = set()
+        self._dropped = {}      # stream_id -> frames replaced before processing
+        self._threads = []
+
+    def register(self, stream_id, weight=1):
+        """Register a stream with the given priority weight"""
+        with self._cond:
+            self._weights[stream_id] = max(float(weight or 1), 0.1)
+            # Start new streams at the current minimum so they neither starve
+            # others nor get starved by streams with a long history
+            if stream_id not in self._vtime:
+                self._vtime[stream_id] = min(self._vtime.values(), default=0.0)
+            self._dropped.setdefault(stream_id, 0)
+        self._ensure_workers()
+        logger.info(f"Scheduler registered stream {stream_id} with weight {self._weights[stream_id]}")
+
+    def set_weight(self, stream_id, weight):
+        """Change the priority weight of a registered stream"""
+        with self._cond:
+            if stream_id in self._weights:
+                self._weights[stream_id] = max(float(weight or 1), 0.1)
+
+    def unregister(self, stream_id):
+        """Forget a stream and drop its pending frame"""
+        with self._cond:
+            self._pending.pop(stream_id, None)
+            self._weights.pop(stream_id, None)
+            self._vtime.pop(stream_id, None)
+            self._dropped.pop(stream_id, None)
+
+    def submit(self, processor, frame, captured_at=None):
+        """
+        Offer the latest frame of a stream for processing.
+
+        Returns False if an older, not yet processed frame was replaced.
+        """
+        stream_id = processor.stream_id
+        with self._cond:
+            if stream_id not in self._weights:
+                return False
+            replaced = stream_id in self._pending
+            if replaced:
+                self._dropped[stream_id] += 1
+            self._pending[stream_id] = (processor, frame, captured_at)
+            self._cond.notify()
+        return not replaced
+
+    def stats(self):
+        """Return a snapshot of scheduler state"""
+        with self._cond:
+            return {
+                'workers': self.workers,
+                'streams': len(self._weights),
+                'pending': len(self._pending),
+                'in_flight': len(self._in_flight),
+                'dropped': dict(self._dropped),
+            }
+
+    def _ensure_workers(self):
+        with self._cond:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            for i in range(len(self._threads), self.workers):
+                thread = threading.Thread(
+                    target=self._worker, name=f'frame-worker-{i}', daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def _next_job(self):
+        """Pick the ready stream with the lowest virtual time (lock held)"""
+        ready = [sid for sid in self._pending if sid not in self._in_flight]
+        if not ready:
+            return None
+        stream_id = min(ready, key=lambda sid: self._vtime.get(sid, 0.0))
+        processor, frame, captured_at = self._pending.pop(stream_id)
+        self._in_flight.add(stream_id)
+        return stream_id, processor, frame, captured_at
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                job = self._next_job()
+                while job is None:
+                    self._cond.wait()
+                    job = self._next_job()
+
+            stream_id, processor, frame, captured_at = job
+            started = time.perf_counter()
+            # Lets the profiler find the thread currently working on this stream
+            processor.active_worker_ident = threading.get_ident()
+            try:
+                processor._process_frame(frame, captured_at)
+            except Exception as e:
+                logger.error(f"Error processing frame for {stream_id}: {e}")
+            finally:
+                processor.active_worker_ident = None
+            elapsed = time.perf_counter() - started
+
+            with self._cond:
+                self._in_flight.discard(stream_id)
+                if stream_id in self._vtime:
+                    self._vtime[stream_id] += elapsed / self._weights.get(stream_id, 1.0)
+                # A frame for this stream may have arrived while it was in flight
+                if self._pending:
+                    self._cond.notify()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Return the process-wide frame scheduler"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            from django.conf import settings
+            _scheduler = FrameScheduler(getattr(settings, 'STREAM_WORKER_THREADS', None))
+        return _scheduler
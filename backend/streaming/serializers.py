@@ -1,15 +1,135 @@
 from rest_framework import serializers
-from .models import Stream
+from .models import Stream, DetectionEvent, DEFAULT_PROFILE, PROFILE_FIELDS, MOSAIC_URL
+from .prober import cached_probe
+from .detectors import resolve_backend
+from .model_pool import check_model_allowed
+
+
+def mosaic_tile_ids(layout):
+    """Stream ids of a mosaic layout's tiles, in order"""
+    return [
+        str(tile.get('stream') if isinstance(tile, dict) else tile)
+        for tile in (layout or {}).get('tiles', [])
+    ]
+
+
+def validate_stream_kind(attrs, instance=None):
+    """
+    Camera streams need a camera URL and have no tiles. Mosaic streams get
+    MOSAIC_URL and must tile at least one existing camera stream (mosaics do
+    not nest).
+    """
+    kind = attrs.get('kind', instance.kind if instance else 'camera')
+    layout = attrs.get('mosaic_layout', instance.mosaic_layout if instance else {})
+    if kind == 'mosaic':
+        tile_ids = mosaic_tile_ids(layout)
+        if not tile_ids:
+            raise serializers.ValidationError({'mosaic_layout': 'A mosaic needs at least one tile.'})
+        cameras = set(
+            str(stream_id) for stream_id in Stream.objects.filter(
+                id__in=set(tile_ids), kind='camera'
+            ).values_list('id', flat=True)
+        )
+        missing = [stream_id for stream_id in tile_ids if stream_id not in cameras]
+        if missing:
+            raise serializers.ValidationError(
+                {'mosaic_layout': f"Unknown or non-camera streams: {', '.join(missing)}"}
+            )
+        attrs['rtsp_url'] = MOSAIC_URL
+    else:
+        rtsp_url = attrs.get('rtsp_url', instance.rtsp_url if instance else None)
+        if not rtsp_url or rtsp_url == MOSAIC_URL:
+            raise serializers.ValidationError({'rtsp_url': 'A camera stream needs an RTSP or HTTP URL.'})
+        if mosaic_tile_ids(layout):
+            raise serializers.ValidationError({'mosaic_layout': 'Only mosaic streams have tiles.'})
+    return attrs
+
+def validate_detection_backend(attrs, instance=None):
+    """The model must be allowed on the backend it would run on (DETECTION_MODELS)"""
+    if 'detection_model' not in attrs and 'detection_backend' not in attrs:
+        return attrs
+    model = attrs.get('detection_model', instance.detection_model if instance
+                      else DEFAULT_PROFILE['detection_model'])
+    backend = attrs.get('detection_backend', instance.detection_backend if instance
+                        else DEFAULT_PROFILE['detection_backend'])
+    try:
+        check_model_allowed(model, resolve_backend(model, backend))
+    except ValueError as e:
+        raise serializers.ValidationError({'detection_backend': str(e)})
+    return attrs
+
+class SparseFieldsMixin:
+    """Limit output to the comma-separated ``?fields=`` query parameter"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        requested = request.query_params.get('fields') if request else None
+        if requested:
+            wanted = {name.strip() for name in requested.split(',') if name.strip()}
+            for name in set(self.fields) - wanted:
+                self.fields.pop(name)
+
+
+class StreamSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    health = serializers.SerializerMethodField()
 
-class StreamSerializer(serializers.ModelSerializer):
     class Meta:
         model = Stream
-        fields = ['id', 'rtsp_url', 'title', 'description', 'is_active', 
-                 'created_at', 'updated_at', 'viewer_count', 'last_frame_time']
-        read_only_fields = ['id', 'created_at', 'updated_at', 'is_active', 
+        fields = ['id', 'kind', 'rtsp_url', 'title', 'description', 'is_active', 
+                 'created_at', 'updated_at', 'viewer_count', 'last_frame_time',
+                 'priority', 'health'] + PROFILE_FIELDS
+        read_only_fields = ['id', 'kind', 'created_at', 'updated_at', 'is_active', 
                            'viewer_count', 'last_frame_time']
 
+    def get_health(self, obj):
+        """Cached camera probe result (None until probed; mosaics have none)"""
+        if obj.kind != 'camera':
+            return None
+        # Listings look all results up at once (see StreamViewSet.list)
+        probes = self.context.get('probe_results')
+        if probes is not None:
+            return probes.get(obj.rtsp_url)
+        return cached_probe(obj.rtsp_url)
+
+    def validate(self, attrs):
+        attrs = validate_detection_backend(attrs, self.instance)
+        return validate_stream_kind(attrs, self.instance)
+
+class BulkCreateStreamListSerializer(serializers.ListSerializer):
+    """Creates all validated streams with a single bulk_create"""
+    MAX_STREAMS = 1000
+
+    def __init__(self, *args, **kwargs):
+        # ListSerializer takes the limit from its arguments only
+        kwargs.setdefault('max_length', self.MAX_STREAMS)
+        super().__init__(*args, **kwargs)
+
+    def create(self, validated_data):
+        return Stream.objects.bulk_create([Stream(**item) for item in validated_data])
+
+
 class CreateStreamSerializer(serializers.ModelSerializer):
     class Meta:
         model = Stream
-        fields = ['rtsp_url', 'title', 'description']
\ No newline at end of file
+        fields = ['kind', 'rtsp_url', 'title', 'description', 'priority'] + PROFILE_FIELDS
+        list_serializer_class = BulkCreateStreamListSerializer
+        # Mosaic streams have no URL of their own (checked in validate)
+        extra_kwargs = {'rtsp_url': {'required': False}}
+
+    def validate(self, attrs):
+        attrs = validate_detection_backend(attrs)
+        attrs = validate_stream_kind(attrs)
+        # Extract title from URL if not provided
+        if not attrs.get('title'):
+            if attrs.get('kind') == 'mosaic':
+                attrs['title'] = 'Mosaic'
+            else:
+                rtsp_url = attrs['rtsp_url']
+                attrs['title'] = f"Stream {rtsp_url.split('/')[-1] or 'Camera'}"
+        return attrs
+
+class DetectionEventSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DetectionEvent
+        fields = ['id', 'timestamp', 'class_id', 'label', 'confidence', 'x1', 'y1', 'x2', 'y2']
@@ -0,0 +1,12 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .list_cache import invalidate_stream_list
+from .models import Stream
+
+
+@receiver(post_save, sender=Stream)
+@receiver(post_delete, sender=Stream)
+def stream_changed(sender, **kwargs):
+    """Drop cached stream listings whenever a stream is created, updated or deleted"""
+    invalidate_stream_list()
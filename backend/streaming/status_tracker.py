@@ -0,0 +1,170 @@
+import threading
+import logging
+import time
+import uuid
+from datetime import datetime, timezone
+
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest, Now
+
+from .list_cache import invalidate_stream_list
+
+logger = logging.getLogger(__name__)
+
+
+class StreamStatusTracker:
+    """
+    Keeps viewer counts, active flags and last-frame timestamps in memory and
+    flushes them to the database periodically.
+
+    Viewer changes are accumulated as deltas and applied with atomic
+    ``F('viewer_count') + delta`` updates, so concurrent connects on several
+    workers never overwrite each other. Last-frame timestamps are written with
+    a single ``bulk_update`` per flush.
+    """
+
+    def __init__(self, flush_interval=2.0):
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._viewer_deltas = {}   # stream_id -> pending viewer_count delta
+        self._active = {}          # stream_id -> pending is_active value
+        self._last_frame = {}      # stream_id -> last frame timestamp
+        self._thread = None
+
+    def viewer_joined(self, stream_id):
+        """Record a new viewer for a stream"""
+        stream_id = _as_uuid(stream_id)
+        if stream_id is None:
+            return
+        with self._lock:
+            self._viewer_deltas[stream_id] = self._viewer_deltas.get(stream_id, 0) + 1
+            self._active[stream_id] = True
+        self._ensure_flusher()
+
+    def viewer_left(self, stream_id, deactivate=False):
+        """Record a viewer leaving a stream"""
+        stream_id = _as_uuid(stream_id)
+        if stream_id is None:
+            return
+        with self._lock:
+            self._viewer_deltas[stream_id] = self._viewer_deltas.get(stream_id, 0) - 1
+            if deactivate:
+                self._active[stream_id] = False
+        self._ensure_flusher()
+
+    def frame_sent(self, stream_id):
+        """Record that a frame was delivered (called from the hot path)"""
+        stream_id = _as_uuid(stream_id)
+        if stream_id is None:
+            return
+        now = datetime.now(timezone.utc)
+        # Uncontended; keeps the write out of a dict the flusher already took
+        with self._lock:
+            self._last_frame[stream_id] = now
+
+    def reset(self, stream_ids):
+        """Drop pending updates for streams whose row was reset directly"""
+        with self._lock:
+            for stream_id in map(_as_uuid, stream_ids):
+                self._viewer_deltas.pop(stream_id, None)
+                self._active.pop(stream_id, None)
+                self._last_frame.pop(stream_id, None)
+
+    def flush(self):
+        """Write all pending updates to the database"""
+        with self._lock:
+            deltas, self._viewer_deltas = self._viewer_deltas, {}
+            active, self._active = self._active, {}
+            last_frame, self._last_frame = self._last_frame, {}
+
+        if not (deltas or active or last_frame):
+            return
+
+        try:
+            # All or nothing, so a failed flush can put everything back
+            with transaction.atomic():
+                changed = self._write(deltas, active, last_frame)
+
+            # update() bypasses the post_save signal
+            if changed:
+                invalidate_stream_list()
+        except Exception as e:
+            logger.error(f"Failed to flush stream status: {e}")
+            # Put the updates back so counts stay correct on the next flush
+            with self._lock:
+                for stream_id, delta in deltas.items():
+                    self._viewer_deltas[stream_id] = self._viewer_deltas.get(stream_id, 0) + delta
+                for stream_id, value in active.items():
+                    self._active.setdefault(stream_id, value)
+                for stream_id, value in last_frame.items():
+                    self._last_frame.setdefault(stream_id, value)
+
+    def _write(self, deltas, active, last_frame):
+        """Apply the updates; True if a viewer count or active flag changed"""
+        from .models import Stream
+
+        changed = False
+        for stream_id in set(deltas) | set(active):
+            updates = {}
+            rows = Stream.objects.filter(id=stream_id)
+            delta = deltas.get(stream_id, 0)
+            if delta:
+                updates['viewer_count'] = Greatest(F('viewer_count') + delta, 0)
+            if stream_id in active:
+                updates['is_active'] = active[stream_id]
+                if not delta:
+                    # Rows that already have the flag are left alone
+                    rows = rows.exclude(is_active=active[stream_id])
+            if updates:
+                # Bump updated_at so listing ETags see the change
+                changed = rows.update(updated_at=Now(), **updates) > 0 or changed
+
+        if last_frame:
+            # Frame times change every flush while a stream runs; they do not
+            # touch updated_at, or listing ETags and caches would never hit.
+            # bulk_update silently skips missing rows, so no existence check
+            Stream.objects.bulk_update(
+                [Stream(id=sid, last_frame_time=ts) for sid, ts in last_frame.items()],
+                ['last_frame_time'],
+            )
+        return changed
+
+    def _ensure_flusher(self):
+        if self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._run, name='stream-status-flusher', daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            close_old_connections()
+            self.flush()
+
+
+def _as_uuid(stream_id):
+    """Stream ids arrive as URL strings; only UUIDs can match a database row"""
+    try:
+        return uuid.UUID(str(stream_id))
+    except ValueError:
+        return None
+
+
+_tracker = None
+_tracker_lock = threading.Lock()
+
+
+def get_status_tracker():
+    """Return the process-wide stream status tracker"""
+    global _tracker
+    with _tracker_lock:
+        if _tracker is None:
+            from django.conf import settings
+            _tracker = StreamStatusTracker(getattr(settings, 'STREAM_STATUS_FLUSH_INTERVAL', 2.0))
+        return _tracker
@@ -6,35 +6,137 @@ import threading
 import logging
 import time
 from datetime import datetime
-import ffmpeg
-import io
 import subprocess
 import os
+from concurrent.futures import ThreadPoolExecutor
+from django.db import DatabaseError
+from django.db.models import Q
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
-from ultralytics import YOLO
+from .scheduler import get_scheduler
+from .model_pool import get_model_pool
+from .status_tracker import get_status_tracker
+from .event_store import get_event_writer
+from .recording import SegmentRecorder
+from .fmp4 import passthrough_command, read_fragments, codec_string
+from .models import DEFAULT_PROFILE, MOSAIC_URL
+from .prober import connection_hints, record_connection
+from .detections import Detections, draw_detections
+from .regions import frame_regions
+from . import metrics
 
 logger = logging.getLogger(__name__)
 
+# Per-frame message types and the consumer attribute holding the latest one
+LATEST_ONLY_SLOTS = {
+    'frame': 'pending_frame',
+    'detections': 'pending_detections',
+    # fMP4 fragments start at keyframes, so skipping one is safe as well
+    'media': 'pending_media',
+}
+# Slots whose overwrites count as viewer drops
+DROP_COUNTED_SLOTS = {'frame', 'media'}
+
+# Duplicate boxes from overlapping regions of interest are merged above this IoU
+REGION_NMS_IOU = 0.5
+
+# Frame sizes a consumer can ask for (its ``rendition`` attribute): maximum
+# width in pixels, None for the profile's output_width. Smaller renditions are
+# encoded once per frame, only while some consumer wants them.
+RENDITIONS = {
+    'full': None,
+    'medium': 480,
+    'thumbnail': 240,
+}
+# Messages skipped for consumers with a frame rate cap (``min_frame_interval``)
+THROTTLED_TYPES = {'frame', 'detections'}
+
+# Static scene detection compares grayscale thumbnails this wide. Frames are
+# subsampled to about 8 pixels per thumbnail pixel first, which keeps the
+# comparison well under a millisecond for 1080p and still averages out noise.
+STATIC_THUMBNAIL_WIDTH = 64
+# A thumbnail pixel counts as changed above this difference (0-255); sensor
+# noise stays well below it after averaging
+STATIC_PIXEL_DELTA = 16
+# While frames are skipped as static, viewers get a heartbeat this often
+HEARTBEAT_SECONDS = 1.0
+# Detections count as unchanged while every box corner moved less than this
+# fraction of the frame width
+STATIC_BOX_TOLERANCE = 0.01
+
 class StreamProcessor:
-    def __init__(self, rtsp_url, stream_id):
+    def __init__(self, rtsp_url, stream_id, priority=1, profile=None):
         self.rtsp_url = rtsp_url
         self.stream_id = stream_id
+        self.priority = priority
+        self.profile = {**DEFAULT_PROFILE, **(profile or {})}
+        # The profile as configured, and what admission control lowered in it
+        self.requested_profile = self.profile
+        self.profile_overrides = {}
         self.is_running = False
         self.cap = None
         self.consumers = set()
         self.thread = None
         self.is_paused = False
-        # Load a pre-trained YOLO model
-        self.model = YOLO("yolo11n.pt")
+        self.last_frame_at = None  # time.time() of the last processed frame
+        self.frame_seq = 0  # Sequence number pairing frames with their detections
+        self.active_worker_ident = None  # Scheduler worker processing a frame right now
+        self.recorder = None  # SegmentRecorder while recording_enabled
+        # fmp4 output mode: FFmpeg remuxer and the init message late joiners need
+        self.passthrough_thread = None
+        self.passthrough_process = None
+        self.mse_init = None
+        # Static scene detection: thumbnail of the last frame sent and when
+        self.static_reference = None
+        self.static_reference_at = 0.0
+        self.static_candidate = None
+        self.heartbeat_at = 0.0
+        # Detections drawn on / sent with the last frame, and its JPEG (while
+        # recording), repeated for static frames that are not encoded
+        self.sent_detections = None
+        self.last_jpeg = None
 
     def add_consumer(self, consumer):
         """Add a WebSocket consumer to receive frames"""
         self.consumers.add(consumer)
+        # A new viewer of a static scene should not wait for the next change
+        self.static_reference = None
+        metrics.VIEWERS.set(self.stream_id, value=len(self.consumers))
         logger.info(f"Added consumer to stream {self.stream_id}. Total: {len(self.consumers)}")
 
+        # MSE players joining mid-stream need the initialization segment first
+        if self.mse_init is not None and hasattr(consumer, 'pending_messages'):
+            consumer.pending_messages.append(self.mse_init)
+
+    def set_consumer_pause(self, consumer, paused):
+        """
+        Pause or resume delivery to one viewer. Other viewers are not
+        affected; once every viewer is paused the stream goes idle.
+        """
+        was_idle = self.is_idle()
+        consumer.paused = paused
+        if not paused:
+            # The resumed viewer should not wait for a scene change
+            self.static_reference = None
+        idle = self.is_idle()
+        if idle != was_idle:
+            logger.info(f"Stream {self.stream_id} {'idle' if idle else 'active'}")
+
+    def is_idle(self):
+        """
+        Whether frames are needed at all: not while the stream is paused, or
+        while every consumer is paused and nothing is recorded. Idle streams
+        keep their connection drained so they resume instantly.
+        """
+        if self.is_paused:
+            return True
+        if self.recorder is not None or self.profile['record_detections']:
+            return False
+        consumers = self.consumers.copy()
+        return bool(consumers) and all(getattr(consumer, 'paused', False) for consumer in consumers)
+
     def set_pause(self, paused):
-        """Set pause state"""
+        """Pause or resume the stream for all viewers"""
         self.is_paused = paused
         status = 'paused' if paused else 'resumed'
         logger.info(f"Stream {self.stream_id} {status}")
@@ -49,35 +151,113 @@ class StreamProcessor:
     def remove_consumer(self, consumer):
         """Remove a WebSocket consumer"""
         self.consumers.discard(consumer)
+        metrics.VIEWERS.set(self.stream_id, value=len(self.consumers))
         logger.info(f"Removed consumer from stream {self.stream_id}. Total: {len(self.consumers)}")
 
-        # Stop stream if no consumers
-        if not self.consumers and self.is_running:
+        # Stop stream if no consumers (recording streams run regardless)
+        if not self.consumers and self.is_running and not self.records():
             self.stop()
 
+    def records(self):
+        """Whether the stream records frames or detections, and so runs without viewers"""
+        return bool(self.profile['recording_enabled'] or self.profile['record_detections'])
+
     def start(self):
         """Start the stream processing"""
         if self.is_running:
             return
 
         self.is_running = True
+        get_scheduler().register(self.stream_id, self.priority)
+        self._sync_recorder()
+
+        if self.profile['output_mode'] == 'fmp4':
+            self.passthrough_thread = threading.Thread(target=self._run_passthrough, daemon=True)
+            self.passthrough_thread.start()
+            # Decoding is then only needed for the detections side channel
+            if not self.profile['detection_enabled'] and not self.profile['recording_enabled']:
+                logger.info(f"Started passthrough for {self.stream_id}")
+                return
+
         self.thread = threading.Thread(target=self._process_stream, daemon=True)
         self.thread.start()
         logger.info(f"Started stream processor for {self.stream_id}")
 
+    def update_profile(self, profile):
+        """Hot-reload the processing profile without reconnecting"""
+        self.requested_profile = {**DEFAULT_PROFILE, **(profile or {})}
+        # A stream started degraded stays degraded until it stops
+        new_profile = {**self.requested_profile, **self.profile_overrides}
+        if new_profile['rtsp_transport'] != self.profile['rtsp_transport']:
+            logger.info(f"Stream {self.stream_id}: transport change applies on next connection")
+        if new_profile['output_mode'] != self.profile['output_mode']:
+            logger.info(f"Stream {self.stream_id}: output mode change applies on restart")
+            new_profile['output_mode'] = self.profile['output_mode']
+        # Swap the whole dict so the worker never sees a half-updated profile
+        self.profile = new_profile
+        # The new settings may change what is detected or drawn
+        self.static_reference = None
+        if self.is_running:
+            self._sync_recorder()
+        logger.info(f"Reloaded processing profile for {self.stream_id}")
+
+    def degrade(self, overrides):
+        """Run with a cheaper profile (admission control) until the stream stops"""
+        self.profile_overrides = dict(overrides)
+        self.update_profile(self.requested_profile)
+        logger.info(f"Stream {self.stream_id} degraded: {self.profile_overrides}")
+
+    def source_profiles(self):
+        """Profiles of streams that starting this one starts too (see MosaicProcessor)"""
+        return []
+
+    def _sync_recorder(self):
+        """Start, stop or retune the recorder to match the profile"""
+        from django.conf import settings
+
+        if self.profile['recording_enabled'] and self.recorder is None:
+            recorder = SegmentRecorder(
+                self.stream_id,
+                segment_seconds=getattr(settings, 'RECORDING_SEGMENT_SECONDS', 60),
+                retention_hours=self.profile['recording_retention_hours'],
+            )
+            recorder.start()
+            self.recorder = recorder
+        elif not self.profile['recording_enabled'] and self.recorder is not None:
+            recorder, self.recorder = self.recorder, None
+            _close_recorder(recorder)
+        elif self.recorder is not None:
+            self.recorder.retention_hours = self.profile['recording_retention_hours']
+
+    def set_priority(self, priority):
+        """Change the scheduling weight of this stream"""
+        self.priority = priority
+        get_scheduler().set_weight(self.stream_id, priority)
+
     def stop(self):
         """Stop the stream processing"""
         self.is_running = False
+        get_scheduler().unregister(self.stream_id)
         if self.cap:
             self.cap.release()
-
-        # Notify all consumers that stream stopped
-        for consumer in self.consumers.copy():
-            asyncio.create_task(consumer.send_json({
-                'type': 'stream_stopped',
-                'stream_id': self.stream_id,
-                'message': 'Stream has been stopped'
-            }))
+        if self.recorder:
+            recorder, self.recorder = self.recorder, None
+            _close_recorder(recorder)
+        if self.passthrough_process:
+            self.passthrough_process.kill()
+        self.last_jpeg = None
+        if self.profile_overrides:
+            # The next start is admitted with the configured profile again
+            self.profile_overrides = {}
+            self.profile = self.requested_profile
+
+        # Notify all consumers that stream stopped. Queued like any other
+        # message, since stop() may be called from a thread without an event loop
+        self._send_message({
+            'type': 'stream_stopped',
+            'stream_id': self.stream_id,
+            'message': 'Stream has been stopped'
+        })
 
         logger.info(f"Stopped stream processor for {self.stream_id}")
 
@@ -86,13 +266,17 @@ class StreamProcessor:
         try:
             # Configure OpenCV for better RTSP/HTTP support with multiple fallback options
             self.cap = None
+            open_method = None
+            camera_down = False
 
             # Try different OpenCV backends and configurations for RTSP
             if self.rtsp_url.startswith('rtsp://'):
                 # List of configurations to try in order of preference
+                use_tcp = self.profile['rtsp_transport'] == 'tcp'
                 rtsp_configs = [
                     # Configuration 1: FFmpeg backend with TCP transport (most reliable)
                     {
+                        'name': 'tcp',
                         'url': self.rtsp_url + '?tcp',
                         'backend': cv2.CAP_FFMPEG,
                         'options': {
@@ -104,6 +288,7 @@ class StreamProcessor:
                     },
                     # Configuration 2: Standard URL with longer timeouts
                     {
+                        'name': 'default',
                         'url': self.rtsp_url,
                         'backend': cv2.CAP_FFMPEG,
                         'options': {
@@ -115,6 +300,7 @@ class StreamProcessor:
                     },
                     # Configuration 3: Any available backend
                     {
+                        'name': 'any',
                         'url': self.rtsp_url,
                         'backend': cv2.CAP_ANY,
                         'options': {
@@ -125,9 +311,25 @@ class StreamProcessor:
                     }
                 ]
 
+                if not use_tcp:
+                    # Skip the forced-TCP configuration
+                    rtsp_configs = rtsp_configs[1:]
+
+                # Use what the camera prober knows: the configuration that
+                # worked last goes first, and for a camera that is down only one
+                # attempt is made instead of every slow fallback
+                hints = connection_hints(self.rtsp_url)
+                rtsp_configs.sort(key=lambda config: config['name'] != hints['open_method'])
+                if hints['reachable'] is False:
+                    camera_down = True
+                    rtsp_configs = rtsp_configs[:1]
+                    logger.info(f"Camera for {self.stream_id} was unreachable when probed; skipping fallbacks")
+
                 # Try each configuration until one works
                 for i, config in enumerate(rtsp_configs):
-                    logger.info(f"Trying RTSP connection method {i+1}/3 for {self.stream_id}")
+                    logger.info(f"Trying RTSP connection method {i+1}/{len(rtsp_configs)} for {self.stream_id}")
+                    if i > 0:
+                        metrics.RECONNECTS.inc(self.stream_id)
                     try:
                         self.cap = cv2.VideoCapture(config['url'], config['backend'])
 
@@ -140,7 +342,8 @@ class StreamProcessor:
                             # Try to read a test frame to verify connection
                             ret, test_frame = self.cap.read()
                             if ret and test_frame is not None:
-                                logger.info(f"Successfully connected using method {i+1}")
+                                logger.info(f"Successfully connected using method {i+1} ({config['name']})")
+                                open_method = config['name']
                                 break
                             else:
                                 logger.warning(f"Method {i+1} opened but couldn't read frame")
@@ -173,11 +376,13 @@ class StreamProcessor:
 
             if not self.cap or not self.cap.isOpened():
                 logger.warning(f"OpenCV failed to open stream: {self.rtsp_url}")
-                logger.info(f"Trying FFmpeg direct method for {self.stream_id}")
 
                 # Try FFmpeg direct approach as last resort
-                if self._try_ffmpeg_stream():
-                    return
+                if not camera_down:
+                    logger.info(f"Trying FFmpeg direct method for {self.stream_id}")
+                    metrics.RECONNECTS.inc(self.stream_id)
+                    if self._try_ffmpeg_stream():
+                        return
 
                 logger.error(f"Failed to open stream with all methods: {self.rtsp_url}")
                 # Try demo mode with test pattern
@@ -186,6 +391,12 @@ class StreamProcessor:
                 return
 
             logger.info(f"Successfully opened stream: {self.rtsp_url}")
+            if not os.path.isfile(self.rtsp_url):
+                record_connection(
+                    self.rtsp_url, open_method,
+                    int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                    round(self.cap.get(cv2.CAP_PROP_FPS), 2)
+                )
 
             # Send connection success message
             self._send_message({
@@ -200,10 +411,36 @@ class StreamProcessor:
             max_failures = 10  # Allow some frame read failures before giving up
 
             while self.is_running:
+                # Idle: only grab, so no colour conversion, inference or
+                # encoding; reading keeps up with the camera for an instant resume
+                if self.is_idle():
+                    if self.cap.grab():
+                        consecutive_failures = 0
+                    elif os.path.isfile(self.rtsp_url):
+                        self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    else:
+                        consecutive_failures += 1
+                        metrics.READ_FAILURES.inc(self.stream_id)
+                        if consecutive_failures >= max_failures:
+                            logger.error(f"Too many consecutive frame read failures for {self.rtsp_url}")
+                            self._send_error("Stream connection lost after multiple failed frame reads")
+                            break
+                    time.sleep(1.0 / self.profile['target_fps'])
+                    continue
+
+                read_started = time.perf_counter()
                 ret, frame = self.cap.read()
+                captured_at = time.time()
+
+                if not ret and os.path.isfile(self.rtsp_url):
+                    # Local video files (benchmarks, test clips) loop forever
+                    self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    ret, frame = self.cap.read()
+                    captured_at = time.time()
 
                 if not ret:
                     consecutive_failures += 1
+                    metrics.READ_FAILURES.inc(self.stream_id)
                     logger.warning(f"Failed to read frame from {self.rtsp_url} (failure {consecutive_failures}/{max_failures})")
 
                     if consecutive_failures >= max_failures:
@@ -217,66 +454,17 @@ class StreamProcessor:
 
                 # Reset failure counter on successful read
                 consecutive_failures = 0
+                metrics.CAPTURE_SECONDS.observe(self.stream_id, value=time.perf_counter() - read_started)
 
-                # Perform object detection
-                results = self.model(frame)
-
-                # Draw bounding boxes and labels on the frame with better visibility
-                for result in results:
-                    for box in result.boxes:
-                        x1, y1, x2, y2 = [int(val) for val in box.xyxy[0]]
-                        conf = box.conf[0]
-                        cls = box.cls[0]
-                        label = f"{self.model.names[int(cls)]} {conf:.2f}"
-                        
-                        # Draw bounding box with thicker lines
-                        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 3)
-                        
-                        # Calculate text size for background
-                        (text_width, text_height), baseline = cv2.getTextSize(
-                            label, cv2.FONT_HERSHEY_SIMPLEX, 0.7, 2
-                        )
-                        
-                        # Draw background rectangle for text
-                        cv2.rectangle(frame, 
-                                    (x1, y1 - text_height - 10), 
-                                    (x1 + text_width, y1), 
-                                    (0, 255, 0), -1)
-                        
-                        # Draw text with better contrast
-                        cv2.putText(frame, label, (x1, y1 - 5), 
-                                  cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 0), 2)
-
-
-                # Optimize frame processing for speed
-                height, width = frame.shape[:2]
-
-                # Only resize if really necessary (reduce processing time)
-                if width > 800:  # Increased threshold for better quality
-                    scale = 800 / width  # Allow larger frames for better quality
-                    new_width = 800
-                    new_height = int(height * scale)
-                    frame = cv2.resize(frame, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
-
-                # Optimize JPEG encoding for speed vs quality balance
-                encode_param = [cv2.IMWRITE_JPEG_QUALITY, 85,  # Slightly higher quality
-                               cv2.IMWRITE_JPEG_OPTIMIZE, 1]   # Optimize for smaller file size
-                _, buffer = cv2.imencode('.jpg', frame, encode_param)
-                frame_data = base64.b64encode(buffer).decode('utf-8')
-
-                # Send frame to all consumers
-                self._send_frame(frame_data)
+                # Hand the frame to the shared worker pool; an unprocessed
+                # older frame is replaced rather than queued
+                if not get_scheduler().submit(self, frame, captured_at):
+                    metrics.FRAMES_DROPPED.inc(self.stream_id, 'scheduler')
 
                 frame_count += 1
 
                 # Control frame rate
-                frame_delay = 0.033  # ~30 FPS
-
-                # Skip frames if paused
-                if self.is_paused:
-                    time.sleep(0.1)  # Pause mode
-                    continue
-
+                frame_delay = 1.0 / self.profile['target_fps']
                 time.sleep(frame_delay)
 
         except Exception as e:
@@ -285,8 +473,137 @@ class StreamProcessor:
         finally:
             if self.cap:
                 self.cap.release()
+            get_scheduler().unregister(self.stream_id)
             self.is_running = False
 
+    def _process_frame(self, frame, captured_at=None):
+        """Run detection, annotate, encode and send a frame (called by the scheduler)"""
+        profile = self.profile
+        detections = None
+        # In fmp4 mode viewers get the camera's own video; this path only
+        # feeds the detections side channel and the recorder
+        passthrough = profile['output_mode'] == 'fmp4'
+
+        # Detection still runs on a static scene: a change below the
+        # threshold can be a small or distant object
+        static = not passthrough and profile['static_threshold'] and self._is_static(frame)
+
+        # Perform object detection
+        height, width = frame.shape[:2]
+        # A model that failed to load is retried after a backoff; until then
+        # frames go on without detection instead of failing one by one
+        if profile['detection_enabled'] and get_model_pool().available(profile['detection_model'],
+                                                                       profile['detection_backend']):
+            # Only the regions of interest (or the whole frame) go to the model;
+            # crops are views, and boxes are shifted back to frame pixels
+            regions = frame_regions(profile['roi_regions'], width, height)
+            parts = []
+            # Models are shared between streams; an instance is borrowed per inference
+            with get_model_pool().checkout(profile['detection_model'],
+                                           profile['detection_backend']) as detector:
+                stage_started = time.perf_counter()
+                for region in regions:
+                    found = detector.detect(region.crop(frame), profile['confidence_threshold'],
+                                            profile['detection_classes'],
+                                            region.inference_size(profile['inference_size']))
+                    parts.append(found.inside(region.mask).offset(region.left, region.top))
+                names = detector.names
+            metrics.INFERENCE_SECONDS.observe(self.stream_id, value=time.perf_counter() - stage_started)
+
+            # Post-process in bulk
+            stage_started = time.perf_counter()
+            detections = Detections.concatenate(parts)
+            if len(regions) > 1:
+                # Overlapping regions can report the same object twice
+                detections = detections.nms(REGION_NMS_IOU)
+            detections = detections.filter(
+                profile['confidence_threshold'], profile['detection_classes'], profile['max_boxes']
+            )
+            if profile['record_detections']:
+                get_event_writer().record(self.stream_id, captured_at or time.time(), detections,
+                                          names, width, height)
+            metrics.ANNOTATE_SECONDS.observe(self.stream_id, value=time.perf_counter() - stage_started)
+
+        if static:
+            if detections is None or detections.matches(self.sent_detections, STATIC_BOX_TOLERANCE * width):
+                # Nothing changed: viewers keep the last frame and get a
+                # heartbeat, recordings repeat its JPEG
+                metrics.FRAMES_STATIC.inc(self.stream_id)
+                if self.recorder is not None and self.last_jpeg is not None:
+                    self.recorder.write(self.last_jpeg, captured_at or time.time())
+                self._send_heartbeat(captured_at)
+                return
+            # Same scene, different detections: this frame is sent and
+            # becomes the new reference
+            self._keep_static_reference()
+        self.sent_detections = detections
+
+        if passthrough:
+            self.frame_seq += 1
+            if detections is not None:
+                self._send_detections(detections, names, width, height)
+            if self.recorder is None and not self._raw_consumers():
+                return
+
+        # Optimize frame processing for speed
+        stage_started = time.perf_counter()
+
+        # Only resize if really necessary (reduce processing time)
+        output_width = profile['output_width']
+        scale = 1.0
+        if width > output_width:
+            scale = output_width / width
+            new_width = output_width
+            new_height = int(height * scale)
+            frame = cv2.resize(frame, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+
+        # Boxes are drawn on the output-sized frame, so their line width and
+        # labels look the same whatever the camera resolution. In client
+        # overlay mode viewers draw them and the frame stays unannotated.
+        if detections is not None and profile['overlay_mode'] == 'server' and not passthrough:
+            draw_detections(frame, detections.scaled(scale), names)
+
+        # Mosaic tiles take the output-sized frame as is, before any encoding
+        for consumer in self._raw_consumers():
+            consumer.offer_frame(frame)
+        if self.recorder is None and (passthrough or not self._viewers()):
+            # Nobody needs a JPEG of this frame
+            if not passthrough:
+                metrics.FRAMES_PROCESSED.inc(self.stream_id)
+                self.last_frame_at = time.time()
+            return
+
+        # Optimize JPEG encoding for speed vs quality balance
+        encode_param = [cv2.IMWRITE_JPEG_QUALITY, profile['jpeg_quality'],
+                       cv2.IMWRITE_JPEG_OPTIMIZE, 1]   # Optimize for smaller file size
+        _, buffer = cv2.imencode('.jpg', frame, encode_param)
+        frame_data = base64.b64encode(buffer).decode('utf-8')
+        renditions = self._encode_renditions(frame, encode_param) if not passthrough else None
+        metrics.ENCODE_SECONDS.observe(self.stream_id, value=time.perf_counter() - stage_started)
+
+        # Record the same JPEG the viewers get (no second encode)
+        recorder = self.recorder
+        if recorder:
+            self.last_jpeg = buffer.tobytes()
+            recorder.write(self.last_jpeg, captured_at or time.time())
+        if passthrough:
+            return
+
+        # HTTP MJPEG clients share the JPEG bytes as well
+        jpeg_consumers = self._jpeg_consumers()
+        if jpeg_consumers:
+            jpeg = buffer.tobytes()
+            for consumer in jpeg_consumers:
+                consumer.offer_jpeg(jpeg, captured_at or time.time())
+
+        # Send frame (and, in client overlay mode, its detections) to all consumers
+        self.frame_seq += 1
+        if detections is not None and profile['overlay_mode'] == 'client':
+            self._send_detections(detections, names, width, height)
+        self._send_frame(frame_data, captured_at, self.frame_seq, renditions)
+        metrics.FRAMES_PROCESSED.inc(self.stream_id)
+        self.last_frame_at = time.time()
+
     def _run_demo_mode(self):
         """Run demo mode with test pattern when real stream fails"""
         try:
@@ -301,6 +618,10 @@ class StreamProcessor:
             frame_count = 0
 
             while self.is_running and self.consumers:
+                if self.is_idle():
+                    time.sleep(0.1)
+                    continue
+
                 # Create a test pattern frame
                 frame = np.zeros((240, 320, 3), dtype=np.uint8)
 
@@ -337,20 +658,15 @@ class StreamProcessor:
 
                 # Convert frame to JPEG
                 _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
-                frame_data = base64.b64encode(buffer).decode('utf-8')
 
                 # Send frame to all consumers
-                self._send_frame(frame_data)
+                self._send_fallback_frame(buffer.tobytes(), frame)
+                metrics.FRAMES_PROCESSED.inc(self.stream_id)
 
                 frame_count += 1
 
                 # Frame rate control for demo mode
                 demo_delay = 0.05  # 20 FPS for demo
-
-                if self.is_paused:
-                    time.sleep(0.1)
-                    continue
-
                 time.sleep(demo_delay)
 
         except Exception as e:
@@ -373,12 +689,12 @@ class StreamProcessor:
             # Configure FFmpeg command for video-only RTSP stream
             ffmpeg_cmd = [
                 'ffmpeg',
-                '-rtsp_transport', 'tcp',  # Force TCP transport
+                '-rtsp_transport', self.profile['rtsp_transport'],
                 '-i', self.rtsp_url,
                 '-vf', 'scale=640:-1',  # Resize to 640px width
                 '-c:v', 'mjpeg',  # MJPEG codec for easier processing
                 '-f', 'image2pipe',  # Output as image stream
-                '-r', '25',  # 25 FPS for smoother video
+                '-r', f"{self.profile['target_fps']:g}",  # Profile frame rate
                 '-q:v', '5',  # Good quality
                 'pipe:1'
             ]
@@ -428,9 +744,12 @@ class StreamProcessor:
                     frame_data = buffer[start:end + 2]
                     buffer = buffer[end + 2:]
 
-                    # Convert to base64 and send
-                    frame_b64 = base64.b64encode(frame_data).decode('utf-8')
-                    self._send_frame(frame_b64)
+                    # FFmpeg keeps decoding; idle streams just discard its output
+                    if self.is_idle():
+                        continue
+
+                    self._send_fallback_frame(frame_data)
+                    metrics.FRAMES_PROCESSED.inc(self.stream_id)
 
                     frame_count += 1
 
@@ -441,58 +760,267 @@ class StreamProcessor:
             process.terminate()
             process.wait()
 
-            return True
+            # FFmpeg exiting before the first frame means it could not connect
+            # either; report failure so the caller falls back to demo mode
+            return frame_count > 0
 
         except Exception as e:
             logger.error(f"FFmpeg stream processing failed: {str(e)}")
             self._send_error(f"FFmpeg streaming error: {str(e)}")
             return False
 
-    def _send_frame(self, frame_data):
-        """Send frame data to all consumers"""
+    def _is_static(self, frame):
+        """
+        True if less than static_threshold percent of ``frame`` changed since
+        the last frame sent, and that was less than static_max_skip_seconds
+        ago. Otherwise the frame becomes the new reference.
+        """
+        step = max(1, frame.shape[1] // (STATIC_THUMBNAIL_WIDTH * 8))
+        sampled = frame[::step, ::step]
+        size = (STATIC_THUMBNAIL_WIDTH, max(1, sampled.shape[0] * STATIC_THUMBNAIL_WIDTH // sampled.shape[1]))
+        thumbnail = cv2.cvtColor(cv2.resize(sampled, size, interpolation=cv2.INTER_AREA),
+                                 cv2.COLOR_BGR2GRAY)
+
+        now = time.monotonic()
+        reference = self.static_reference
+        if (reference is not None and reference.shape == thumbnail.shape
+                and now - self.static_reference_at < self.profile['static_max_skip_seconds']
+                and np.count_nonzero(cv2.absdiff(thumbnail, reference) > STATIC_PIXEL_DELTA) * 100
+                < self.profile['static_threshold'] * thumbnail.size):
+            self.static_candidate = thumbnail
+            return True
+        self.static_reference = thumbnail
+        self.static_reference_at = now
+        return False
+
+    def _keep_static_reference(self):
+        """Make the frame last passed to _is_static the reference (it is sent after all)"""
+        self.static_reference = self.static_candidate
+        self.static_reference_at = time.monotonic()
+
+    def _send_heartbeat(self, captured_at=None):
+        """Tell viewers the stream is alive while its frames are skipped"""
+        now = time.monotonic()
+        if now - self.heartbeat_at < HEARTBEAT_SECONDS:
+            return
+        self.heartbeat_at = now
+        self._send_message({
+            'type': 'heartbeat',
+            'stream_id': self.stream_id,
+            'timestamp': datetime.now().isoformat(),
+            'captured_at': captured_at or time.time(),
+            # Seq of the last frame sent, which is still current
+            'seq': self.frame_seq,
+        })
+
+    def _raw_consumers(self):
+        """Consumers taking decoded frames instead of messages (mosaic tiles)"""
+        return [consumer for consumer in self.consumers.copy() if getattr(consumer, 'raw_frames', False)]
+
+    def _jpeg_consumers(self):
+        """Consumers taking the encoded JPEG bytes (HTTP MJPEG clients)"""
+        return [consumer for consumer in self.consumers.copy() if getattr(consumer, 'jpeg_frames', False)]
+
+    def _viewers(self):
+        """Consumers that get encoded frames"""
+        return [consumer for consumer in self.consumers.copy() if not getattr(consumer, 'raw_frames', False)]
+
+    def _encode_renditions(self, frame, encode_param):
+        """Base64 JPEGs of the smaller renditions current consumers asked for"""
+        wanted = {getattr(consumer, 'rendition', 'full') for consumer in self.consumers.copy()}
+        renditions = {}
+        for name in wanted:
+            width = RENDITIONS.get(name)
+            if not width or width >= frame.shape[1]:
+                continue
+            height = int(frame.shape[0] * width / frame.shape[1])
+            # INTER_AREA: downscaling by a large factor without aliasing
+            small = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+            _, buffer = cv2.imencode('.jpg', small, encode_param)
+            renditions[name] = base64.b64encode(buffer).decode('utf-8')
+        return renditions
+
+    def _send_fallback_frame(self, jpeg, frame=None):
+        """
+        Hand a demo or FFmpeg frame to every kind of consumer, like
+        _process_frame does: the JPEG bytes to MJPEG clients, the decoded frame
+        to mosaic tiles (decoded here if only the JPEG is at hand) and base64
+        to WebSocket viewers
+        """
+        captured_at = time.time()
+        raw_consumers = self._raw_consumers()
+        if raw_consumers:
+            if frame is None:
+                frame = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if frame is not None:
+                for consumer in raw_consumers:
+                    consumer.offer_frame(frame)
+        for consumer in self._jpeg_consumers():
+            consumer.offer_jpeg(jpeg, captured_at)
+        self.frame_seq += 1
+        self._send_frame(base64.b64encode(jpeg).decode('utf-8'), captured_at, self.frame_seq)
+
+    def _send_frame(self, frame_data, captured_at=None, seq=None, renditions=None):
+        """Send frame data to all consumers (each gets its rendition, if encoded)"""
         if not self.consumers:
             return
 
+        get_status_tracker().frame_sent(self.stream_id)
+
         message = {
             'type': 'frame',
             'stream_id': self.stream_id,
             'frame': frame_data,
-            'timestamp': datetime.now().isoformat()
+            'timestamp': datetime.now().isoformat(),
+            # Epoch seconds when the frame was read; used for end-to-end frame age
+            'captured_at': captured_at or time.time()
         }
+        if seq is not None:
+            message['seq'] = seq
+
+        variants = None
+        if renditions:
+            variants = {
+                name: {**message, 'frame': data, 'rendition': name}
+                for name, data in renditions.items()
+            }
 
         # Send to all consumers using proper async handling
-        self._send_to_consumers(message)
+        self._send_to_consumers(message, variants)
+
+    def _run_passthrough(self):
+        """Remux the camera's H.264 into fMP4 fragments for MSE viewers (no decoding)"""
+        attempts = 0
+        while self.is_running:
+            if attempts:
+                metrics.RECONNECTS.inc(self.stream_id)
+                # Back off between reconnects, waking up early on stop()
+                deadline = time.monotonic() + min(2 ** attempts, 30)
+                while self.is_running and time.monotonic() < deadline:
+                    time.sleep(0.2)
+                if not self.is_running:
+                    break
+            attempts += 1
+
+            try:
+                process = subprocess.Popen(
+                    passthrough_command(self.rtsp_url, self.profile['rtsp_transport']),
+                    stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=0
+                )
+            except FileNotFoundError:
+                self._stop_with_error("FFmpeg is required for the fmp4 output mode")
+                return
+            self.passthrough_process = process
+
+            try:
+                fragments = read_fragments(process.stdout)
+                init = next(fragments, None)
+                if init is None:
+                    logger.warning(f"Passthrough for {self.stream_id} produced no output")
+                    continue
+
+                codec = codec_string(init)
+                if codec is None:
+                    self._stop_with_error("Passthrough needs an H.264 camera stream")
+                    return
+                self.mse_init = {
+                    'type': 'mse_init',
+                    'stream_id': self.stream_id,
+                    'codec': codec,
+                    'mime': f'video/mp4; codecs="{codec}"',
+                    'init': init,
+                }
+                self._send_message(self.mse_init)
+                self._send_message({
+                    'type': 'stream_started',
+                    'stream_id': self.stream_id,
+                    'rtsp_url': self.rtsp_url,
+                    'message': f'H.264 passthrough started ({codec})'
+                })
+                attempts = 1
+
+                for fragment in fragments:
+                    if not self.is_running:
+                        break
+                    if self.is_idle():
+                        continue
+                    self._send_to_consumers({'type': 'media', 'data': fragment})
+                    self.last_frame_at = time.time()
+            finally:
+                process.kill()
+                process.wait()
+                self.passthrough_process = None
+
+    def _send_detections(self, detections, names, width, height):
+        """Send detections of the next frame as data for viewers to draw"""
+        if not self.consumers:
+            return
+
+        class_ids = detections.class_id.tolist()
+        self._send_to_consumers({
+            'type': 'detections',
+            'stream_id': self.stream_id,
+            'seq': self.frame_seq,
+            'classes': class_ids,
+            'confidences': np.round(detections.confidence.astype(np.float64), 3).tolist(),
+            'boxes': detections.normalized(width, height),
+            'labels': {class_id: names.get(class_id, str(class_id)) for class_id in set(class_ids)},
+        })
 
     def _send_message(self, message):
         """Send a message to all consumers"""
         self._send_to_consumers(message)
 
-    def _send_to_consumers(self, message):
-        """Send messages to all consumers - working approach"""
+    def _send_to_consumers(self, message, variants=None):
+        """
+        Send messages to all consumers - working approach. ``variants`` maps a
+        rendition name to the message consumers with that rendition get instead.
+        """
         message_type = message.get('type', 'message')
         failed_consumers = []
+        now = time.monotonic()
 
-        # Only log non-frame messages to avoid spam
-        if message_type != 'frame':
+        # Only log control messages to avoid spam
+        if message_type not in LATEST_ONLY_SLOTS and message_type != 'heartbeat':
             logger.info(f"Stream {self.stream_id}: {message_type} - {message.get('message', '')}")
 
         for consumer in self.consumers.copy():
             try:
-                # Use the consumer's send_json method directly
-                # This should work since we're calling from the same thread context
-                import json
-                import asyncio
-
-                # Convert message to JSON string and send via WebSocket
-                json_data = json.dumps(message)
+                # Frames (and their detections) go into a single latest-only slot
+                # per consumer: a slow viewer skips frames instead of queueing them up
+                slot = LATEST_ONLY_SLOTS.get(message_type)
+                if slot:
+                    # Paused viewers get control messages only
+                    if getattr(consumer, 'paused', False):
+                        continue
+                    # Raw frame and JPEG consumers got the frame before it was sent
+                    if getattr(consumer, 'raw_frames', False) or getattr(consumer, 'jpeg_frames', False):
+                        continue
+                    # Viewers that asked for a lower frame rate skip frames here,
+                    # before anything is queued for them
+                    interval = getattr(consumer, 'min_frame_interval', 0)
+                    if interval and message_type in THROTTLED_TYPES:
+                        next_frame_at = getattr(consumer, 'next_frame_at', 0.0)
+                        if now < next_frame_at:
+                            continue
+                        if message_type == 'frame':
+                            # Keep the average rate without bursting after a stall
+                            consumer.next_frame_at = max(next_frame_at + interval, now)
+                    if message_type in DROP_COUNTED_SLOTS and getattr(consumer, slot, None) is not None:
+                        metrics.FRAMES_DROPPED.inc(self.stream_id, 'viewer')
+                    payload = message
+                    if variants:
+                        payload = variants.get(getattr(consumer, 'rendition', 'full'), message)
+                    setattr(consumer, slot, payload)
+                    continue
 
-                # Simple approach: store message for consumer to pick up
+                # Other messages are queued for the consumer to pick up
                 if not hasattr(consumer, 'pending_messages'):
                     consumer.pending_messages = []
                 consumer.pending_messages.append(message)
 
             except Exception as e:
-                if message_type != 'frame':  # Only log errors for non-frame messages
+                if message_type not in LATEST_ONLY_SLOTS:  # Only log errors for control messages
                     logger.error(f"Failed to send {message_type} to consumer: {e}")
                 failed_consumers.append(consumer)
 
@@ -500,6 +1028,15 @@ class StreamProcessor:
         for consumer in failed_consumers:
             self.consumers.discard(consumer)
 
+    def _stop_with_error(self, error_message):
+        """
+        Stop a stream that cannot work in its configuration, telling viewers
+        why, so it no longer counts as running (capacity, health)
+        """
+        logger.error(f"Stream {self.stream_id}: {error_message}")
+        self._send_error(error_message)
+        self.stop()
+
     def _send_error(self, error_message):
         """Send error message to all consumers"""
         message = {
@@ -513,17 +1050,101 @@ class StreamProcessor:
 # Global dictionary to manage stream processors
 stream_processors = {}
 
-def get_stream_processor(stream_id, rtsp_url):
+def get_stream_processor(stream_id, rtsp_url, priority=1, profile=None):
     """Get or create a stream processor"""
-    if stream_id not in stream_processors:
-        stream_processors[stream_id] = StreamProcessor(rtsp_url, stream_id)
-    return stream_processors[stream_id]
+    processor = stream_processors.get(stream_id)
+    if processor is None:
+        processor_class = StreamProcessor
+        if rtsp_url == MOSAIC_URL:
+            from .mosaic import MosaicProcessor
+            processor_class = MosaicProcessor
+        # setdefault keeps this safe when several threads create processors
+        processor = stream_processors.setdefault(
+            stream_id, processor_class(rtsp_url, stream_id, priority, profile)
+        )
+    return processor
+
+def reload_stream_profile(stream):
+    """
+    Push an updated Stream row's priority and profile to its processor. A
+    stream that now records is started; one nobody watches that stopped
+    recording is stopped.
+    """
+    processor = stream_processors.get(str(stream.id))
+    if processor:
+        processor.set_priority(stream.priority)
+        processor.update_profile(stream.processing_profile())
+        if processor.is_running and not processor.consumers and not processor.records():
+            processor.stop()
+    start_recording_streams([stream])
+
+def start_recording_streams(streams=None):
+    """
+    Start the processors of streams that record (``recording_enabled`` or
+    ``record_detections``; default: all of them), which run whether or not
+    anyone watches. Called at server start and when a profile changes.
+    """
+    from .models import Stream
+
+    if streams is None:
+        try:
+            streams = list(Stream.objects.filter(Q(recording_enabled=True) | Q(record_detections=True)))
+        except DatabaseError as e:
+            logger.error(f"Could not load recording streams: {e}")
+            return []
+    pending = []
+    for stream in streams:
+        processor = stream_processors.get(str(stream.id))
+        if (stream.recording_enabled or stream.record_detections) and not (processor and processor.is_running):
+            pending.append(stream)
+    results = start_stream_processors(pending)
+    for stream_id, admission in results:
+        if admission.decision == 'rejected':
+            logger.warning(f"Recording stream {stream_id} not started: {admission.message}")
+        elif admission.allowed:
+            logger.info(f"Started recording stream {stream_id}")
+    return results
+
+def start_stream_processors(streams, max_workers=8):
+    """
+    Create and start processors for several Stream rows concurrently, as far
+    as the node has capacity. Returns ``(stream_id, Admission)`` pairs; streams
+    that already run count as admitted.
+    """
+    from .capacity import get_capacity, Admission
+
+    def _start(stream):
+        processor = get_stream_processor(
+            str(stream.id), stream.rtsp_url, stream.priority, stream.processing_profile()
+        )
+        if processor.is_running:
+            return str(stream.id), Admission('admitted', 0.0)
+        # No viewers yet: queued streams start even if nobody is watching
+        admission = get_capacity().admit(processor, wait_for_viewers=False)
+        if admission.allowed:
+            processor.start()
+        return str(stream.id), admission
+
+    streams = list(streams)
+    if not streams:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(streams))) as pool:
+        return list(pool.map(_start, streams))
 
 def stop_stream_processor(stream_id):
     """Stop and remove a stream processor"""
     if stream_id in stream_processors:
         stream_processors[stream_id].stop()
         del stream_processors[stream_id]
+        metrics.registry.remove_stream(stream_id)
+
+
+def _close_recorder(recorder):
+    """
+    Close a recorder on its own thread: close() waits for the writer to flush,
+    and stop() also runs on the event loop (the last viewer disconnecting)
+    """
+    threading.Thread(target=recorder.close, name=f'recorder-close-{recorder.stream_id}').start()
 
 
 def set_stream_pause(stream_id, paused):
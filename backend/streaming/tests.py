@@ -0,0 +1,146 @@
+import uuid
+
+from django.core.exceptions import ValidationError
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework import serializers
+
+from .models import (
+    Stream, validate_detection_model, validate_mosaic_layout, validate_roi_regions,
+)
+from .serializers import BulkCreateStreamListSerializer, CreateStreamSerializer, validate_stream_kind
+
+
+class RoiRegionsValidatorTests(SimpleTestCase):
+    def test_accepts_rectangles_and_polygons(self):
+        for value in (
+            [],
+            [[[0.6, 0.0], [1.0, 0.5]]],
+            [[[0, 0], [1, 0], [0.5, 1]]],
+            [[[0.1, 0.1], [0.4, 0.1], [0.4, 0.4], [0.1, 0.4]], [[0.5, 0.5], [0.9, 0.9]]],
+        ):
+            validate_roi_regions(value)
+
+    def test_rejects_malformed_regions(self):
+        for value in (
+            {},
+            [[[0.1, 0.1]]],
+            [[[0.1, 0.1], [0.5]]],
+            [[[0.1, 0.1], [0.5, 1.5]]],
+            [[[0.1, 0.1], [0.5, '0.5']]],
+            [[[True, 0.1], [0.5, 0.5]]],
+            [[[0.1, 0.1], [0.5, 0.5]]] * 17,
+        ):
+            with self.assertRaises(ValidationError, msg=value):
+                validate_roi_regions(value)
+
+    def test_rejects_regions_without_area(self):
+        for value in (
+            [[[0.1, 0.1], [0.1, 0.5]]],
+            [[[0.1, 0.1], [0.105, 0.5]]],
+            [[[0.1, 0.1], [0.5, 0.5], [0.9, 0.9]]],
+        ):
+            with self.assertRaises(ValidationError, msg=value):
+                validate_roi_regions(value)
+
+
+class MosaicLayoutValidatorTests(SimpleTestCase):
+    tile = str(uuid.uuid4())
+
+    def test_accepts_layouts(self):
+        for value in (
+            {},
+            {'tiles': [self.tile]},
+            {'tiles': [self.tile, {'stream': self.tile, 'fps': 2}], 'columns': 2, 'tile_aspect': 1.5},
+        ):
+            validate_mosaic_layout(value)
+
+    def test_rejects_bad_layouts(self):
+        for value in (
+            [],
+            {'rows': 2},
+            {'tiles': 'x'},
+            {'tiles': [self.tile] * 65},
+            {'tiles': ['not-a-uuid']},
+            {'tiles': [{'stream': self.tile, 'fps': 0}]},
+            {'tiles': [{'stream': self.tile, 'speed': 1}]},
+            {'columns': 0},
+            {'columns': 1.5},
+            {'tile_aspect': 10},
+        ):
+            with self.assertRaises(ValidationError, msg=value):
+                validate_mosaic_layout(value)
+
+    def test_rejects_booleans(self):
+        for value in (
+            {'tiles': [{'stream': self.tile, 'fps': True}]},
+            {'columns': True},
+            {'tile_aspect': True},
+        ):
+            with self.assertRaises(ValidationError, msg=value):
+                validate_mosaic_layout(value)
+
+
+@override_settings(DETECTION_MODELS=['yolo11n.pt', 'onnxruntime:yolo11n.onnx'], DETECTOR_WARMUP_MODELS=[])
+class DetectionModelValidatorTests(SimpleTestCase):
+    def test_accepts_listed_models(self):
+        validate_detection_model('yolo11n.pt')
+        validate_detection_model('yolo11n.onnx')
+
+    def test_rejects_urls_paths_and_unlisted_models(self):
+        for value in ('https://example.com/x.pt', '/etc/passwd', '../yolo11n.pt',
+                      'models/../../x.pt', 'yolo11s.pt'):
+            with self.assertRaises(ValidationError, msg=value):
+                validate_detection_model(value)
+
+
+class StreamKindValidatorTests(TestCase):
+    def setUp(self):
+        self.camera = Stream.objects.create(rtsp_url='rtsp://127.0.0.1/cam')
+
+    def test_mosaic_gets_mosaic_url(self):
+        attrs = validate_stream_kind({'kind': 'mosaic', 'mosaic_layout': {'tiles': [str(self.camera.id)]}})
+        self.assertEqual(attrs['rtsp_url'], 'mosaic://')
+
+    def test_mosaic_needs_existing_camera_tiles(self):
+        mosaic = Stream.objects.create(kind='mosaic', rtsp_url='mosaic://',
+                                       mosaic_layout={'tiles': [str(self.camera.id)]})
+        for layout in ({}, {'tiles': [str(uuid.uuid4())]}, {'tiles': [str(mosaic.id)]}):
+            with self.assertRaises(serializers.ValidationError, msg=layout):
+                validate_stream_kind({'kind': 'mosaic', 'mosaic_layout': layout})
+
+    def test_camera_needs_url_and_no_tiles(self):
+        validate_stream_kind({'rtsp_url': 'rtsp://127.0.0.1/other', 'mosaic_layout': {}})
+        for attrs in (
+            {},
+            {'rtsp_url': 'mosaic://'},
+            {'rtsp_url': 'rtsp://127.0.0.1/other', 'mosaic_layout': {'tiles': [str(self.camera.id)]}},
+        ):
+            with self.assertRaises(serializers.ValidationError, msg=attrs):
+                validate_stream_kind(attrs)
+
+    def test_partial_update_checks_stored_values(self):
+        with self.assertRaises(serializers.ValidationError):
+            validate_stream_kind({'mosaic_layout': {'tiles': [str(self.camera.id)]}}, self.camera)
+
+
+class BulkCreateTests(TestCase):
+    def test_creates_valid_streams(self):
+        serializer = CreateStreamSerializer(
+            data=[{'rtsp_url': f'rtsp://10.0.0.{i}/stream1'} for i in range(3)], many=True
+        )
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+        self.assertEqual(Stream.objects.count(), 3)
+
+    def test_enforces_max_streams(self):
+        data = [{'rtsp_url': 'rtsp://10.0.0.1/stream1'}] * (BulkCreateStreamListSerializer.MAX_STREAMS + 1)
+        serializer = CreateStreamSerializer(data=data, many=True)
+        self.assertFalse(serializer.is_valid())
+
+    def test_reports_errors_per_item(self):
+        serializer = CreateStreamSerializer(
+            data=[{'rtsp_url': 'rtsp://10.0.0.1/stream1'}, {'rtsp_url': 'ftp://x'}], many=True
+        )
+        self.assertFalse(serializer.is_valid())
+        self.assertEqual(serializer.errors[0], {})
+        self.assertIn('rtsp_url', serializer.errors[1])
@@ -1,10 +1,14 @@
-from django.urls import path, include
+from django.urls import path, re_path, include
 from rest_framework.routers import DefaultRouter
-from .views import StreamViewSet
+from .views import StreamViewSet, playback_stream, playback_frame, live_mjpeg
 
 router = DefaultRouter()
 router.register(r'streams', StreamViewSet)
 
 urlpatterns = [
+    path('streams/<uuid:pk>/playback/', playback_stream, name='stream-playback'),
+    path('streams/<uuid:pk>/playback/frame/', playback_frame, name='stream-playback-frame'),
+    # Without the trailing slash too: plain HTTP clients do not follow redirects
+    re_path(r'^streams/(?P<pk>[0-9a-fA-F-]{36})/mjpeg/?$', live_mjpeg, name='stream-mjpeg'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
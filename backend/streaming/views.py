@@ -1,67 +1,556 @@
 from rest_framework import viewsets, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from django.http import JsonResponse
-from .models import Stream
-from .serializers import StreamSerializer, CreateStreamSerializer
+from rest_framework.permissions import IsAdminUser
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Q
+from django.db.models.functions import TruncMinute
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from datetime import datetime, timedelta, timezone as dt_timezone
+from .models import Stream, DetectionEvent
+from .serializers import StreamSerializer, CreateStreamSerializer, DetectionEventSerializer
+from .status_tracker import get_status_tracker
+from .stream_processor import (
+    start_stream_processors, stop_stream_processor, reload_stream_profile,
+    start_recording_streams, stream_processors, get_stream_processor
+)
+from . import profiling, metrics
+from .playback import Recording, replay, MJPEG_BOUNDARY
+from .mjpeg import MjpegClient, MIN_CLIENT_FPS, MAX_CLIENT_FPS
+from .capacity import get_capacity
+from .prober import get_prober, cached_probes
+from asgiref.sync import sync_to_async
+from .pagination import StreamCursorPagination
+from .list_cache import (
+    stream_list_etag, etag_matches, get_cached_listing, set_cached_listing,
+    invalidate_stream_list
+)
+import asyncio
+import base64
 import logging
+import math
 
 logger = logging.getLogger(__name__)
 
+# Filters accepted by the bulk start/stop endpoints
+BULK_FILTER_FIELDS = {
+    'is_active', 'priority', 'priority__gte', 'priority__lte',
+    'title', 'title__icontains', 'rtsp_url__startswith',
+}
+
+# Playback speeds accepted by the playback endpoint
+PLAYBACK_MIN_SPEED = 0.1
+PLAYBACK_MAX_SPEED = 64.0
+
+# Detection event queries
+DETECTION_DEFAULT_WINDOW = timedelta(hours=1)
+DETECTION_MAX_LIMIT = 10000
+DETECTION_COUNTS_MAX_WINDOW = timedelta(days=7)
+
+
+def parse_time_param(value):
+    """Parse an ISO 8601 datetime or epoch seconds query parameter"""
+    try:
+        return datetime.fromtimestamp(float(value), dt_timezone.utc)
+    except (ValueError, OverflowError, OSError):
+        # Not a number, or out of the range datetime supports
+        pass
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(f'Invalid time "{value}": use ISO 8601 or epoch seconds')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, dt_timezone.utc)
+    return parsed
+
+
+def encode_detection_cursor(event):
+    """Opaque cursor pointing after ``event`` in (timestamp, id) order"""
+    raw = f"{event.timestamp.isoformat()}|{event.id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_detection_cursor(cursor):
+    """(timestamp, id) of a detection cursor"""
+    try:
+        timestamp, _, event_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').partition('|')
+        parsed = datetime.fromisoformat(timestamp)
+        return parsed, int(event_id)
+    except (ValueError, UnicodeError):
+        raise ValueError('Invalid "cursor"')
+
+
 class StreamViewSet(viewsets.ModelViewSet):
     queryset = Stream.objects.all()
     serializer_class = StreamSerializer
+    pagination_class = StreamCursorPagination
     
     def get_serializer_class(self):
         if self.action == 'create':
             return CreateStreamSerializer
         return StreamSerializer
+
+    def list(self, request, *args, **kwargs):
+        """Paginated stream listing with ETag revalidation and a response cache"""
+        queryset = self.filter_queryset(self.get_queryset())
+        etag = stream_list_etag(queryset, request.build_absolute_uri())
+
+        if etag_matches(request.headers.get('If-None-Match'), etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            response['ETag'] = etag
+            return response
+
+        data = get_cached_listing(etag)
+        if data is None:
+            page = self.paginate_queryset(queryset)
+            serializer = self.get_serializer(page, many=True)
+            serializer.context['probe_results'] = cached_probes({stream.rtsp_url for stream in page})
+            data = self.get_paginated_response(serializer.data).data
+            set_cached_listing(etag, data)
+
+        response = Response(data)
+        response['ETag'] = etag
+        return response
     
     def create(self, request, *args, **kwargs):
-        logger.info(f"Received POST request data: {request.data}")
-        logger.info(f"Request content type: {request.content_type}")
-        
         serializer = self.get_serializer(data=request.data)
         
         if not serializer.is_valid():
-            logger.error(f"Serializer validation errors: {serializer.errors}")
+            logger.warning(f"Stream validation failed: {serializer.errors}")
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
-        # Extract title from URL if not provided
-        if not serializer.validated_data.get('title'):
-            rtsp_url = serializer.validated_data['rtsp_url']
-            # Simple title extraction from URL
-            title = f"Stream {rtsp_url.split('/')[-1] or 'Camera'}"
-            serializer.validated_data['title'] = title
-        
         stream = serializer.save()
+        start_recording_streams([stream])
         response_serializer = StreamSerializer(stream)
         
-        logger.info(f"Created new stream: {stream.id} - {stream.rtsp_url}")
+        logger.info(f"Created new stream: {stream.id}")
         
         return Response(response_serializer.data, status=status.HTTP_201_CREATED)
+
+    def perform_update(self, serializer):
+        stream = serializer.save()
+        # Apply profile changes to a running processor without reconnecting
+        reload_stream_profile(stream)
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """Register many streams in one request with a single bulk_create"""
+        items = request.data.get('streams') if isinstance(request.data, dict) else request.data
+        if not isinstance(items, list) or not items:
+            return Response({'error': 'Expected a non-empty list of streams'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = CreateStreamSerializer(data=items, many=True)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        streams = serializer.save()
+        # bulk_create bypasses post_save, so invalidate listings explicitly
+        invalidate_stream_list()
+        logger.info(f"Bulk created {len(streams)} streams")
+        start_recording_streams(streams)
+
+        return Response(StreamSerializer(streams, many=True).data,
+                        status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['post'], url_path='bulk-start')
+    def bulk_start(self, request):
+        """Mark a set of streams active and spin up their processors concurrently"""
+        streams, error = self._select_streams(request)
+        if error:
+            return error
+
+        streams = list(streams)
+        results = start_stream_processors(streams)
+        # Streams rejected for lack of capacity stay inactive
+        accepted = [stream_id for stream_id, admission in results if admission.decision != 'rejected']
+        Stream.objects.filter(id__in=accepted).update(is_active=True)
+        invalidate_stream_list()
+        started = [stream_id for stream_id, admission in results if admission.allowed]
+
+        return Response({
+            'status': 'started',
+            'count': len(started),
+            'stream_ids': started,
+            'degraded': [stream_id for stream_id, admission in results if admission.decision == 'degraded'],
+            'queued': [stream_id for stream_id, admission in results if admission.decision == 'queued'],
+            'rejected': {
+                stream_id: admission.message for stream_id, admission in results
+                if admission.decision == 'rejected'
+            },
+        })
+
+    @action(detail=False, methods=['post'], url_path='bulk-stop')
+    def bulk_stop(self, request):
+        """Stop the processors of a set of streams and reset their status"""
+        streams, error = self._select_streams(request)
+        if error:
+            return error
+
+        stream_ids = list(streams.values_list('id', flat=True))
+        for stream_id in stream_ids:
+            stop_stream_processor(str(stream_id))
+        Stream.objects.filter(id__in=stream_ids).update(is_active=False, viewer_count=0)
+        get_status_tracker().reset(stream_ids)
+        invalidate_stream_list()
+
+        return Response({
+            'status': 'stopped',
+            'count': len(stream_ids),
+            'stream_ids': [str(stream_id) for stream_id in stream_ids],
+        })
+
+    @action(detail=True, methods=['get', 'post'], permission_classes=[IsAdminUser])
+    def profiling(self, request, pk=None):
+        """
+        Admin-only sampling profiler for a running stream.
+
+        POST {"enabled": true, "interval_ms": 5, "duration": 60} starts sampling
+        (it stops by itself after ``duration`` seconds), {"enabled": false} stops
+        it. GET returns a summary table, or folded stacks for flamegraph tools
+        with ?output=collapsed.
+        """
+        stream_id = str(self.get_object().id)
+
+        if request.method == 'GET':
+            sampler = profiling.get_profiler(stream_id)
+            if not sampler:
+                return Response({'error': 'Stream has not been profiled'},
+                                status=status.HTTP_404_NOT_FOUND)
+            if request.query_params.get('output') == 'collapsed':
+                return HttpResponse(sampler.collapsed(), content_type='text/plain; charset=utf-8')
+            return Response({**sampler.summary(), 'stages': metrics.stream_stats(stream_id)})
+
+        if not request.data.get('enabled', True):
+            sampler = profiling.stop_profiling(stream_id)
+            return Response(sampler.summary() if sampler else {'running': False})
+
+        processor = stream_processors.get(stream_id)
+        if not processor or not processor.is_running:
+            return Response({'error': 'Stream is not running'}, status=status.HTTP_409_CONFLICT)
+
+        try:
+            interval = float(request.data.get('interval_ms', 5)) / 1000
+            duration = float(request.data.get('duration', 60))
+        except (TypeError, ValueError):
+            interval = duration = math.nan
+        # nan passes the sampler's clamping, and huge values overflow its waits
+        if not all(math.isfinite(value) and value > 0 for value in (interval, duration)):
+            return Response({'error': '"interval_ms" and "duration" must be positive numbers'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            sampler = profiling.start_profiling(processor, interval, duration)
+        except RuntimeError as e:
+            return Response({'error': str(e)}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+
+        return Response({
+            'running': True,
+            'interval_ms': sampler.interval * 1000,
+            'duration': sampler.max_seconds
+        })
+
+    @action(detail=True, methods=['get'])
+    def detections(self, request, pk=None):
+        """
+        Recorded detections of a stream in a time range, oldest first.
+
+        Query parameters: ``start``/``end`` (ISO 8601 or epoch seconds, default
+        the last hour), ``class`` (class id or label), ``min_confidence``,
+        ``limit`` (default 1000) and ``cursor`` (``next_cursor`` of the previous
+        page; one frame stores several rows with the same timestamp, so pages
+        are keyed on timestamp and id).
+        """
+        try:
+            events, start, end = self._detection_events(request)
+            try:
+                limit = int(request.query_params.get('limit', 1000))
+            except ValueError:
+                raise ValueError('"limit" must be an integer')
+            limit = max(1, min(limit, DETECTION_MAX_LIMIT))
+            cursor = request.query_params.get('cursor')
+            if cursor:
+                after, after_id = decode_detection_cursor(cursor)
+                events = events.filter(Q(timestamp__gt=after) | Q(timestamp=after, id__gt=after_id))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        rows = list(events.order_by('timestamp', 'id')[:limit + 1])
+        truncated = len(rows) > limit
+        rows = rows[:limit]
+        return Response({
+            'start': start,
+            'end': end,
+            'count': len(rows),
+            'truncated': truncated,
+            # More rows exist: repeat the query with this cursor
+            'next_cursor': encode_detection_cursor(rows[-1]) if truncated else None,
+            'results': DetectionEventSerializer(rows, many=True).data,
+        })
+
+    @action(detail=True, methods=['get'], url_path='detection-counts')
+    def detection_counts(self, request, pk=None):
+        """Per-minute detection counts by class, for the same filters as ``detections``"""
+        try:
+            events, start, end = self._detection_events(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if end - start > DETECTION_COUNTS_MAX_WINDOW:
+            return Response({'error': f'Range is limited to {DETECTION_COUNTS_MAX_WINDOW.days} days'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        rows = (events.annotate(minute=TruncMinute('timestamp'))
+                .values('minute', 'label')
+                .annotate(count=Count('id'))
+                .order_by('minute', 'label'))
+        buckets = {}
+        for row in rows:
+            buckets.setdefault(row['minute'], {})[row['label']] = row['count']
+        return Response({
+            'start': start,
+            'end': end,
+            'minutes': [{'minute': minute, 'counts': counts} for minute, counts in buckets.items()],
+        })
+
+    def _detection_events(self, request):
+        """Filtered DetectionEvent queryset for the detection endpoints"""
+        stream = self.get_object()
+        params = request.query_params
+        end = parse_time_param(params['end']) if params.get('end') else timezone.now()
+        start = parse_time_param(params['start']) if params.get('start') else end - DETECTION_DEFAULT_WINDOW
+        if start > end:
+            raise ValueError('"start" must not be after "end"')
+
+        events = DetectionEvent.objects.filter(stream=stream, timestamp__gte=start, timestamp__lt=end)
+        detection_class = params.get('class')
+        if detection_class:
+            if detection_class.isdigit():
+                events = events.filter(class_id=int(detection_class))
+            else:
+                events = events.filter(label=detection_class)
+        if params.get('min_confidence'):
+            try:
+                min_confidence = float(params['min_confidence'])
+            except ValueError:
+                min_confidence = math.nan
+            if not 0 <= min_confidence <= 1:
+                raise ValueError('"min_confidence" must be a number between 0 and 1')
+            events = events.filter(confidence__gte=min_confidence)
+        return events, start, end
+
+    @action(detail=True, methods=['get'])
+    def recordings(self, request, pk=None):
+        """Recorded segments of a stream with the time range each one covers"""
+        stream = self.get_object()
+        recording = Recording(str(stream.id))
+        segments = []
+        try:
+            for i, (start_us, _, _) in enumerate(recording.segments):
+                reader = recording.reader(i)
+                if not len(reader):
+                    continue
+                segments.append({
+                    'start': reader.frame(0)[0] / 1_000_000,
+                    'end': reader.frame(len(reader) - 1)[0] / 1_000_000,
+                    'frames': len(reader),
+                })
+        finally:
+            recording.close()
+        return Response({'stream_id': str(stream.id), 'segments': segments})
+
+    def _select_streams(self, request):
+        """Resolve the ``ids`` list or ``filter`` object of a bulk request"""
+        if not isinstance(request.data, dict):
+            return None, Response({'error': 'Expected a JSON object with "ids" or "filter"'},
+                                  status=status.HTTP_400_BAD_REQUEST)
+        ids = request.data.get('ids')
+        filters = request.data.get('filter')
+
+        if ids is not None:
+            if not isinstance(ids, list):
+                return None, Response({'error': '"ids" must be a list'},
+                                      status=status.HTTP_400_BAD_REQUEST)
+            try:
+                return Stream.objects.filter(id__in=ids), None
+            except ValidationError:
+                return None, Response({'error': '"ids" must contain stream UUIDs'},
+                                      status=status.HTTP_400_BAD_REQUEST)
+
+        if isinstance(filters, dict) and filters:
+            unknown = set(filters) - BULK_FILTER_FIELDS
+            if unknown:
+                return None, Response(
+                    {'error': f"Unsupported filter fields: {', '.join(sorted(unknown))}"},
+                    status=status.HTTP_400_BAD_REQUEST)
+            try:
+                return Stream.objects.filter(**filters), None
+            except (ValueError, TypeError, ValidationError) as e:
+                # Values are converted to the field types when the filter is built
+                message = '; '.join(e.messages) if isinstance(e, ValidationError) else str(e)
+                return None, Response({'error': f"Invalid filter value: {message}"},
+                                      status=status.HTTP_400_BAD_REQUEST)
+
+        return None, Response({'error': 'Provide "ids" or a non-empty "filter"'},
+                              status=status.HTTP_400_BAD_REQUEST)
     
+    @action(detail=True, methods=['post'])
+    def probe(self, request, pk=None):
+        """Probe the camera now (instead of waiting for the background prober)"""
+        stream = self.get_object()
+        if stream.kind != 'camera':
+            return Response({'error': 'Only camera streams can be probed'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        result = get_prober().probe_streams([stream], max_age=0)[str(stream.id)]
+        return Response({'stream_id': str(stream.id), 'health': result})
+
     @action(detail=True, methods=['post'])
     def start(self, request, pk=None):
+        """Start the stream's processor through admission control, like bulk-start"""
         stream = self.get_object()
+        [(stream_id, admission)] = start_stream_processors([stream])
+        if admission.decision == 'rejected':
+            return Response({'error': admission.message, 'code': 'capacity'},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
         stream.is_active = True
         stream.save()
         
         return Response({
             'status': 'started',
-            'stream_id': str(stream.id),
+            'stream_id': stream_id,
+            'admission': admission.as_dict(),
             'message': f'Stream {stream.title} started'
         })
     
     @action(detail=True, methods=['post'])
     def stop(self, request, pk=None):
         stream = self.get_object()
+        stop_stream_processor(str(stream.id))
         stream.is_active = False
         stream.viewer_count = 0
         stream.save()
+        get_status_tracker().reset([stream.id])
         
         return Response({
             'status': 'stopped',
             'stream_id': str(stream.id),
             'message': f'Stream {stream.title} stopped'
-        })
\ No newline at end of file
+        })
+
+
+def _get_stream(pk):
+    try:
+        return Stream.objects.get(pk=pk)
+    except (Stream.DoesNotExist, ValidationError):
+        return None
+
+
+async def live_mjpeg(request, pk):
+    """
+    Live stream as multipart MJPEG for clients without WebSocket support
+    (``<img>`` tags, NVRs, curl). Clients share the stream's processor and
+    the JPEGs it already encodes; ``fps`` caps the rate for one client.
+    """
+    stream = await sync_to_async(_get_stream)(pk)
+    if stream is None:
+        return JsonResponse({'error': 'Stream not found'}, status=404)
+    fps = None
+    if request.GET.get('fps'):
+        try:
+            fps = float(request.GET['fps'])
+        except ValueError:
+            fps = -1
+        if not MIN_CLIENT_FPS <= fps <= MAX_CLIENT_FPS:
+            return JsonResponse(
+                {'error': f'"fps" must be between {MIN_CLIENT_FPS} and {MAX_CLIENT_FPS}'}, status=400
+            )
+
+    stream_id = str(stream.id)
+    processor = get_stream_processor(stream_id, stream.rtsp_url, stream.priority,
+                                     stream.processing_profile())
+    if processor.profile['output_mode'] == 'fmp4':
+        return JsonResponse({'error': 'Stream uses the fmp4 output mode; no JPEG frames'}, status=409)
+
+    client = MjpegClient(stream_id, asyncio.get_running_loop(), fps)
+    processor.add_consumer(client)
+    if not processor.is_running:
+        admission = await sync_to_async(get_capacity().admit)(processor)
+        if admission.allowed:
+            processor.start()
+        elif admission.decision == 'rejected':
+            processor.remove_consumer(client)
+            response = JsonResponse({'error': admission.message, 'code': 'capacity'}, status=503)
+            response['Retry-After'] = '30'
+            return response
+
+    response = StreamingHttpResponse(
+        client.parts(processor),
+        content_type=f'multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY}'
+    )
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+def _playback_stream_id(pk):
+    """Stream id for the playback views, or None if there is no such stream"""
+    return str(pk) if Stream.objects.filter(pk=pk).exists() else None
+
+
+async def playback_stream(request, pk):
+    """
+    Replay recorded frames as a multipart MJPEG stream.
+
+    ``start`` (required) and ``end`` accept ISO 8601 or epoch seconds;
+    ``speed`` (0.1-64) replays faster or slower. Seeking is a binary search
+    over segment start times and the segment's memory-mapped index.
+    """
+    stream_id = await sync_to_async(_playback_stream_id)(pk)
+    if stream_id is None:
+        return JsonResponse({'error': 'Stream not found'}, status=404)
+    try:
+        start = parse_time_param(request.GET['start']).timestamp()
+        end = parse_time_param(request.GET['end']).timestamp() if request.GET.get('end') else None
+        speed = float(request.GET.get('speed', 1.0))
+    except KeyError:
+        return JsonResponse({'error': '"start" is required'}, status=400)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    if not PLAYBACK_MIN_SPEED <= speed <= PLAYBACK_MAX_SPEED:
+        return JsonResponse(
+            {'error': f'"speed" must be between {PLAYBACK_MIN_SPEED} and {PLAYBACK_MAX_SPEED}'},
+            status=400
+        )
+
+    response = StreamingHttpResponse(
+        replay(stream_id, start, end, speed),
+        content_type=f'multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY}'
+    )
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+async def playback_frame(request, pk):
+    """Single recorded JPEG closest to (at or before) ``at``"""
+    stream_id = await sync_to_async(_playback_stream_id)(pk)
+    if stream_id is None:
+        return JsonResponse({'error': 'Stream not found'}, status=404)
+    try:
+        at = parse_time_param(request.GET['at']).timestamp()
+    except KeyError:
+        return JsonResponse({'error': '"at" is required'}, status=400)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    def read_frame():
+        recording = Recording(stream_id)
+        try:
+            return recording.frame_at(int(at * 1_000_000))
+        finally:
+            recording.close()
+
+    found = await sync_to_async(read_frame, thread_sensitive=False)()
+    if found is None:
+        return JsonResponse({'error': 'No recording for this stream'}, status=404)
+    timestamp_us, jpeg = found
+    response = HttpResponse(jpeg, content_type='image/jpeg')
+    response['X-Timestamp'] = f'{timestamp_us / 1_000_000:.6f}'
+    return response
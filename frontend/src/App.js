@@ -32,11 +32,19 @@ function App() {
 
   const loadStreams = async () => {
     try {
-      const response = await fetch(`${config.API_BASE_URL}/api/streams/`);
-      if (response.ok) {
+      // The listing is cursor-paginated; follow `next` until all pages are loaded
+      let url = `${config.API_BASE_URL}/api/streams/?page_size=200`;
+      const allStreams = [];
+      while (url) {
+        const response = await fetch(url);
+        if (!response.ok) {
+          break;
+        }
         const data = await response.json();
-        setStreams(data.results || data);
+        allStreams.push(...(data.results || data));
+        url = data.next || null;
       }
+      setStreams(allStreams);
     } catch (error) {
       // Handle error silently - streams will remain empty
     }
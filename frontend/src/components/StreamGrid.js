@@ -7,6 +7,16 @@ import { Row, Col, Button } from 'react-bootstrap';
 import { FaVideo, FaTimes } from 'react-icons/fa';
 import StreamViewer from './StreamViewer';
 
+/**
+ * Smaller frames and a lower frame rate as the grid grows; all tiles share one WebSocket
+ */
+const tileRendition = (count) => {
+  if (count === 1) return 'full';
+  return count <= 4 ? 'medium' : 'thumbnail';
+};
+
+const tileMaxFps = (count) => (count > 9 ? 10 : null);
+
 const StreamGrid = ({ streams, onRemoveStream, onClearAll }) => {
   if (streams.length === 0) {
     return (
@@ -81,6 +91,8 @@ const StreamGrid = ({ streams, onRemoveStream, onClearAll }) => {
               stream={stream} 
               onRemove={onRemoveStream}
               isFullscreen={streams.length === 1}
+              rendition={tileRendition(streams.length)}
+              maxFps={tileMaxFps(streams.length)}
             />
           </Col>
         ))}
@@ -1,6 +1,6 @@
 /**
  * Individual RTSP stream viewer component with Bootstrap
- * Handles WebSocket connection, video display, and stream controls
+ * Subscribes to its stream over the shared multiplexed WebSocket, handles video display and stream controls
  */
 import React, { useState, useEffect, useRef } from 'react';
 import { Button, Badge, Alert } from 'react-bootstrap';
@@ -10,76 +10,184 @@ import {
   FaStop, 
   FaTrash,
   FaVideo,
-  FaExclamationTriangle
+  FaExclamationTriangle,
+  FaEye,
+  FaEyeSlash
 } from 'react-icons/fa';
-import config from '../config';
+import { createMsePlayer, isMseSupported } from '../mse';
+import { getMultiplexClient } from '../multiplex';
 
-const StreamViewer = ({ stream, onRemove, isFullscreen = false }) => {
-  const [ws, setWs] = useState(null);
+/**
+ * Draw normalized [x1, y1, x2, y2] boxes over an image or video shown with object-fit: cover
+ */
+const drawDetections = (canvas, media, detections) => {
+  const width = canvas.clientWidth;
+  const height = canvas.clientHeight;
+  if (canvas.width !== width || canvas.height !== height) {
+    canvas.width = width;
+    canvas.height = height;
+  }
+  const ctx = canvas.getContext('2d');
+  ctx.clearRect(0, 0, width, height);
+  const mediaWidth = media ? media.naturalWidth || media.videoWidth : 0;
+  const mediaHeight = media ? media.naturalHeight || media.videoHeight : 0;
+  if (!detections || !mediaWidth) {
+    return;
+  }
+
+  // Same mapping the browser uses for object-fit: cover
+  const scale = Math.max(width / mediaWidth, height / mediaHeight);
+  const offsetX = (width - mediaWidth * scale) / 2;
+  const offsetY = (height - mediaHeight * scale) / 2;
+  const frameWidth = mediaWidth * scale;
+  const frameHeight = mediaHeight * scale;
+
+  ctx.lineWidth = 2;
+  ctx.font = '12px sans-serif';
+  ctx.textBaseline = 'bottom';
+  detections.boxes.forEach(([x1, y1, x2, y2], i) => {
+    const left = offsetX + x1 * frameWidth;
+    const top = offsetY + y1 * frameHeight;
+    const label = `${detections.labels[detections.classes[i]]} ${detections.confidences[i].toFixed(2)}`;
+    const textWidth = ctx.measureText(label).width + 6;
+
+    ctx.strokeStyle = '#00ff00';
+    ctx.strokeRect(left, top, (x2 - x1) * frameWidth, (y2 - y1) * frameHeight);
+    ctx.fillStyle = '#00ff00';
+    ctx.fillRect(left, top - 16, textWidth, 16);
+    ctx.fillStyle = '#000000';
+    ctx.fillText(label, left + 3, top - 2);
+  });
+};
+
+const StreamViewer = ({ stream, onRemove, isFullscreen = false, rendition = 'full', maxFps = null }) => {
   const [status, setStatus] = useState('disconnected');
   const [currentFrame, setCurrentFrame] = useState(null);
   const [error, setError] = useState(null);
   const [lastUpdate, setLastUpdate] = useState(null);
   const [isPlaying, setIsPlaying] = useState(false);
-  const wsRef = useRef(null);
+  const [showOverlay, setShowOverlay] = useState(true);
+  const [hasDetections, setHasDetections] = useState(false);
+  const [frameSeq, setFrameSeq] = useState(null);
+  // Incremented on every mse_init: the stream is played as H.264 through MSE
+  const [mseSession, setMseSession] = useState(0);
+  // Subscription on the shared connection while the stream is being watched
+  const subscriptionRef = useRef(null);
+  const imageRef = useRef(null);
+  const videoRef = useRef(null);
+  const mseRef = useRef(null);
+  const mseMimeRef = useRef(null);
+  // Binary fragments received before the <video> element and player exist
+  const msePendingRef = useRef([]);
+  const canvasRef = useRef(null);
+  // Latest detections message; drawn only over the frame with the same seq
+  const detectionsRef = useRef(null);
 
   useEffect(() => {
     return () => {
-      if (wsRef.current && wsRef.current.readyState === WebSocket.OPEN) {
-        wsRef.current.close();
+      if (subscriptionRef.current) {
+        subscriptionRef.current.unsubscribe();
+        subscriptionRef.current = null;
       }
+      stopMse();
     };
+  // eslint-disable-next-line react-hooks/exhaustive-deps
   }, []);
 
-  const connectWebSocket = () => {
-    if (wsRef.current && wsRef.current.readyState === WebSocket.OPEN) {
+  // Grid size changes only switch the rendition/frame rate of the subscription
+  useEffect(() => {
+    if (subscriptionRef.current) {
+      subscriptionRef.current.update({ rendition, fps: maxFps });
+    }
+  }, [rendition, maxFps]);
+
+  useEffect(() => {
+    if (!mseSession || !videoRef.current) {
       return;
     }
+    const player = createMsePlayer(videoRef.current, mseMimeRef.current);
+    msePendingRef.current.forEach((buffer) => player.append(buffer));
+    msePendingRef.current = [];
+    mseRef.current = player;
+    return () => {
+      player.destroy();
+      if (mseRef.current === player) {
+        mseRef.current = null;
+      }
+    };
+  }, [mseSession]);
 
-    setStatus('connecting');
-    setError(null);
+  const stopMse = () => {
+    if (mseRef.current) {
+      mseRef.current.destroy();
+      mseRef.current = null;
+    }
+    msePendingRef.current = [];
+    setMseSession(0);
+  };
 
-    const wsUrl = `${config.WS_BASE_URL}/ws/stream/${stream.id}/`;
-    const websocket = new WebSocket(wsUrl);
-    
-    websocket.onopen = () => {
-      setStatus('connected');
-      setWs(websocket);
-      wsRef.current = websocket;
-      
-      websocket.send(JSON.stringify({
-        type: 'start_stream',
-        rtsp_url: stream.rtsp_url
-      }));
-    };
+  const redrawOverlay = () => {
+    if (!canvasRef.current) {
+      return;
+    }
+    const detections = detectionsRef.current;
+    const visible = showOverlay && detections && detections.seq === frameSeq;
+    const media = mseSession ? videoRef.current : imageRef.current;
+    drawDetections(canvasRef.current, media, visible ? detections : null);
+  };
+
+  // Toggling the overlay only redraws locally, no server round trip
+  // eslint-disable-next-line react-hooks/exhaustive-deps
+  useEffect(redrawOverlay, [frameSeq, showOverlay, hasDetections]);
 
-    websocket.onmessage = (event) => {
-      try {
-        const data = JSON.parse(event.data);
-        handleWebSocketMessage(data);
-      } catch (err) {
-        // Handle parsing errors silently
-        setError('Invalid message format received');
+  const handleMessage = (data) => {
+    // fMP4 passthrough data arrives as binary messages
+    if (data instanceof ArrayBuffer) {
+      if (mseRef.current) {
+        mseRef.current.append(data);
+      } else {
+        msePendingRef.current.push(data);
       }
-    };
+      return;
+    }
+    handleWebSocketMessage(data);
+  };
 
-    websocket.onclose = () => {
-      setStatus('disconnected');
-      setIsPlaying(false);
-      wsRef.current = null;
-    };
+  const subscribe = () => {
+    if (subscriptionRef.current) {
+      return;
+    }
 
-    websocket.onerror = (error) => {
-      setStatus('error');
-      setError('WebSocket connection failed - Check backend logs');
-    };
+    setStatus('connecting');
+    setError(null);
+
+    subscriptionRef.current = getMultiplexClient().subscribe(
+      stream.id,
+      { rtsp_url: stream.rtsp_url, rendition, fps: maxFps },
+      handleMessage
+    );
   };
 
   const handleWebSocketMessage = (data) => {
     switch (data.type) {
-      case 'connection_established':
+      case 'subscribed':
+        // stream_started only follows if the stream was not already running
+        setStatus('connected');
+        setIsPlaying(true);
+        break;
+
+      case 'connection_closed':
+        // The shared connection reconnects and resubscribes on its own
+        setStatus('connecting');
+        setIsPlaying(false);
         break;
         
+      case 'stream_queued':
+        // The server is at capacity; stream_started follows once there is room
+        setIsPlaying(false);
+        setError(`Menunggu kapasitas server (antrian ${data.position})`);
+        break;
+
       case 'stream_started':
         setIsPlaying(true);
         setError(null);
@@ -87,8 +195,39 @@ const StreamViewer = ({ stream, onRemove, isFullscreen = false }) => {
         
       case 'frame':
         setCurrentFrame(`data:image/jpeg;base64,${data.frame}`);
+        setFrameSeq(data.seq ?? null);
         setLastUpdate(new Date(data.timestamp).toLocaleTimeString());
         break;
+
+      case 'heartbeat':
+        // The scene has not changed; the current frame is still up to date
+        setLastUpdate(new Date(data.timestamp).toLocaleTimeString());
+        break;
+
+      case 'detections':
+        // Sent just before the frame it belongs to (client overlay mode);
+        // with MSE playback there is no JPEG frame, so draw right away
+        detectionsRef.current = data;
+        setHasDetections(true);
+        if (mseRef.current) {
+          setFrameSeq(data.seq);
+        }
+        break;
+
+      case 'mse_init':
+        // The initialization segment follows as the next binary message
+        if (!isMseSupported(data.mime)) {
+          setError(`Browser tidak mendukung video ${data.codec}`);
+          break;
+        }
+        if (mseRef.current) {
+          mseRef.current.destroy();
+          mseRef.current = null;
+        }
+        msePendingRef.current = [];
+        mseMimeRef.current = data.mime;
+        setMseSession((session) => session + 1);
+        break;
         
       case 'error':
         setError(data.message);
@@ -98,6 +237,9 @@ const StreamViewer = ({ stream, onRemove, isFullscreen = false }) => {
       case 'stream_stopped':
         setIsPlaying(false);
         setCurrentFrame(null);
+        setHasDetections(false);
+        detectionsRef.current = null;
+        stopMse();
         break;
 
       case 'stream_resumed':
@@ -115,31 +257,30 @@ const StreamViewer = ({ stream, onRemove, isFullscreen = false }) => {
   };
 
   const handlePlay = () => {
-    if (!ws || ws.readyState !== WebSocket.OPEN) {
-      connectWebSocket();
-    } else {
-      if (!isPlaying) {
-        ws.send(JSON.stringify({ type: 'play' }));
-      }
+    if (!subscriptionRef.current) {
+      subscribe();
+    } else if (!isPlaying) {
+      subscriptionRef.current.send({ type: 'play' });
     }
   };
 
   const handlePause = () => {
-    if (ws && ws.readyState === WebSocket.OPEN) {
-      ws.send(JSON.stringify({ type: 'pause' }));
+    if (subscriptionRef.current) {
+      subscriptionRef.current.send({ type: 'pause' });
     }
   };
 
   const handleStop = () => {
-    if (ws && ws.readyState === WebSocket.OPEN) {
-      ws.send(JSON.stringify({ type: 'stop_stream' }));
-      ws.close();
+    if (subscriptionRef.current) {
+      subscriptionRef.current.unsubscribe();
+      subscriptionRef.current = null;
     }
     setCurrentFrame(null);
+    setHasDetections(false);
+    detectionsRef.current = null;
+    stopMse();
     setIsPlaying(false);
     setStatus('disconnected');
-    setWs(null);
-    wsRef.current = null;
   };
 
   const handleRemove = () => {
@@ -212,17 +353,37 @@ const StreamViewer = ({ stream, onRemove, isFullscreen = false }) => {
           background: '#f8f9fa'
         }}
       >
-        {currentFrame ? (
+        {currentFrame || mseSession ? (
           <div className="position-relative w-100 h-100">
-            <img 
-              src={currentFrame} 
-              alt="Live stream" 
-              className="img-fluid w-100 h-100"
-              style={{ 
-                objectFit: 'cover',
-                transition: 'all 0.3s ease'
-              }}
-            />
+            {mseSession ? (
+              <video
+                ref={videoRef}
+                className="w-100 h-100"
+                style={{ objectFit: 'cover' }}
+                muted
+                autoPlay
+                playsInline
+              />
+            ) : (
+              <img 
+                ref={imageRef}
+                src={currentFrame} 
+                alt="Live stream" 
+                className="img-fluid w-100 h-100"
+                style={{ 
+                  objectFit: 'cover',
+                  transition: 'all 0.3s ease'
+                }}
+                onLoad={redrawOverlay}
+              />
+            )}
+            {hasDetections && (
+              <canvas
+                ref={canvasRef}
+                className="position-absolute top-0 start-0 w-100 h-100"
+                style={{ pointerEvents: 'none' }}
+              />
+            )}
             {/* Live indicator */}
             <div className="position-absolute top-0 start-0 m-3">
               <Badge bg="danger" className="px-3 py-2 rounded-pill d-flex align-items-center gap-2 fw-bold">
@@ -304,6 +465,16 @@ const StreamViewer = ({ stream, onRemove, isFullscreen = false }) => {
               <FaStop size={12} />
               <span>Stop</span>
             </Button>
+            {hasDetections && (
+              <Button 
+                onClick={() => setShowOverlay(!showOverlay)}
+                className="btn-clean btn-secondary-clean d-flex align-items-center gap-2"
+                title="Tampilkan/sembunyikan kotak deteksi"
+              >
+                {showOverlay ? <FaEyeSlash size={12} /> : <FaEye size={12} />}
+                <span>Deteksi</span>
+              </Button>
+            )}
           </div>
 
           {/* Remove Button */}
@@ -0,0 +1,80 @@
+/**
+ * Media Source Extensions player for fMP4 passthrough streams
+ * Appends binary WebSocket fragments to a SourceBuffer and keeps playback near the live edge
+ */
+
+// Seconds behind the newest buffered video before jumping forward
+const MAX_LIVE_LAG = 2;
+// Seconds of already played video kept in the buffer
+const KEEP_BEHIND = 10;
+// Fragments waiting for the SourceBuffer; older media fragments are dropped beyond this
+const MAX_QUEUED = 30;
+
+export const isMseSupported = (mime) =>
+  typeof window !== 'undefined' && 'MediaSource' in window && window.MediaSource.isTypeSupported(mime);
+
+export const createMsePlayer = (video, mime) => {
+  const mediaSource = new window.MediaSource();
+  const url = URL.createObjectURL(mediaSource);
+  const queue = [];
+  let sourceBuffer = null;
+  let destroyed = false;
+
+  const pump = () => {
+    if (destroyed || !sourceBuffer || sourceBuffer.updating) {
+      return;
+    }
+
+    const { buffered } = video;
+    if (buffered.length) {
+      const end = buffered.end(buffered.length - 1);
+      if (end - video.currentTime > MAX_LIVE_LAG) {
+        video.currentTime = end - 0.2;
+      }
+      // Trim played video so the buffer does not grow for hours
+      if (video.currentTime - buffered.start(0) > KEEP_BEHIND * 2) {
+        sourceBuffer.remove(buffered.start(0), video.currentTime - KEEP_BEHIND);
+        return;
+      }
+    }
+
+    const chunk = queue.shift();
+    if (chunk) {
+      try {
+        sourceBuffer.appendBuffer(chunk);
+      } catch (err) {
+        // QuotaExceeded or a decode error: skip this fragment
+      }
+    }
+  };
+
+  mediaSource.addEventListener('sourceopen', () => {
+    sourceBuffer = mediaSource.addSourceBuffer(mime);
+    // Fragments a slow connection skipped are simply not shown; playback
+    // continues from the next keyframe without a gap in the timeline
+    sourceBuffer.mode = 'sequence';
+    sourceBuffer.addEventListener('updateend', pump);
+    pump();
+  });
+
+  video.src = url;
+  video.play().catch(() => {});
+
+  return {
+    append(buffer) {
+      queue.push(buffer);
+      if (queue.length > MAX_QUEUED) {
+        // Keep the first entry: before sourceopen it is the init segment
+        queue.splice(1, queue.length - MAX_QUEUED);
+      }
+      pump();
+    },
+    destroy() {
+      destroyed = true;
+      queue.length = 0;
+      video.removeAttribute('src');
+      video.load();
+      URL.revokeObjectURL(url);
+    }
+  };
+};
@@ -0,0 +1,147 @@
+/**
+ * Shared multiplexed WebSocket for grid views
+ * One connection to /ws/streams/ carries every stream on the page; viewers subscribe by stream id
+ */
+import config from './config';
+
+// Wait before reconnecting after the connection drops
+const RECONNECT_DELAY = 2000;
+// Keep an idle connection open briefly so switching grids does not reconnect
+const IDLE_CLOSE_DELAY = 5000;
+
+const textDecoder = new TextDecoder();
+
+/**
+ * Binary messages are fMP4 data prefixed with the stream id (one length byte, then the id)
+ */
+const splitBinary = (buffer) => {
+  const bytes = new Uint8Array(buffer);
+  const idLength = bytes[0];
+  return {
+    streamId: textDecoder.decode(bytes.subarray(1, 1 + idLength)),
+    data: buffer.slice(1 + idLength)
+  };
+};
+
+export const createMultiplexClient = (url) => {
+  // stream id -> { options, onMessage }
+  const subscriptions = new Map();
+  let socket = null;
+  let reconnectTimer = null;
+  let idleTimer = null;
+
+  const send = (message) => {
+    if (socket && socket.readyState === WebSocket.OPEN) {
+      socket.send(JSON.stringify(message));
+    }
+  };
+
+  const sendSubscribe = (streamId, options) => {
+    send({ type: 'subscribe', stream_id: streamId, ...options });
+  };
+
+  const dispatch = (streamId, message) => {
+    const subscription = subscriptions.get(streamId);
+    if (subscription) {
+      subscription.onMessage(message);
+    }
+  };
+
+  const connect = () => {
+    if (socket || !subscriptions.size) {
+      return;
+    }
+    socket = new WebSocket(url);
+    socket.binaryType = 'arraybuffer';
+
+    socket.onopen = () => {
+      subscriptions.forEach(({ options }, streamId) => sendSubscribe(streamId, options));
+    };
+
+    socket.onmessage = (event) => {
+      if (event.data instanceof ArrayBuffer) {
+        const { streamId, data } = splitBinary(event.data);
+        dispatch(streamId, data);
+        return;
+      }
+      let message;
+      try {
+        message = JSON.parse(event.data);
+      } catch (err) {
+        return;
+      }
+      if (message.stream_id) {
+        dispatch(message.stream_id, message);
+      } else if (message.type === 'error') {
+        subscriptions.forEach(({ onMessage }) => onMessage(message));
+      }
+    };
+
+    socket.onclose = () => {
+      socket = null;
+      subscriptions.forEach(({ onMessage }) => onMessage({ type: 'connection_closed' }));
+      if (subscriptions.size && !reconnectTimer) {
+        reconnectTimer = setTimeout(() => {
+          reconnectTimer = null;
+          connect();
+        }, RECONNECT_DELAY);
+      }
+    };
+  };
+
+  const closeWhenIdle = () => {
+    clearTimeout(idleTimer);
+    idleTimer = setTimeout(() => {
+      if (!subscriptions.size && socket) {
+        socket.close();
+      }
+    }, IDLE_CLOSE_DELAY);
+  };
+
+  return {
+    /**
+     * Start receiving a stream. options: { rtsp_url, rendition, fps }.
+     * onMessage gets parsed JSON messages and ArrayBuffers (fMP4 data).
+     */
+    subscribe(streamId, options, onMessage) {
+      subscriptions.set(streamId, { options, onMessage });
+      clearTimeout(idleTimer);
+      if (socket && socket.readyState === WebSocket.OPEN) {
+        sendSubscribe(streamId, options);
+      } else {
+        connect();
+      }
+
+      return {
+        // Change rendition or frame rate without resubscribing
+        update(newOptions) {
+          const subscription = subscriptions.get(streamId);
+          if (subscription) {
+            subscription.options = { ...subscription.options, ...newOptions };
+            sendSubscribe(streamId, subscription.options);
+          }
+        },
+        send(message) {
+          send({ ...message, stream_id: streamId });
+        },
+        unsubscribe() {
+          if (subscriptions.delete(streamId)) {
+            send({ type: 'unsubscribe', stream_id: streamId });
+          }
+          if (!subscriptions.size) {
+            closeWhenIdle();
+          }
+        }
+      };
+    }
+  };
+};
+
+let client = null;
+
+export const getMultiplexClient = () => {
+  if (!client) {
+    client = createMultiplexClient(`${config.WS_BASE_URL}/ws/streams/`);
+  }
+  return client;
+};